@@ -0,0 +1,198 @@
+import multiprocessing
+import re
+import string
+import sys
+import unicodedata
+from typing import List, Sequence
+
+
+class ArabicTextPreprocessor:
+    """
+    Arabic text normalization, shared by the embedding notebook and the backend.
+
+    Normalizes unicode, alef variants, taa marbuta and alef maqsura, converts
+    Eastern Arabic numerals, strips diacritics, tatweel, emojis, control
+    characters and punctuation, lowercases Latin text and collapses whitespace.
+    """
+
+    _EASTERN_ARABIC_NUMERALS = '٠١٢٣٤٥٦٧٨٩'
+    _WESTERN_ARABIC_NUMERALS = '0123456789'
+    _ARABIC_CHAR_MAP = {
+        'أ': 'ا', 'إ': 'ا', 'آ': 'ا',
+        'ة': 'ه',
+        'ى': 'ي'
+    }
+    _ARABIC_DIACRITICS_TATWEEL_REGEX = re.compile(r'[\u064B-\u0652\u0640]')
+    _CHARS_TO_PRESERVE = '.-/'
+    _ARABIC_PUNCTUATIONS_BASE = '`÷×؛<>_()*&^%][ـ،:"؟\'{}~¦+|!”…“–ـ«»'
+    _ENGLISH_PUNCTUATIONS_BASE = string.punctuation
+    _MULTI_WHITESPACE_REGEX = re.compile(r'\s+')
+
+    _UNICODE_CONTROL_CHAR_REGEX = re.compile(
+        r'[\u202A-\u202F\u200B-\u200F\u00A0\uFEFF\u2060-\u206F]'
+    )
+
+    _EMOJI_PATTERN = re.compile(
+        "["
+        u"\U0001F600-\U0001F64F" u"\U0001F300-\U0001F5FF" u"\U0001F680-\U0001F6FF"
+        u"\U0001F700-\U0001F77F" u"\U0001F780-\U0001F7FF" u"\U0001F800-\U0001F8FF"
+        u"\U0001F900-\U0001F9FF" u"\U0001FA70-\U0001FAFF" u"\U00002702-\U000027B0"
+        u"\U000024C2-\U0001F251" "]+", flags=re.UNICODE)
+
+    #? batch path: emojis, diacritics and tatweel removed in one regex pass
+    _BATCH_REMOVAL_REGEX = re.compile(
+        "[" + _EMOJI_PATTERN.pattern[1:-2] + "\u064B-\u0652\u0640]+", flags=re.UNICODE
+    )
+
+    def __init__(self):
+        self.numeral_translation_table = None
+        self.char_norm_translation_table = None
+        self.punctuation_removal_table = None
+        try:
+            self.numeral_translation_table = str.maketrans(
+                self._EASTERN_ARABIC_NUMERALS,
+                self._WESTERN_ARABIC_NUMERALS
+            )
+        except Exception as e:
+            print(f"Error initializing numeral table: {e}", file=sys.stderr)
+        try:
+            self.char_norm_translation_table = str.maketrans(self._ARABIC_CHAR_MAP)
+        except Exception as e:
+            print(f"Error initializing char norm table: {e}", file=sys.stderr)
+        try:
+            _english_punctuations_to_remove_str = ''.join(
+                c for c in self._ENGLISH_PUNCTUATIONS_BASE if c not in self._CHARS_TO_PRESERVE
+            )
+            _punctuations_to_remove_str = self._ARABIC_PUNCTUATIONS_BASE + _english_punctuations_to_remove_str
+            self.punctuation_removal_table = str.maketrans('', '', _punctuations_to_remove_str)
+        except Exception as e:
+             print(f"Error initializing punctuation table: {e}", file=sys.stderr)
+
+        #? char map, numerals and punctuation removal fused into one translate table;
+        #? their characters don't overlap, so the order of the single-step passes doesn't matter
+        self.batch_translation_table = None
+        if self.char_norm_translation_table is not None and \
+           self.numeral_translation_table is not None and \
+           self.punctuation_removal_table is not None:
+            self.batch_translation_table = {
+                **self.char_norm_translation_table,
+                **self.numeral_translation_table,
+                **self.punctuation_removal_table,
+            }
+
+    def _normalize_unicode(self, text: str, form: str = 'NFC') -> str:
+        if not isinstance(text, str): return text
+        try: return unicodedata.normalize(form, text)
+        except Exception: return text
+    def _remove_emojis(self, text:str) -> str:
+        if not isinstance(text, str): return text
+        try: return self._EMOJI_PATTERN.sub('', text)
+        except Exception: return text
+    def _normalize_arabic_chars(self, text: str) -> str:
+        if self.char_norm_translation_table is None: return text
+        if not isinstance(text, str): return text
+        try: return text.translate(self.char_norm_translation_table)
+        except Exception: return text
+    def _standardize_numerals(self, text: str) -> str:
+        if self.numeral_translation_table is None: return text
+        if not isinstance(text, str): return text
+        try: return text.translate(self.numeral_translation_table)
+        except Exception: return text
+    def _remove_diacritics_and_tatweel(self, text: str) -> str:
+        if not isinstance(text, str): return text
+        try: return self._ARABIC_DIACRITICS_TATWEEL_REGEX.sub('', text)
+        except Exception: return text
+    def _remove_punctuations(self, text: str) -> str:
+        if self.punctuation_removal_table is None: return text
+        if not isinstance(text, str): return text
+        try: return text.translate(self.punctuation_removal_table)
+        except Exception: return text
+    def _lowercase_latin(self, text: str) -> str:
+        if not isinstance(text, str): return text
+        try: return text.lower()
+        except Exception: return text
+
+    def _normalize_whitespace(self, text: str) -> str:
+        if not isinstance(text, str): return text
+        try:
+            text = text.strip()
+            return self._MULTI_WHITESPACE_REGEX.sub(' ', text)
+        except Exception: return text
+
+    def _remove_unicode_control_chars(self, text: str) -> str:
+        if not isinstance(text, str): return text
+        try:
+            return self._UNICODE_CONTROL_CHAR_REGEX.sub('', text)
+        except Exception: return text
+
+    def preprocess(self, text: str) -> str:
+        if not isinstance(text, str):
+            print(f"preprocess Error: Input must be a string, received {type(text)}.", file=sys.stderr)
+            return text
+        if self.char_norm_translation_table is None or \
+           self.numeral_translation_table is None or \
+           self.punctuation_removal_table is None:
+             print("Error: Preprocessor tables not initialized correctly.", file=sys.stderr)
+             return text
+        processed_text = self._normalize_unicode(text, 'NFC')
+        processed_text = self._remove_emojis(processed_text)
+        processed_text = self._normalize_arabic_chars(processed_text)
+        processed_text = self._standardize_numerals(processed_text)
+        processed_text = self._remove_diacritics_and_tatweel(processed_text)
+        processed_text = self._remove_punctuations(processed_text)
+        processed_text = self._lowercase_latin(processed_text)
+        processed_text = self._normalize_whitespace(processed_text)
+        return processed_text
+
+    def _preprocess_fused(self, text: str) -> str:
+        """Same output as preprocess(), in one regex pass, one translate and one split."""
+        if not isinstance(text, str):
+            return text
+        try:
+            text = unicodedata.normalize('NFC', text)
+            text = self._BATCH_REMOVAL_REGEX.sub('', text)
+            text = text.translate(self.batch_translation_table).lower()
+            #? str.split() and the \s regex agree on what is whitespace
+            return ' '.join(text.split())
+        except Exception:
+            return self.preprocess(text)
+
+    def preprocess_batch(self, texts: Sequence[str], workers: int = 1, chunk_size: int = 5000) -> List[str]:
+        """
+        Preprocess many texts; non-string items are returned unchanged.
+
+        With `workers` > 1 and more than one chunk of texts, chunks of
+        `chunk_size` are spread over a process pool (order is kept).
+        """
+        if self.batch_translation_table is None:
+            return [self.preprocess(text) for text in texts]
+        if workers <= 1 or len(texts) <= chunk_size:
+            return [self._preprocess_fused(text) for text in texts]
+
+        chunks = [list(texts[start : start + chunk_size]) for start in range(0, len(texts), chunk_size)]
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(_preprocess_chunk, chunks)
+        return [text for chunk in results for text in chunk]
+
+
+preprocessor = ArabicTextPreprocessor()
+
+
+def _preprocess_chunk(texts: List[str]) -> List[str]:
+    return preprocessor.preprocess_batch(texts)
+
+
+def normalize_search_text(text) -> str:
+    """Normalize catalog text and search queries the same way ("" for missing values)."""
+    if not isinstance(text, str):
+        return ""
+    return preprocessor._preprocess_fused(text)
+
+
+def normalize_search_texts(texts: Sequence, workers: int = 1) -> List[str]:
+    """normalize_search_text over many texts, with the batch API."""
+    return [
+        text if isinstance(text, str) else ""
+        for text in preprocessor.preprocess_batch(texts, workers=workers)
+    ]
+
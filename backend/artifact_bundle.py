@@ -0,0 +1,381 @@
+"""
+Single-file, memory-mappable bundle of the data artifacts.
+
+Replaces `book_metadata.csv`, the two pickled title mappings and the `.npy`
+arrays with one versioned file, `bookwise.bundle`:
+
+    python artifact_bundle.py convert --data-dir ../data   # build it from today's files
+    python artifact_bundle.py verify --data-dir ../data    # check every section's sha256
+    python artifact_bundle.py info --data-dir ../data
+
+Layout (little-endian):
+
+    header    64 bytes: magic, uint32 schema version, uint32 flags (0),
+              uint64 TOC offset, uint64 TOC length, zero padding
+    sections  raw array bytes, each starting on a 64-byte boundary
+    TOC       UTF-8 JSON: {"schema_version", "created_at", "sections":
+              {name: {"offset", "nbytes", "dtype", "shape", "sha256"}}}
+
+Opening a bundle reads only the header and TOC and maps the file; each
+section becomes a read-only NumPy view of the mapping on first use, so
+nothing is parsed or unpickled at boot and workers share pages through the
+OS page cache.
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from arabic_text import normalize_search_texts
+from book_store import BookStore, decode_texts, encode_texts
+from embedding_index import INDEX_ARRAYS, load_index_arrays
+
+BUNDLE_FILE = "bookwise.bundle"
+MAGIC = b"BKWBNDL\x00"
+SCHEMA_VERSION = 1
+ALIGNMENT = 64
+_HEADER = struct.Struct("<8sIIQQ")
+
+#? similarity/embedding arrays carried by the bundle when present in data/
+ARRAY_SECTIONS = ["similarity_matrix", "neighbor_ids", "neighbor_scores", "book_embeddings"]
+#? rows per write when streaming a (possibly memory-mapped) array into the bundle
+_WRITE_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+class LazyMapping(Mapping):
+    """A read-only dict built by `build()` on first access."""
+
+    def __init__(self, build: Callable[[], Dict]):
+        self._build = build
+        self._data = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> Dict:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self._build()
+        return self._data
+
+    def __getitem__(self, key):
+        return self._get()[key]
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self) -> int:
+        return len(self._get())
+
+
+class BundleWriter:
+    """Stream sections into a new bundle; the file appears atomically on close()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.sections: Dict[str, Dict] = {}
+        self._file = open(self.tmp_path, "wb")
+        self._file.write(b"\x00" * ALIGNMENT)
+
+    def _align(self):
+        padding = -self._file.tell() % ALIGNMENT
+        self._file.write(b"\x00" * padding)
+
+    def add_array(self, name: str, array: np.ndarray):
+        """Write an array (row blocks at a time, so memmaps are never fully loaded)."""
+        self._align()
+        offset = self._file.tell()
+        digest = hashlib.sha256()
+        dtype = np.dtype(array.dtype).newbyteorder("<")
+
+        if array.ndim == 0 or array.size == 0:
+            blocks = [np.ascontiguousarray(array, dtype=dtype)]
+        else:
+            row_bytes = max(1, array.nbytes // len(array))
+            step = max(1, _WRITE_BLOCK_BYTES // row_bytes)
+            blocks = (
+                np.ascontiguousarray(array[start : start + step], dtype=dtype)
+                for start in range(0, len(array), step)
+            )
+        for block in blocks:
+            data = memoryview(block).cast("B")
+            digest.update(data)
+            self._file.write(data)
+
+        self.sections[name] = {
+            "offset": offset,
+            "nbytes": self._file.tell() - offset,
+            "dtype": dtype.str,
+            "shape": list(array.shape),
+            "sha256": digest.hexdigest(),
+        }
+
+    def add_texts(self, name: str, texts: List[str]):
+        buffer, offsets = encode_texts(texts)
+        self.add_text_buffer(name, buffer, offsets)
+
+    def add_text_buffer(self, name: str, buffer, offsets: np.ndarray):
+        self.add_array(f"{name}.buffer", np.frombuffer(buffer, dtype=np.uint8))
+        self.add_array(f"{name}.offsets", offsets)
+
+    def close(self):
+        """Write the TOC and header, then move the bundle into place."""
+        self._align()
+        toc_offset = self._file.tell()
+        toc = json.dumps(
+            {
+                "schema_version": SCHEMA_VERSION,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "sections": self.sections,
+            }
+        ).encode("utf-8")
+        self._file.write(toc)
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, SCHEMA_VERSION, 0, toc_offset, len(toc)))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+def write_bundle(
+    path: str,
+    books: BookStore,
+    title_to_index: Optional[Mapping],
+    index_to_title: Optional[Mapping],
+    arrays: Dict[str, np.ndarray],
+    titles_normalized: Optional[List[str]] = None,
+):
+    """
+    Write a complete bundle: book columns, title mappings and arrays, plus
+    the Arabic-normalized titles so loading skips re-normalizing them.
+    """
+    if titles_normalized is None:
+        titles_normalized = normalize_search_texts(books.text_column("title"))
+    writer = BundleWriter(path)
+    try:
+        writer.add_array("books.book_ids", books.book_ids)
+        writer.add_array("books.category_codes", books.category_codes)
+        writer.add_texts("books.categories", books.categories)
+        for field in ("title", "description_to_display"):
+            writer.add_text_buffer(f"books.{field}", *books.text_buffer(field))
+        writer.add_texts("search.title_normalized", titles_normalized)
+
+        if title_to_index is not None:
+            writer.add_texts("title_to_index.keys", [str(title) for title in title_to_index])
+            writer.add_array(
+                "title_to_index.values",
+                np.fromiter(title_to_index.values(), dtype=np.int64, count=len(title_to_index)),
+            )
+        if index_to_title is not None:
+            writer.add_array(
+                "index_to_title.keys",
+                np.fromiter(index_to_title.keys(), dtype=np.int64, count=len(index_to_title)),
+            )
+            writer.add_texts("index_to_title.values", [str(title) for title in index_to_title.values()])
+
+        for name, array in arrays.items():
+            if array is not None:
+                writer.add_array(name, array)
+        writer.close()
+    except Exception:
+        writer._file.close()
+        if os.path.exists(writer.tmp_path):
+            os.remove(writer.tmp_path)
+        raise
+
+
+class ArtifactBundle:
+    """
+    Read side of a bundle: sections are mapped lazily and cached.
+
+    With `verify` (default from BOOKWISE_BUNDLE_VERIFY), each section's
+    sha256 is checked the first time it is used; a mismatch raises ValueError.
+    """
+
+    def __init__(self, path: str, verify: Optional[bool] = None):
+        if verify is None:
+            verify = os.environ.get("BOOKWISE_BUNDLE_VERIFY", "0").lower() in ("1", "true", "yes")
+        self.path = path
+        self.verify = verify
+        self._sections_cache: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"{path} is too short to be an artifact bundle")
+        magic, version, _, toc_offset, toc_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an artifact bundle")
+        if version != SCHEMA_VERSION:
+            raise ValueError(
+                f"{path} has schema version {version}, expected {SCHEMA_VERSION}; "
+                "rebuild it with artifact_bundle.py convert"
+            )
+        if toc_offset + toc_length > len(self._mmap):
+            raise ValueError(f"{path} is truncated")
+
+        toc = json.loads(self._mmap[toc_offset : toc_offset + toc_length].decode("utf-8"))
+        self.schema_version = toc["schema_version"]
+        self.created_at = toc.get("created_at")
+        self.sections: Dict[str, Dict] = toc["sections"]
+        for name, section in self.sections.items():
+            if section["offset"] + section["nbytes"] > toc_offset:
+                raise ValueError(f"Section {name} of {path} is out of bounds")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def _checksum(self, name: str) -> str:
+        section = self.sections[name]
+        view = memoryview(self._mmap)[section["offset"] : section["offset"] + section["nbytes"]]
+        try:
+            return hashlib.sha256(view).hexdigest()
+        finally:
+            view.release()
+
+    def array(self, name: str) -> np.ndarray:
+        """Read-only view of one section (mapped and verified on first use)."""
+        cached = self._sections_cache.get(name)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            if name in self._sections_cache:
+                return self._sections_cache[name]
+            section = self.sections[name]
+            if self.verify and self._checksum(name) != section["sha256"]:
+                raise ValueError(f"Checksum mismatch in section {name} of {self.path}")
+
+            dtype = np.dtype(section["dtype"])
+            count = section["nbytes"] // dtype.itemsize
+            array = np.frombuffer(
+                self._mmap, dtype=dtype, count=count, offset=section["offset"]
+            ).reshape(section["shape"])
+            self._sections_cache[name] = array
+            return array
+
+    def verify_all(self) -> List[str]:
+        """Names of sections whose checksum does not match (empty when intact)."""
+        return [
+            name
+            for name, section in self.sections.items()
+            if self._checksum(name) != section["sha256"]
+        ]
+
+    def _text_buffer(self, name: str):
+        return memoryview(self.array(f"{name}.buffer")), self.array(f"{name}.offsets")
+
+    def texts(self, name: str) -> List[str]:
+        return decode_texts(*self._text_buffer(name))
+
+    def book_store(self) -> BookStore:
+        """The book columns as a BookStore whose text buffers point into the mapping."""
+        buffers, offsets = {}, {}
+        for field in ("title", "description_to_display"):
+            buffers[field], offsets[field] = self._text_buffer(f"books.{field}")
+        return BookStore(
+            self.array("books.book_ids"),
+            self.array("books.category_codes"),
+            self.texts("books.categories"),
+            buffers,
+            offsets,
+        )
+
+    def title_to_index(self) -> Optional[LazyMapping]:
+        if "title_to_index.values" not in self:
+            return None
+        return LazyMapping(
+            lambda: dict(
+                zip(self.texts("title_to_index.keys"), self.array("title_to_index.values").tolist())
+            )
+        )
+
+    def index_to_title(self) -> Optional[LazyMapping]:
+        if "index_to_title.keys" not in self:
+            return None
+        return LazyMapping(
+            lambda: dict(
+                zip(self.array("index_to_title.keys").tolist(), self.texts("index_to_title.values"))
+            )
+        )
+
+
+def convert(data_dir: str, output: Optional[str] = None, include: Optional[List[str]] = None) -> str:
+    """Build a bundle from the current data/ files (CSV, pickles and .npy arrays)."""
+    books = BookStore.from_csv(os.path.join(data_dir, "book_metadata.csv"))
+
+    mappings = {}
+    for name in ("title_to_index", "index_to_title"):
+        path = os.path.join(data_dir, f"{name}.pkl")
+        mappings[name] = None
+        if os.path.exists(path):
+            #? the one place the pickles are still read: converting trusted local files
+            with open(path, "rb") as f:
+                mappings[name] = pickle.load(f)
+
+    arrays = {}
+    for name in include if include is not None else ARRAY_SECTIONS:
+        path = os.path.join(data_dir, f"{name}.npy")
+        if os.path.exists(path):
+            arrays[name] = np.load(path, mmap_mode="r")
+    if "book_embeddings" in arrays:
+        #? saved embedding index arrays, only when they match book_embeddings.npy
+        for name, array in load_index_arrays(data_dir, mmap_mode="r").items():
+            if include is None or name in include:
+                arrays[name] = array
+
+    output = output or os.path.join(data_dir, BUNDLE_FILE)
+    write_bundle(output, books, mappings["title_to_index"], mappings["index_to_title"], arrays)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect the binary artifact bundle.")
+    parser.add_argument("command", choices=["convert", "verify", "info"])
+    parser.add_argument("--data-dir", default="../data")
+    parser.add_argument("--output", default=None, help=f"Bundle path (default: <data-dir>/{BUNDLE_FILE})")
+    parser.add_argument(
+        "--arrays",
+        nargs="*",
+        default=None,
+        choices=ARRAY_SECTIONS + INDEX_ARRAYS,
+        help="Arrays to include (default: every one present)",
+    )
+    args = parser.parse_args()
+    path = args.output or os.path.join(args.data_dir, BUNDLE_FILE)
+
+    if args.command == "convert":
+        start_time = time.perf_counter()
+        convert(args.data_dir, path, args.arrays)
+        elapsed = time.perf_counter() - start_time
+        bad = ArtifactBundle(path).verify_all()
+        if bad:
+            raise SystemExit(f" Error: checksum mismatch after writing: {bad}")
+        print(f"✅ Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB) in {elapsed:.1f}s")
+    elif args.command == "verify":
+        bad = ArtifactBundle(path).verify_all()
+        if bad:
+            raise SystemExit(f" Error: checksum mismatch in {', '.join(bad)}")
+        print(f"✅ All sections of {path} match their checksums")
+    else:
+        bundle = ArtifactBundle(path)
+        print(f"{path}: schema v{bundle.schema_version}, created {bundle.created_at}")
+        for name, section in bundle.sections.items():
+            print(f"  {name:<36} {section['dtype']:>5} {str(tuple(section['shape'])):>18} {section['nbytes'] / 1e6:>10.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+"""
+Micro-benchmarks for the recommendation backend.
+
+Run from the backend directory, e.g.:
+
+    python benchmark.py similar --sizes 1000 10000 100000
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from arabic_text import ArabicTextPreprocessor, normalize_search_texts
+from book_store import BookStore
+from embedding_index import ExactEmbeddingIndex, IVFEmbeddingIndex, recall_at_k
+from neighbor_index import build_neighbor_index, top_k_indices
+from sampling import stratified_sample
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p99 of timing samples, in microseconds."""
+    values = np.asarray(samples) * 1e6
+    return {
+        "p50_us": float(np.percentile(values, 50)),
+        "p99_us": float(np.percentile(values, 99)),
+    }
+
+
+def _time_calls(func: Callable, args_list: List, repeats: int) -> List[float]:
+    samples = []
+    for i in range(repeats):
+        args = args_list[i % len(args_list)]
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _argsort_similar(row: np.ndarray, book_id: int, limit: int) -> np.ndarray:
+    """The original get_similar_books selection: full argsort, drop first."""
+    return np.argsort(row)[::-1][1 : limit + 1]
+
+
+def _top_k_similar(row: np.ndarray, book_id: int, limit: int) -> np.ndarray:
+    return top_k_indices(row, limit, exclude=book_id)
+
+
+def bench_similar(args):
+    """Latency of selecting `limit` neighbors from one similarity row."""
+    rng = np.random.default_rng(args.seed)
+
+    print(f"{'books':>8} {'method':>10} {'p50 (us)':>10} {'p99 (us)':>10}")
+    for n_books in args.sizes:
+        rows = rng.random((args.rows, n_books), dtype=np.float32)
+        book_ids = rng.integers(0, n_books, size=args.rows)
+        rows[np.arange(args.rows), book_ids] = 1.0  # self-similarity
+        calls = [(rows[i], int(book_ids[i]), args.limit) for i in range(args.rows)]
+
+        for name, func in (("argsort", _argsort_similar), ("top_k", _top_k_similar)):
+            stats = _percentiles(_time_calls(func, calls, args.repeats))
+            print(
+                f"{n_books:>8} {name:>10} {stats['p50_us']:>10.1f} {stats['p99_us']:>10.1f}"
+            )
+
+
+def bench_ann(args):
+    """Exact vs IVF retrieval over synthetic clustered embeddings: recall@k and latency."""
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    labels = rng.integers(0, args.clusters, size=args.books)
+    noise = rng.normal(size=(args.books, args.dim)).astype(np.float32)
+    embeddings = centers[labels] + 0.5 * noise
+
+    start = time.perf_counter()
+    exact = ExactEmbeddingIndex(embeddings)
+    print(f"exact build: {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    ivf = IVFEmbeddingIndex(embeddings, n_probe=args.n_probe)
+    print(f"ivf build:   {time.perf_counter() - start:.2f}s ({ivf.n_lists} lists)")
+
+    rows = rng.choice(args.books, size=args.queries, replace=False)
+    queries = exact.embeddings[rows]
+    exact_ids, _ = exact.search(queries, args.k)
+    ivf_ids, _ = ivf.search(queries, args.k)
+    recall = recall_at_k(ivf_ids, exact_ids)
+    print(f"ivf recall@{args.k} (n_probe={ivf.n_probe}): {recall:.3f}")
+
+    calls = [(queries[i], args.k) for i in range(args.queries)]
+    for name, index in (("exact", exact), ("ivf", ivf)):
+        stats = _percentiles(_time_calls(index.search, calls, args.queries))
+        print(
+            f"{name:>6} p50 {stats['p50_us']:>10.1f} us  p99 {stats['p99_us']:>10.1f} us"
+        )
+
+
+def _legacy_random_books_from_categories(frame: pd.DataFrame, limit: int) -> List[Dict]:
+    """The original discovery sampler: filter, sample() and iterrows() per category."""
+    categories = frame["category"].unique()
+    books_per_category = max(1, limit // len(categories))
+    selected_books = []
+    used_book_ids = set()
+    np.random.shuffle(categories)
+
+    for category in categories:
+        if len(selected_books) >= limit:
+            break
+        category_books = frame[frame["category"] == category]
+        sample_size = min(
+            books_per_category, len(category_books), limit - len(selected_books)
+        )
+        if sample_size > 0:
+            for _, book in category_books.sample(n=sample_size).iterrows():
+                if book["book_id"] not in used_book_ids and len(selected_books) < limit:
+                    selected_books.append(book.to_dict())
+                    used_book_ids.add(book["book_id"])
+
+    if len(selected_books) < limit:
+        remaining_books = frame[~frame["book_id"].isin(used_book_ids)]
+        additional_books = remaining_books.sample(
+            n=min(limit - len(selected_books), len(remaining_books))
+        )
+        for _, book in additional_books.iterrows():
+            selected_books.append(book.to_dict())
+
+    return selected_books
+
+
+def bench_sample(args):
+    """Latency of the discovery sampler: per-category pandas vs vectorized buckets."""
+    rng = np.random.default_rng(args.seed)
+    frame = pd.DataFrame(
+        {
+            "book_id": np.arange(args.books),
+            "title": [f"book {i}" for i in range(args.books)],
+            "category": pd.Series(
+                rng.integers(0, args.categories, size=args.books).astype(str),
+                dtype=object,
+            ),
+            "description_to_display": "",
+        }
+    )
+    records = frame.to_dict("records")
+    codes, uniques = pd.factorize(frame["category"])
+    order = np.argsort(codes, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+
+    def vectorized(limit):
+        rows = stratified_sample(order, offsets, limit, rng)
+        return [records[row] for row in rows.tolist()]
+
+    calls = [(args.limit,)]
+    for name, func in (
+        ("pandas", lambda limit: _legacy_random_books_from_categories(frame, limit)),
+        ("vectorized", vectorized),
+    ):
+        stats = _percentiles(_time_calls(func, calls, args.repeats))
+        print(f"{name:>10} p50 {stats['p50_us']:>10.1f} us  p99 {stats['p99_us']:>10.1f} us")
+
+
+def bench_batch(args):
+    """Users/s for per-user history recommendations vs the batched API."""
+    from data_loader import DataLoader
+
+    rng = np.random.default_rng(args.seed)
+    loader = DataLoader()
+    loader.books = BookStore.from_columns(
+        np.arange(args.books),
+        [f"book {i}" for i in range(args.books)],
+        [""] * args.books,
+        [""] * args.books,
+    )
+    if args.source == "embeddings":
+        embeddings = rng.standard_normal((args.books, args.dimension), dtype=np.float32)
+        loader.book_embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    else:
+        similarity = rng.random((args.books, args.books), dtype=np.float32)
+        if args.source == "neighbors":
+            loader.neighbor_index = build_neighbor_index(similarity_matrix=similarity, k=args.k)
+        else:
+            loader.similarity_matrix = similarity
+    histories = [
+        rng.choice(args.pool or args.books, size=args.history, replace=False).tolist()
+        for _ in range(args.users)
+    ]
+
+    start = time.perf_counter()
+    for history in histories:
+        loader.get_history_recommendations(history, args.limit)
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loader.get_history_recommendations_batch(histories, args.limit, block_size=args.block_size)
+    batch_s = time.perf_counter() - start
+
+    print(f"{args.source}, {args.books} books, {args.users} users")
+    print(f"{'per-user':>10} {args.users / loop_s:>10.1f} users/s")
+    print(f"{'batch':>10} {args.users / batch_s:>10.1f} users/s")
+
+
+#? letters (with hamza/taa marbuta/alef maqsura variants), diacritics, tatweel,
+#? Eastern numerals, punctuation, Latin and emojis: every preprocessing step has work
+_ARABIC_CORPUS_CHARS = (
+    "ابتثجحخدذرزسشصضطظعغفقكلمنهوي" "أإآةى" "\u064B\u064E\u064F\u0650\u0651\u0652\u0640"
+    "٠١٢٣٤٥٦٧٨٩" "،؛؟«»!.:-/()" "ABCxyz" "😀📚"
+)
+
+
+def _synthetic_arabic_corpus(n_texts: int, words: int, rng: np.random.Generator) -> List[str]:
+    chars = np.array(list(_ARABIC_CORPUS_CHARS))
+    texts = []
+    for _ in range(n_texts):
+        lengths = rng.integers(2, 9, size=words)
+        letters = chars[rng.integers(0, len(chars), size=int(lengths.sum()))]
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        texts.append(" ".join("".join(letters[a:b]) for a, b in zip(bounds[:-1], bounds[1:])))
+    return texts
+
+
+def bench_preprocess(args):
+    """Strings/s of the per-string preprocess() loop vs preprocess_batch()."""
+    rng = np.random.default_rng(args.seed)
+    texts = _synthetic_arabic_corpus(args.texts, args.words, rng)
+    preprocessor = ArabicTextPreprocessor()
+
+    runs = [("loop", lambda: [preprocessor.preprocess(text) for text in texts])]
+    runs.append(("batch", lambda: preprocessor.preprocess_batch(texts)))
+    if args.workers > 1:
+        runs.append(
+            (
+                f"batch x{args.workers}",
+                lambda: preprocessor.preprocess_batch(
+                    texts, workers=args.workers, chunk_size=args.chunk_size
+                ),
+            )
+        )
+
+    expected = None
+    for name, func in runs:
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if expected is None:
+            expected = result
+        same = "same output" if result == expected else "OUTPUT DIFFERS"
+        print(f"{name:>10} {len(texts) / elapsed:>12.0f} strings/s  ({same})")
+
+
+def _allocated_mb(build: Callable):
+    """Result of `build()` and the MB it still holds once built (tracemalloc)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, (after - before) / 1e6
+
+
+def bench_books(args):
+    """Memory and row hydration: DataFrame + record dicts vs the columnar BookStore."""
+    rng = np.random.default_rng(args.seed)
+    corpus = _synthetic_arabic_corpus(args.books, args.words, rng)
+    path = os.path.join(tempfile.mkdtemp(), "book_metadata.csv")
+    pd.DataFrame(
+        {
+            "book_id": np.arange(args.books),
+            "title": [" ".join(text.split()[:4]) for text in corpus],
+            "category": [f"تصنيف {c}" for c in rng.integers(0, 40, size=args.books).tolist()],
+            "description_to_display": corpus,
+        }
+    ).to_csv(path, index=False)
+    del corpus
+
+    def build_frame():
+        #? what DataLoader kept before: the frame, its normalized columns and one dict per book
+        frame = pd.read_csv(path)
+        records = frame.to_dict("records")
+        for column in ("title", "category", "description_to_display"):
+            frame[f"{column}_normalized"] = normalize_search_texts(frame[column].tolist())
+        return frame, records
+
+    (frame, records), frame_mb = _allocated_mb(build_frame)
+    store, store_mb = _allocated_mb(lambda: BookStore.from_csv(path))
+    os.remove(path)
+    print(f"{'frame':>12} {frame_mb:>10.1f} MB")
+    print(f"{'store':>12} {store_mb:>10.1f} MB")
+
+    rows = rng.integers(0, args.books, size=args.lookups).tolist()
+    for name, hydrate in (
+        ("iloc", lambda row: {**frame.iloc[row].to_dict(), "similarity": 0.5}),
+        ("records", lambda row: {**records[row], "similarity": 0.5}),
+        ("store", lambda row: {**store[row], "similarity": 0.5}),
+        ("store title", lambda row: store[row]["title"]),
+    ):
+        start = time.perf_counter()
+        for row in rows:
+            hydrate(row)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12} {elapsed / len(rows) * 1e6:>10.2f} us/row")
+
+
+def _memory_usage_mb() -> Dict[str, float]:
+    """Resident and private (anonymous) memory of this process, in MB."""
+    usage = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon"):
+                    usage[key] = int(value.split()[0]) / 1024
+    except OSError:
+        usage["VmRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return usage
+
+
+def _measure_load(data_dir: str, mmap: bool, bundle: bool = False) -> Dict[str, float]:
+    """Load the data in a fresh process and report startup time and memory."""
+    from data_loader import DataLoader
+
+    loader = DataLoader(data_dir, mmap=mmap, use_bundle=bundle)
+    start = time.perf_counter()
+    if not loader.load_all_data():
+        raise RuntimeError(f"Failed to load data from {data_dir}")
+    elapsed = time.perf_counter() - start
+
+    #? touch one row per request path so the mapped mode pays for what it serves
+    loader.get_similar_books(0, 10)
+    return {"load_s": elapsed, **_memory_usage_mb()}
+
+
+def bench_load(args):
+    """Startup time and per-worker memory for eager vs memory-mapped loading."""
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for mmap in (False, True):
+        with context.Pool(1) as pool:
+            results[mmap] = pool.apply(_measure_load, (args.data_dir, mmap))
+
+    print(f"{'mode':>6} {'load (s)':>10} {'RSS (MB)':>10} {'private (MB)':>13}")
+    for mmap, stats in results.items():
+        print(
+            f"{'mmap' if mmap else 'eager':>6} {stats['load_s']:>10.2f} "
+            f"{stats.get('VmRSS', float('nan')):>10.1f} "
+            f"{stats.get('RssAnon', float('nan')):>13.1f}"
+        )
+
+
+def bench_coldstart(args):
+    """Fresh-process startup: CSV + pickles + .npy files vs the binary artifact bundle."""
+    from artifact_bundle import BUNDLE_FILE
+
+    if not os.path.exists(os.path.join(args.data_dir, BUNDLE_FILE)):
+        raise SystemExit("No bundle found; run `python artifact_bundle.py convert` first")
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'source':>12} {'load (s)':>10} {'RSS (MB)':>10} {'private (MB)':>13}")
+    for name, mmap, bundle in (
+        ("files", False, False),
+        ("files mmap", True, False),
+        ("bundle", True, True),
+    ):
+        samples = []
+        for _ in range(args.repeats):
+            with context.Pool(1) as pool:
+                samples.append(pool.apply(_measure_load, (args.data_dir, mmap, bundle)))
+        best = min(samples, key=lambda stats: stats["load_s"])
+        print(
+            f"{name:>12} {best['load_s']:>10.3f} "
+            f"{best.get('VmRSS', float('nan')):>10.1f} "
+            f"{best.get('RssAnon', float('nan')):>13.1f}"
+        )
+
+
+def _timed_get(url: str) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def bench_http(args):
+    """Concurrent clients against a running server: tail latency and throughput."""
+    urls = [args.url.rstrip("/") + path for path in args.paths]
+    calls = [urls[i % len(urls)] for i in range(args.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as clients:
+        samples = list(clients.map(_timed_get, calls))
+    elapsed = time.perf_counter() - start
+
+    stats = _percentiles(samples)
+    print(
+        f"{args.clients} clients, {args.requests} requests: "
+        f"{args.requests / elapsed:.1f} req/s, "
+        f"p50 {stats['p50_us'] / 1000:.1f} ms, p99 {stats['p99_us'] / 1000:.1f} ms, "
+        f"max {max(samples) * 1000:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend micro-benchmarks.")
+    parser.add_argument("--seed", type=int, default=0)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    similar = subparsers.add_parser(
+        "similar", help="argsort vs argpartition top-k for get_similar_books"
+    )
+    similar.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 5000, 20000, 100000]
+    )
+    similar.add_argument("--limit", type=int, default=10)
+    similar.add_argument("--rows", type=int, default=32, help="Distinct rows per size")
+    similar.add_argument("--repeats", type=int, default=200)
+    similar.set_defaults(func=bench_similar)
+
+    ann = subparsers.add_parser("ann", help="exact vs IVF embedding retrieval")
+    ann.add_argument("--books", type=int, default=100000)
+    ann.add_argument("--dim", type=int, default=768)
+    ann.add_argument("--clusters", type=int, default=200)
+    ann.add_argument("--k", type=int, default=10)
+    ann.add_argument("--n-probe", type=int, default=8)
+    ann.add_argument("--queries", type=int, default=100)
+    ann.set_defaults(func=bench_ann)
+
+    sample = subparsers.add_parser(
+        "sample", help="discovery sampler, per-category pandas vs vectorized"
+    )
+    sample.add_argument("--books", type=int, default=100000)
+    sample.add_argument("--categories", type=int, default=20)
+    sample.add_argument("--limit", type=int, default=10)
+    sample.add_argument("--repeats", type=int, default=200)
+    sample.set_defaults(func=bench_sample)
+
+    batch = subparsers.add_parser(
+        "batch", help="per-user vs batched history recommendations"
+    )
+    batch.add_argument("--books", type=int, default=5000)
+    batch.add_argument("--users", type=int, default=2000)
+    batch.add_argument("--history", type=int, default=20, help="Books read per user")
+    batch.add_argument(
+        "--pool", type=int, default=None, help="Draw histories from this many books (overlap)"
+    )
+    batch.add_argument("--limit", type=int, default=10)
+    batch.add_argument("--block-size", type=int, default=64)
+    batch.add_argument(
+        "--source", choices=["matrix", "neighbors", "embeddings"], default="matrix"
+    )
+    batch.add_argument("--k", type=int, default=50, help="Neighbors per book (--source neighbors)")
+    batch.add_argument("--dimension", type=int, default=256, help="Embedding size (--source embeddings)")
+    batch.set_defaults(func=bench_batch)
+
+    preprocess = subparsers.add_parser(
+        "preprocess", help="Arabic text preprocessing, per-string loop vs batch API"
+    )
+    preprocess.add_argument("--texts", type=int, default=50000)
+    preprocess.add_argument("--words", type=int, default=60, help="Words per text")
+    preprocess.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    preprocess.add_argument("--chunk-size", type=int, default=5000)
+    preprocess.set_defaults(func=bench_preprocess)
+
+    books = subparsers.add_parser(
+        "books", help="book metadata memory and hydration, DataFrame vs BookStore"
+    )
+    books.add_argument("--books", type=int, default=100000)
+    books.add_argument("--words", type=int, default=80, help="Words per description")
+    books.add_argument("--lookups", type=int, default=20000)
+    books.set_defaults(func=bench_books)
+
+    load = subparsers.add_parser(
+        "load", help="startup time and RSS per worker, eager vs mmap loading"
+    )
+    load.add_argument("--data-dir", default="../data")
+    load.set_defaults(func=bench_load)
+
+    coldstart = subparsers.add_parser(
+        "coldstart", help="startup time from data/ files vs the artifact bundle"
+    )
+    coldstart.add_argument("--data-dir", default="../data")
+    coldstart.add_argument("--repeats", type=int, default=3, help="Fresh processes per source")
+    coldstart.set_defaults(func=bench_coldstart)
+
+    http = subparsers.add_parser(
+        "http", help="load test a running server with concurrent clients"
+    )
+    http.add_argument("--url", default="http://localhost:8000")
+    http.add_argument(
+        "--paths",
+        nargs="+",
+        default=["/books/search?query=a", "/books/1/recommendations", "/stats"],
+        help="Request paths, issued round-robin",
+    )
+    http.add_argument("--clients", type=int, default=32)
+    http.add_argument("--requests", type=int, default=1000)
+    http.set_defaults(func=bench_http)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
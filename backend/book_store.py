@@ -0,0 +1,219 @@
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+#? fields of a book record, in response order
+FIELDS = ("book_id", "title", "category", "description_to_display")
+#? free-text fields, stored as one UTF-8 buffer plus row offsets each
+TEXT_FIELDS = ("title", "description_to_display")
+
+
+def encode_texts(texts: Iterable) -> Tuple[bytes, np.ndarray]:
+    """Concatenate texts into one UTF-8 buffer; row i is buffer[offsets[i]:offsets[i + 1]]."""
+    encoded = [text.encode("utf-8") if isinstance(text, str) else b"" for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    return b"".join(encoded), offsets
+
+
+def decode_texts(buffer, offsets: np.ndarray) -> List[str]:
+    """Inverse of encode_texts; `buffer` may be bytes or a memoryview."""
+    bounds = offsets.tolist()
+    return [str(buffer[a:b], "utf-8") for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+class BookRow(Mapping):
+    """
+    Read-only view of one book in a BookStore.
+
+    Behaves like the book's dict (`book["title"]`, `{**book}`, `BookInfo(**book)`)
+    but holds only the store and the row; each field is decoded when read.
+    """
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: "BookStore", row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, field: str):
+        return self._store.field(self._row, field)
+
+    def keys(self):
+        #? `{**book}` asks for keys() first; a plain tuple skips the KeysView
+        return FIELDS
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __repr__(self) -> str:
+        return f"BookRow({dict(self)!r})"
+
+
+class BookStore:
+    """
+    Immutable columnar book metadata.
+
+    Book ids are an int64 array, categories are interned as int32 codes into
+    `categories` (in order of first appearance, "" for a missing category),
+    and titles and descriptions each live in one contiguous UTF-8 buffer with
+    an offsets array (buffers may also be memoryviews into a mapped artifact
+    bundle). `store[row]` returns a BookRow view, so hydrating a book
+    allocates nothing until its fields are read. `append` returns a new store;
+    an existing store never changes, so readers need no locks.
+    """
+
+    def __init__(
+        self,
+        book_ids: np.ndarray,
+        category_codes: np.ndarray,
+        categories: List[str],
+        text_buffers: Dict[str, bytes],
+        text_offsets: Dict[str, np.ndarray],
+    ):
+        self.book_ids = book_ids
+        self.category_codes = category_codes
+        self.categories = categories
+        self._buffers = text_buffers
+        self._offsets = text_offsets
+        for array in (book_ids, category_codes, *text_offsets.values()):
+            array.setflags(write=False)
+        #? memoryviews index to plain Python ints, much faster than NumPy scalars
+        self._ids_view = memoryview(book_ids)
+        self._codes_view = memoryview(category_codes)
+        self._offset_views = {field: memoryview(offsets) for field, offsets in text_offsets.items()}
+        self._buffer_views = {field: memoryview(buffer) for field, buffer in text_buffers.items()}
+
+        #? book_id == row position is the normal case and needs no lookup table
+        n_books = len(book_ids)
+        self._contiguous_ids = bool(
+            n_books == 0 or (book_ids[0] == 0 and np.all(np.diff(book_ids) == 1))
+        )
+        self._id_to_row: Optional[Dict[int, int]] = None
+        if not self._contiguous_ids:
+            self._id_to_row = {int(book_id): row for row, book_id in enumerate(book_ids.tolist())}
+
+    @classmethod
+    def from_columns(cls, book_ids, titles, categories, descriptions) -> "BookStore":
+        category_values = ["" if not isinstance(c, str) else c for c in categories]
+        codes, uniques = pd.factorize(pd.Series(category_values, dtype=object))
+        title_buffer, title_offsets = encode_texts(titles)
+        description_buffer, description_offsets = encode_texts(descriptions)
+        return cls(
+            np.asarray(book_ids, dtype=np.int64),
+            codes.astype(np.int32),
+            uniques.tolist(),
+            {"title": title_buffer, "description_to_display": description_buffer},
+            {"title": title_offsets, "description_to_display": description_offsets},
+        )
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "BookStore":
+        return cls.from_columns(
+            frame["book_id"].to_numpy(),
+            frame["title"].tolist(),
+            frame["category"].tolist(),
+            frame["description_to_display"].tolist()
+            if "description_to_display" in frame.columns
+            else [""] * len(frame),
+        )
+
+    @classmethod
+    def from_csv(cls, path: str) -> "BookStore":
+        """Read book_metadata.csv; columns other than FIELDS are ignored."""
+        frame = pd.read_csv(path, usecols=lambda column: column in FIELDS)
+        return cls.from_frame(frame)
+
+    def __len__(self) -> int:
+        return len(self.book_ids)
+
+    def __getitem__(self, row: int) -> BookRow:
+        if not 0 <= row < len(self.book_ids):
+            raise IndexError(f"row {row} out of range")
+        return BookRow(self, row)
+
+    def __iter__(self):
+        return (BookRow(self, row) for row in range(len(self.book_ids)))
+
+    def field(self, row: int, field: str):
+        """Decode one field of one row."""
+        offsets = self._offset_views.get(field)
+        if offsets is not None:
+            #? decoded straight from a slice of the shared buffer, no intermediate bytes
+            return str(self._buffer_views[field][offsets[row] : offsets[row + 1]], "utf-8")
+        if field == "book_id":
+            return self._ids_view[row]
+        if field == "category":
+            code = self._codes_view[row]
+            return self.categories[code] if code >= 0 else ""
+        raise KeyError(field)
+
+    def text_column(self, field: str) -> List[str]:
+        """Every row's value of a text field, decoded (for indexing and saving)."""
+        return decode_texts(self._buffer_views[field], self._offsets[field])
+
+    def text_buffer(self, field: str) -> Tuple[memoryview, np.ndarray]:
+        """The raw UTF-8 buffer and offsets of a text field."""
+        return self._buffer_views[field], self._offsets[field]
+
+    def category_column(self) -> List[str]:
+        return [self.categories[code] if code >= 0 else "" for code in self.category_codes.tolist()]
+
+    def row_of(self, book_id: int) -> Optional[int]:
+        """Row position of a book_id, or None when unknown."""
+        if self._contiguous_ids:
+            return book_id if 0 <= book_id < len(self.book_ids) else None
+        return self._id_to_row.get(book_id)
+
+    def append(self, books: List[Dict]) -> "BookStore":
+        """A new store with `books` (dicts with FIELDS) added after the existing rows."""
+        categories = list(self.categories)
+        positions = {category: code for code, category in enumerate(categories)}
+        new_codes = []
+        for book in books:
+            category = book.get("category") or ""
+            if category not in positions:
+                positions[category] = len(categories)
+                categories.append(category)
+            new_codes.append(positions[category])
+
+        buffers, offsets = {}, {}
+        for field in TEXT_FIELDS:
+            buffer, new_offsets = encode_texts(book.get(field, "") for book in books)
+            old_offsets = self._offsets[field]
+            buffers[field] = bytes(self._buffers[field]) + buffer
+            offsets[field] = np.concatenate([old_offsets, old_offsets[-1] + new_offsets[1:]])
+
+        return BookStore(
+            np.concatenate([self.book_ids, np.array([book["book_id"] for book in books], dtype=np.int64)]),
+            np.concatenate([self.category_codes, np.array(new_codes, dtype=np.int32)]),
+            categories,
+            buffers,
+            offsets,
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """The store as a DataFrame with FIELDS columns (for writing book_metadata.csv)."""
+        return pd.DataFrame(
+            {
+                "book_id": self.book_ids,
+                "title": self.text_column("title"),
+                "category": self.category_column(),
+                "description_to_display": self.text_column("description_to_display"),
+            }
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the columns (excluding the small category list)."""
+        return (
+            self.book_ids.nbytes
+            + self.category_codes.nbytes
+            + sum(len(buffer) for buffer in self._buffers.values())
+            + sum(offsets.nbytes for offsets in self._offsets.values())
+        )
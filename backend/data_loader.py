@@ -1,35 +1,138 @@
-import pandas as pd
 import numpy as np
+from numpy.lib.format import open_memmap
 import pickle
+import copy
+import gc
 import os
-from typing import Dict, List, Optional
+import threading
+from typing import Callable, Dict, List, Optional
+
+from neighbor_index import (
+    NeighborIndex,
+    top_k_indices,
+    top_k_per_row,
+)
+from search_index import NgramIndex
+from book_store import BookStore
+from artifact_bundle import ARRAY_SECTIONS, BUNDLE_FILE, ArtifactBundle, write_bundle
+from arabic_text import normalize_search_text, normalize_search_texts
+from embedding_index import (
+    EMBEDDINGS_FILE,
+    INDEX_ARRAYS,
+    INDEX_INFO_FILE,
+    build_embedding_index,
+    load_index_arrays,
+    save_index_arrays,
+)
+from sampling import sample_rows, stratified_sample
+
+#? similarity arrays persisted as `<name>.npy` (and bundle sections of that name)
+SIMILARITY_ARRAYS = ["similarity_matrix", "neighbor_ids", "neighbor_scores"]
+#? stack histories into one matmul when their distinct rows are at most this
+#? many times the average history length (i.e. when they overlap enough)
+SHARED_ROWS_FACTOR = 8
+
+
+def _extend_matrix(
+    matrix: np.ndarray, cross: np.ndarray, out: np.ndarray, block_size: int = 4096
+) -> np.ndarray:
+    """Copy an N x N matrix into `out` and fill the rows/columns of the M new books from `cross`."""
+    n_old = matrix.shape[0]
+    for start in range(0, n_old, block_size):
+        end = min(start + block_size, n_old)
+        out[start:end, :n_old] = matrix[start:end, :n_old]
+    out[:, n_old:] = cross
+    out[n_old:, :] = cross.T
+    return out
 
 
 class DataLoader:
     """Handles loading and managing all data artifacts for the book recommendation system."""
 
-    def __init__(self, data_dir: str = "../data"):
+    def __init__(
+        self,
+        data_dir: str = "../data",
+        use_neighbor_index: bool = True,
+        embedding_index_kind: Optional[str] = None,
+        mmap: Optional[bool] = None,
+        seed: Optional[int] = None,
+        use_bundle: Optional[bool] = None,
+    ):
         self.data_dir = data_dir
-        self.book_metadata = None
+        self.use_neighbor_index = use_neighbor_index
+        #? prefer data/bookwise.bundle over the CSV/pickle/.npy files when it exists
+        if use_bundle is None:
+            use_bundle = os.environ.get("BOOKWISE_BUNDLE", "1").lower() in ("1", "true", "yes")
+        self.use_bundle = use_bundle
+        self.bundle = None
+        #? memory-map the .npy artifacts so workers share pages via the OS page cache
+        if mmap is None:
+            mmap = os.environ.get("BOOKWISE_MMAP", "0").lower() in ("1", "true", "yes")
+        self.mmap_mode = "r" if mmap else None
+        #? "exact" (blocked brute force) or "ivf" (approximate) retrieval over embeddings
+        self.embedding_index_kind = embedding_index_kind or os.environ.get(
+            "BOOKWISE_EMBEDDING_INDEX", "exact"
+        )
+        #? random source for discovery/popular sampling; pass a seed for reproducible runs
+        self.rng = np.random.default_rng(seed)
+        #? columnar book metadata; books[row] is a read-only dict-like view
+        self.books = None
+        self.title_index = None
+        self.category_index = None
+        self.categories = None
+        self.category_rows = None
+        self.category_row_order = None
+        self.category_offsets = None
+        self.category_counts = None
+        self._stats = None
+        #? snapshot version, assigned by DataLoaderHandle on each swap/update
+        self.version = 0
         self.similarity_matrix = None
+        self.neighbor_index = None
         self.title_to_index = None
         self.index_to_title = None
         self.book_embeddings = None
+        #? built (or mapped from saved index arrays) on first use, see embedding_index
+        self._embedding_index = None
+        self._embedding_index_lock = threading.Lock()
+        #? serializes save_artifacts; readers never take it
+        self._update_lock = threading.Lock()
 
     def load_all_data(self):
         """Load all data artifacts from the data directory."""
         try:
             print("Loading book recommendation data...")
 
+            bundle_path = os.path.join(self.data_dir, BUNDLE_FILE)
+            if self.use_bundle and os.path.exists(bundle_path):
+                self._load_bundle(bundle_path)
+                self._stats = self._compute_stats()
+                print(" All data loaded successfully!")
+                return True
+
             # Load book metadata
             metadata_path = os.path.join(self.data_dir, "book_metadata.csv")
-            self.book_metadata = pd.read_csv(metadata_path)
-            print(f"✅ Loaded {len(self.book_metadata)} books from metadata")
+            self.books = BookStore.from_csv(metadata_path)
+            print(f"✅ Loaded {len(self.books)} books from metadata ({self.books.nbytes / 1e6:.1f} MB)")
+            self._build_category_index()
+            self._build_search_index()
 
-            # Load similarity matrix
+            #? Prefer the compact top-k neighbor index (N x K) over the dense N x N matrix;
+            #? with only book_embeddings.npy present, the embedding index serves everything
             similarity_path = os.path.join(self.data_dir, "similarity_matrix.npy")
-            self.similarity_matrix = np.load(similarity_path)
-            print(f"✅ Loaded similarity matrix: {self.similarity_matrix.shape}")
+            embeddings_path = os.path.join(self.data_dir, "book_embeddings.npy")
+            if self.use_neighbor_index and NeighborIndex.exists(self.data_dir):
+                self.neighbor_index = NeighborIndex.load(
+                    self.data_dir, mmap_mode=self.mmap_mode
+                )
+                print(f"✅ Loaded neighbor index: {self.neighbor_index.shape}")
+            elif os.path.exists(similarity_path) or not os.path.exists(embeddings_path):
+                self.similarity_matrix = np.load(
+                    similarity_path, mmap_mode=self.mmap_mode
+                )
+                print(f"✅ Loaded similarity matrix: {self.similarity_matrix.shape}")
+            else:
+                print("  Similarity matrix not found - will use book embeddings only")
 
             # Load title to index .. from pkl file we saved after embedding .... see read me file for more details
             title_to_index_path = os.path.join(self.data_dir, "title_to_index.pkl")
@@ -48,13 +151,15 @@ class DataLoader:
             )
 
             #? Try to load book embeddings 
-            embeddings_path = os.path.join(self.data_dir, "book_embeddings.npy")
             if os.path.exists(embeddings_path):
-                self.book_embeddings = np.load(embeddings_path)
+                self.book_embeddings = np.load(
+                    embeddings_path, mmap_mode=self.mmap_mode
+                )
                 print(f" Loaded book embeddings: {self.book_embeddings.shape}")
             else:
                 print("  Book embeddings not found - will use similarity matrix only")
 
+            self._stats = self._compute_stats()
             print(" All data loaded successfully!")
             return True
 
@@ -62,33 +167,397 @@ class DataLoader:
             print(f" Error loading data: {str(e)}")
             return False
 
+    def _load_bundle(self, path: str):
+        """Map every artifact from the binary bundle; sections are read on first use."""
+        bundle = ArtifactBundle(path)
+        self.bundle = bundle
+        #? every array is a view of one read-only mapping, as with BOOKWISE_MMAP=1
+        self.mmap_mode = "r"
+        self.books = bundle.book_store()
+        print(f"✅ Mapped artifact bundle v{bundle.schema_version}: {len(self.books)} books")
+        self._build_category_index()
+        self._build_search_index(
+            bundle.texts("search.title_normalized") if "search.title_normalized.offsets" in bundle else None
+        )
+
+        if self.use_neighbor_index and "neighbor_ids" in bundle and "neighbor_scores" in bundle:
+            self.neighbor_index = NeighborIndex(
+                bundle.array("neighbor_ids"), bundle.array("neighbor_scores")
+            )
+            print(f"✅ Mapped neighbor index: {self.neighbor_index.shape}")
+        elif "similarity_matrix" in bundle:
+            self.similarity_matrix = bundle.array("similarity_matrix")
+            print(f"✅ Mapped similarity matrix: {self.similarity_matrix.shape}")
+        elif "book_embeddings" not in bundle:
+            raise ValueError(f"{path} has no similarity matrix, neighbor index or embeddings")
+
+        #? built from their sections only if something reads them
+        self.title_to_index = bundle.title_to_index()
+        self.index_to_title = bundle.index_to_title()
+
+        if "book_embeddings" in bundle:
+            self.book_embeddings = bundle.array("book_embeddings")
+            print(f" Mapped book embeddings: {self.book_embeddings.shape}")
+
+    @property
+    def embedding_index(self):
+        """
+        Retrieval index over book_embeddings (None without embeddings).
+
+        Built on first use, so a catalog served from the matrix or neighbor
+        index never pays for it; saved index arrays (normalized matrix, IVF
+        lists) are mapped instead of recomputed when they are present.
+        """
+        if self._embedding_index is None and self.book_embeddings is not None:
+            with self._embedding_index_lock:
+                if self._embedding_index is None:
+                    self._embedding_index = self._build_embedding_index()
+        return self._embedding_index
+
+    def _build_embedding_index(self):
+        if self.bundle is not None:
+            arrays = {name: self.bundle.array(name) for name in INDEX_ARRAYS if name in self.bundle}
+        else:
+            arrays = load_index_arrays(self.data_dir, self.mmap_mode)
+        index = build_embedding_index(self.book_embeddings, self.embedding_index_kind, arrays=arrays)
+        print(f"✅ Built {index.kind} embedding index ({', '.join(arrays) or 'nothing'} from saved arrays)")
+        return index
+
+    def _uses_embeddings(self, use_embeddings: bool = False) -> bool:
+        """Whether a query goes to the embedding index: when asked, or as the only source."""
+        has_dense_source = (
+            self.neighbor_index is not None or self.similarity_matrix is not None
+        )
+        return self.book_embeddings is not None and (use_embeddings or not has_dense_source)
+
+    def _build_category_index(self):
+        """Group row positions by category (in order of first appearance) and count them."""
+        codes, categories = self.books.category_codes, self.books.categories
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+        counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+        #? rows with a missing category (code -1) sort first; skip past them
+        offsets = np.concatenate([[0], np.cumsum(counts)]) + int((codes < 0).sum())
+
+        self.categories = list(categories)
+        self.category_row_order = order
+        self.category_offsets = offsets
+        self.category_rows = {
+            category: order[offsets[i] : offsets[i + 1]]
+            for i, category in enumerate(self.categories)
+        }
+        self.category_counts = dict(zip(self.categories, counts.tolist()))
+        #? categories are few, so they are indexed by name and expanded to rows on a match
+        self.category_index = NgramIndex(
+            normalize_search_texts(list(self.categories)),
+            normalizer=normalize_search_text,
+            pre_normalized=True,
+        )
+
+    def _build_search_index(self, titles_normalized: Optional[List[str]] = None):
+        """Build the n-gram search index over Arabic-normalized titles."""
+        if titles_normalized is None:
+            titles_normalized = normalize_search_texts(self.books.text_column("title"))
+        self.title_index = NgramIndex(
+            titles_normalized,
+            normalizer=normalize_search_text,
+            pre_normalized=True,
+        )
+        print(f"✅ Built search index: {len(self.title_index.postings)} title n-grams")
+
+    def with_books(
+        self, new_books: List[Dict], new_embeddings: np.ndarray, block_size: int = 4096
+    ) -> "DataLoader":
+        """
+        A new snapshot with books (and their embeddings) appended.
+
+        Only similarities that involve the new books are computed: the new
+        rows/columns of the dense matrix, or a merge of the new candidates into
+        every top-k neighbor list. New book_ids must continue the row numbering
+        (or be omitted). This snapshot is left untouched: the new one gets its
+        own arrays, BookStore and indexes, and DataLoaderHandle.add_books swaps
+        it in, so readers never see a half-added book.
+        """
+        if self.book_embeddings is None:
+            raise ValueError("Adding books needs book embeddings to score them")
+
+        new_embeddings = np.atleast_2d(np.asarray(new_embeddings, dtype=np.float32))
+        if new_embeddings.shape != (len(new_books), self.book_embeddings.shape[1]):
+            raise ValueError(
+                f"Expected {len(new_books)} embeddings of dimension "
+                f"{self.book_embeddings.shape[1]}, got {new_embeddings.shape}"
+            )
+
+        n_old = len(self.books)
+        books = []
+        for offset, book in enumerate(new_books):
+            expected_id = n_old + offset
+            book_id = book.get("book_id")
+            if book_id is not None and int(book_id) != expected_id:
+                raise ValueError(
+                    f"book_id {book_id} must be {expected_id} (book ids are row positions)"
+                )
+            books.append(
+                {
+                    "book_id": expected_id,
+                    "title": str(book["title"]),
+                    "category": str(book.get("category", "")),
+                    "description_to_display": str(book.get("description_to_display", "")),
+                }
+            )
+
+        #? shares only what the update leaves alone; everything it changes is replaced
+        snapshot = copy.copy(self)
+        snapshot._update_lock = threading.Lock()
+        snapshot._embedding_index_lock = threading.Lock()
+        snapshot._add_similarities(self.embedding_index, new_embeddings, block_size)
+        snapshot._add_metadata(books)
+        snapshot._stats = snapshot._compute_stats()
+        print(f"✅ Added {len(books)} books ({len(snapshot.books)} total)")
+        return snapshot
+
+    def _add_similarities(self, index, new_embeddings: np.ndarray, block_size: int):
+        """Extend embeddings, the embedding index and the matrix / neighbor index."""
+        n_old = len(self.books)
+        shared = index.embeddings is self.book_embeddings
+        new_index = index.extended(new_embeddings)
+        self._embedding_index = new_index
+
+        #? similarity of every book (old and new) to each new book, in row blocks
+        cross = self._cross_scores(n_old, block_size)
+
+        if self.neighbor_index is not None:
+            self.neighbor_index = self.neighbor_index.extend(cross, block_size)
+        elif self.similarity_matrix is not None:
+            n_total = cross.shape[0]
+            self.similarity_matrix = _extend_matrix(
+                self.similarity_matrix,
+                cross,
+                np.empty((n_total, n_total), dtype=self.similarity_matrix.dtype),
+                block_size,
+            )
+
+        if shared:
+            self.book_embeddings = new_index.embeddings
+        else:
+            self.book_embeddings = np.concatenate(
+                [self.book_embeddings, new_embeddings.astype(self.book_embeddings.dtype)]
+            )
+
+    def _add_metadata(self, books: List[Dict]):
+        """Append rows to the book store, search/category indexes and title mappings."""
+        titles_normalized = normalize_search_texts([book["title"] for book in books])
+
+        self.books = self.books.append(books)
+        self.title_index = self.title_index.extended(titles_normalized, pre_normalized=True)
+        self._build_category_index()
+
+        if self.title_to_index is not None:
+            self.title_to_index = {
+                **self.title_to_index,
+                **{book["title"]: book["book_id"] for book in books},
+            }
+        if self.index_to_title is not None:
+            self.index_to_title = {
+                **self.index_to_title,
+                **{book["book_id"]: book["title"] for book in books},
+            }
+
+    def save_artifacts(self):
+        """
+        Write the (possibly extended) catalog back to the data directory.
+
+        Every artifact on disk is kept consistent with the catalog: similarity
+        arrays that are not loaded (e.g. the dense matrix next to an active
+        neighbor index) are extended with the similarities of the added books.
+        A snapshot loaded from a bundle rewrites the bundle and only those
+        loose files that exist (book_metadata.csv is still read by export.py
+        and embedding_pipeline.py).
+        """
+        with self._update_lock:
+            #? built before book_embeddings.npy is rewritten, while saved index arrays still match
+            index = None
+            if os.path.exists(os.path.join(self.data_dir, INDEX_INFO_FILE)) or (
+                self.bundle is not None and any(name in self.bundle for name in INDEX_ARRAYS)
+            ):
+                index = self.embedding_index
+
+            if self.bundle is not None:
+                scratch_path = os.path.join(self.data_dir, "similarity_matrix.bundle.tmp.npy")
+                try:
+                    write_bundle(
+                        self.bundle.path,
+                        self.books,
+                        self.title_to_index,
+                        self.index_to_title,
+                        self._bundle_arrays(index, scratch_path),
+                        titles_normalized=self.title_index.texts,
+                    )
+                finally:
+                    if os.path.exists(scratch_path):
+                        os.remove(scratch_path)
+            self._save_files(index, only_existing=self.bundle is not None)
+
+    def _save_files(self, index, only_existing: bool):
+        """Rewrite the loose artifacts (with `only_existing`, just the ones present)."""
+
+        def path_of(name: str) -> str:
+            return os.path.join(self.data_dir, name)
+
+        def replace(name: str, write):
+            if only_existing and not os.path.exists(path_of(name)):
+                return
+            with open(f"{path_of(name)}.tmp", "wb") as f:
+                write(f)
+            os.replace(f"{path_of(name)}.tmp", path_of(name))
+
+        replace(
+            "book_metadata.csv",
+            lambda f: self.books.to_frame().to_csv(f, index=False),
+        )
+        if self.book_embeddings is not None:
+            replace(EMBEDDINGS_FILE, lambda f: np.save(f, self.book_embeddings))
+        if self.title_to_index is not None:
+            replace("title_to_index.pkl", lambda f: pickle.dump(dict(self.title_to_index), f))
+        if self.index_to_title is not None:
+            replace("index_to_title.pkl", lambda f: pickle.dump(dict(self.index_to_title), f))
+
+        saved = {}
+        for name in SIMILARITY_ARRAYS:
+            if os.path.exists(path_of(f"{name}.npy")):
+                saved[name] = np.load(path_of(f"{name}.npy"), mmap_mode="r")
+        scratch_path = path_of("similarity_matrix.npy.tmp.npy")
+        arrays = self._similarity_arrays(saved, scratch_path)
+        for name, array in arrays.items():
+            if array is saved.get(name) or (only_existing and name not in saved):
+                continue
+            if name == "similarity_matrix" and os.path.exists(scratch_path):
+                #? extended on disk: the scratch memmap already is the new file
+                array.flush()
+                os.replace(scratch_path, path_of(f"{name}.npy"))
+            else:
+                replace(f"{name}.npy", lambda f: np.save(f, array))
+
+        #? index arrays are an opt-in cache (embedding_index.py): refresh them, never create them
+        if (
+            index is not None
+            and os.path.exists(path_of(EMBEDDINGS_FILE))
+            and os.path.exists(path_of(INDEX_INFO_FILE))
+        ):
+            save_index_arrays(index, self.data_dir)
+
+    def _similarity_arrays(
+        self, saved: Dict[str, np.ndarray], scratch_path: str
+    ) -> Dict[str, np.ndarray]:
+        """
+        Similarity arrays to persist: the loaded ones, plus every `saved` one
+        that is not loaded, extended to the books added since it was written
+        (a dense matrix into a memmap at `scratch_path`).
+        """
+        n_books = len(self.books)
+        for name, array in saved.items():
+            if len(array) > n_books:
+                raise ValueError(
+                    f"Saved {name} has {len(array)} rows but the catalog has {n_books} books"
+                )
+
+        arrays = {}
+        if self.neighbor_index is not None:
+            index = self.neighbor_index
+        elif "neighbor_ids" in saved and "neighbor_scores" in saved:
+            index = NeighborIndex(saved["neighbor_ids"], saved["neighbor_scores"])
+            if len(index) < n_books:
+                index = index.extend(self._cross_scores(len(index)))
+        else:
+            index = None
+        if index is not None:
+            arrays["neighbor_ids"] = index.neighbor_ids
+            arrays["neighbor_scores"] = index.neighbor_scores
+
+        if self.similarity_matrix is not None:
+            arrays["similarity_matrix"] = self.similarity_matrix
+        elif "similarity_matrix" in saved:
+            matrix = saved["similarity_matrix"]
+            if len(matrix) < n_books:
+                out = open_memmap(
+                    scratch_path, mode="w+", dtype=matrix.dtype, shape=(n_books, n_books)
+                )
+                matrix = _extend_matrix(matrix, self._cross_scores(len(matrix)), out)
+            arrays["similarity_matrix"] = matrix
+        return arrays
+
+    def _bundle_arrays(self, index, scratch_path: str) -> Dict[str, np.ndarray]:
+        """
+        Every array section of the loaded bundle, for this catalog: loaded
+        arrays as they are, the others extended to the added books.
+        """
+        saved = {name: self.bundle.array(name) for name in SIMILARITY_ARRAYS if name in self.bundle}
+        arrays = self._similarity_arrays(saved, scratch_path)
+        if self.book_embeddings is not None:
+            arrays["book_embeddings"] = self.book_embeddings
+        #? as with the loose files, index arrays are refreshed only where they were saved
+        if index is not None and any(name in self.bundle for name in INDEX_ARRAYS):
+            arrays.update(index.arrays())
+            if index.embeddings is self.book_embeddings:
+                #? embeddings are stored normalized; no second copy
+                del arrays["normalized_embeddings"]
+
+        missing = [
+            name
+            for name in ARRAY_SECTIONS + INDEX_ARRAYS
+            if name in self.bundle and name not in arrays
+        ]
+        if missing:
+            raise ValueError(
+                f"Refusing to rewrite {self.bundle.path}: it would drop {', '.join(missing)}"
+            )
+        return arrays
+
+    def _cross_scores(self, first_row: int, block_size: int = 4096) -> np.ndarray:
+        """(N x M) similarity of every book to the books from `first_row` on."""
+        if self.book_embeddings is None:
+            raise ValueError("Extending similarity arrays needs book embeddings")
+        item_matrix = self.embedding_index.embeddings
+        new_normalized = np.asarray(item_matrix[first_row:], dtype=np.float32)
+        cross = np.empty((item_matrix.shape[0], new_normalized.shape[0]), dtype=np.float32)
+        for start in range(0, item_matrix.shape[0], block_size):
+            cross[start : start + block_size] = (
+                item_matrix[start : start + block_size] @ new_normalized.T
+            )
+        return cross
+
     def get_book_by_id(self, book_id: int) -> Optional[Dict]:
-        """Get book information by book_id."""
-        if self.book_metadata is None:
+        """Get book information by book_id (read-only dict-like view)."""
+        if self.books is None:
             return None
 
-        book_row = self.book_metadata[self.book_metadata["book_id"] == book_id]
-        if book_row.empty:
+        row = self.books.row_of(book_id)
+        if row is None:
             return None
 
-        return book_row.iloc[0].to_dict()
+        return self.books[row]
+
+    def get_books_by_ids(self, book_ids: List[int]) -> List[Dict]:
+        """Hydrate a list of book_ids in order, skipping unknown ids (read-only views)."""
+        if self.books is None:
+            return []
+
+        rows = (self.books.row_of(book_id) for book_id in book_ids)
+        return [self.books[row] for row in rows if row is not None]
 
     def get_book_by_title(self, title: str) -> Optional[Dict]:
-        """Get book information by title."""
-        if self.book_metadata is None:
+        """Get book information by title (best-ranked match)."""
+        if self.title_index is None:
             return None
 
-        book_row = self.book_metadata[
-            self.book_metadata["title"].str.contains(title, case=False, na=False)
-        ]
-        if book_row.empty:
+        rows = self.title_index.search(title, limit=1)
+        if not rows:
             return None
 
-        return book_row.iloc[0].to_dict()
+        return self.books[rows[0]]
 
     def search_books(self, query: str, limit: int = 10) -> List[Dict]:
-        """Search books by title or category."""
-        if self.book_metadata is None:
+        """Search books by title or category, title matches ranked first."""
+        if self.title_index is None:
             return []
 
         #? If query is empty, return random books ..
@@ -96,151 +565,604 @@ class DataLoader:
             return self.get_random_books_from_categories(limit)
 
         #? Search by  title and category
-        mask = self.book_metadata["title"].str.contains(
-            query, case=False, na=False
-        ) | self.book_metadata["category"].str.contains(query, case=False, na=False)
+        rows = self.title_index.search(query, limit)
+        if len(rows) < limit:
+            seen = set(rows)
+            for row in self._iter_category_rows(query):
+                if row not in seen:
+                    rows.append(row)
+                    if len(rows) >= limit:
+                        break
 
-        results = self.book_metadata[mask].head(limit)
-        return results.to_dict("records")
+        return [self.books[row] for row in rows]
 
     def get_similar_books(self, book_id: int, limit: int = 10) -> List[Dict]:
-        """Get similar books using the similarity matrix."""
-        
-        if self.similarity_matrix is None or book_id >= len(self.similarity_matrix):
+        """Get similar books using the neighbor index or the similarity matrix."""
+
+        if self.neighbor_index is not None:
+            return self._get_similar_books_from_index(book_id, limit)
+
+        if self.similarity_matrix is None:
+            if self.book_embeddings is not None:
+                return self._get_similar_books_from_embeddings(book_id, limit)
+            return []
+
+        if book_id >= len(self.similarity_matrix):
             return []
 
         #? Get similarity scores for the given book ..
         similarities = self.similarity_matrix[book_id]
 
-        #? get indices of most similar books 
-        similar_indices = np.argsort(similarities)[::-1][1 : limit + 1]
+        #? partial top-k selection; the query book is excluded by id
+        similar_indices = top_k_indices(similarities, limit, exclude=book_id)
 
         # get book information for similar books
         similar_books = []
         
         for idx in similar_indices:
-            if idx < len(self.book_metadata):
-                book_info = self.book_metadata.iloc[idx].to_dict()
-                book_info["similarity"] = float(similarities[idx])
+            if idx < len(self.books):
+                book_info = {**self.books[idx], "similarity": float(similarities[idx])}
                 similar_books.append(book_info)
 
         return similar_books
 
+    def _get_similar_books_from_index(self, book_id: int, limit: int) -> List[Dict]:
+        """Answer item-to-item queries from the top-k neighbor index."""
+        neighbor_ids, scores = self.neighbor_index.neighbors(book_id, limit)
+
+        similar_books = []
+        for idx, score in zip(neighbor_ids, scores):
+            if idx < len(self.books):
+                book_info = {**self.books[idx], "similarity": float(score)}
+                similar_books.append(book_info)
+
+        return similar_books
+
+    def _get_similar_books_from_embeddings(self, book_id: int, limit: int) -> List[Dict]:
+        """Answer item-to-item queries from the embedding index."""
+        if not 0 <= book_id < len(self.embedding_index):
+            return []
+
+        ids, scores = self.embedding_index.search(
+            self.embedding_index.embeddings[book_id], limit + 1
+        )
+        return [
+            {**self.books[idx], "similarity": float(score)}
+            for idx, score in zip(ids[0], scores[0])
+            if idx != book_id and 0 <= idx < len(self.books)
+        ][:limit]
+
+    def get_similarity(self, book_id: int, other_book_id: int) -> float:
+        """Similarity score between two books (0.0 when unknown)."""
+        if self.neighbor_index is not None:
+            return self.neighbor_index.similarity(book_id, other_book_id)
+
+        if self.similarity_matrix is not None:
+            source = self.similarity_matrix
+        elif self.book_embeddings is not None:
+            source = self.embedding_index.embeddings
+        else:
+            return 0.0
+
+        n_books = len(source)
+        if not (0 <= book_id < n_books and 0 <= other_book_id < n_books):
+            return 0.0
+
+        if self.similarity_matrix is None:
+            return float(source[book_id] @ source[other_book_id])
+        return float(self.similarity_matrix[book_id][other_book_id])
+
+    def get_history_scores(
+        self,
+        book_ids: List[int],
+        weights: Optional[np.ndarray] = None,
+        use_embeddings: bool = False,
+        block_size: int = 64,
+    ) -> Optional[np.ndarray]:
+        """
+        Score every book against a reading history in one vectorized pass.
+
+        Returns the (weighted) average similarity of each book to the history
+        books as an array indexed by row, or None when no similarity source
+        is loaded. With `use_embeddings` (or when embeddings are the only
+        source) the mean user vector is matched against the item matrix.
+        """
+        n_books = len(self.books) if self.books is not None else 0
+        book_ids = np.asarray(book_ids, dtype=np.int64)
+        valid = (book_ids >= 0) & (book_ids < n_books)
+        rows = book_ids[valid]
+        if rows.size == 0:
+            return None
+
+        if weights is None:
+            weights = np.ones(rows.size, dtype=np.float32)
+        else:
+            weights = np.asarray(weights, dtype=np.float32)[valid]
+        total = weights.sum()
+        if total > 0:
+            weights = weights / total
+        else:
+            #? all-zero weights would make every score NaN; fall back to a plain average
+            weights = np.full(rows.size, 1.0 / rows.size, dtype=np.float32)
+
+        if self._uses_embeddings(use_embeddings):
+            item_matrix = self.embedding_index.embeddings
+            user_vector = weights @ item_matrix[rows]
+            return item_matrix @ user_vector
+
+        if self.neighbor_index is not None:
+            neighbor_ids = self.neighbor_index.neighbor_ids[rows]
+            neighbor_scores = self.neighbor_index.neighbor_scores[rows].astype(np.float32)
+            return np.bincount(
+                neighbor_ids.ravel(),
+                weights=(neighbor_scores * weights[:, None]).ravel(),
+                minlength=n_books,
+            )[:n_books]
+
+        if self.similarity_matrix is not None:
+            #? sum history rows in blocks so only block_size x N floats are live
+            scores = np.zeros(self.similarity_matrix.shape[1], dtype=np.float32)
+            for start in range(0, rows.size, block_size):
+                block_rows = rows[start : start + block_size]
+                block = np.asarray(self.similarity_matrix[block_rows], dtype=np.float32)
+                scores += weights[start : start + block_size] @ block
+            return scores[:n_books]
+
+        return None
+
+    def get_history_recommendations(
+        self, book_ids: List[int], limit: int = 10, use_embeddings: bool = False
+    ) -> List[Dict]:
+        """
+        Top `limit` unread books for a reading history, with average similarity.
+
+        Uses embedding retrieval (exact or IVF) for the mean user vector when
+        requested or when embeddings are the only similarity source; otherwise
+        scores the whole catalog with get_history_scores.
+        """
+        exclude = np.asarray(book_ids, dtype=np.int64)
+
+        if self._uses_embeddings(use_embeddings):
+            n_books = len(self.embedding_index)
+            rows = exclude[(exclude >= 0) & (exclude < n_books)]
+            if rows.size == 0:
+                return []
+            read_rows = set(rows.tolist())
+            user_vector = self.embedding_index.embeddings[rows].mean(axis=0)
+            ids, scores = self.embedding_index.search(user_vector, limit + rows.size)
+            ranked = [
+                (idx, score)
+                for idx, score in zip(ids[0], scores[0])
+                if idx >= 0 and idx not in read_rows
+            ][:limit]
+        else:
+            scores = self.get_history_scores(book_ids)
+            if scores is None:
+                return []
+            top_rows = top_k_indices(scores, limit, exclude=exclude)
+            ranked = [(row, scores[row]) for row in top_rows]
+            if self.neighbor_index is not None:
+                #? books in no history row's top-k score 0; they are not neighbors
+                ranked = [(row, score) for row, score in ranked if score > 0]
+
+        return [
+            {**self.books[row], "similarity": float(score)}
+            for row, score in ranked
+            if row < len(self.books)
+        ]
+
+    def _stack_histories(self, histories: List[List[int]], n_books: int):
+        """
+        Flatten several histories into (user positions, rows, weights, counts).
+
+        Each valid history row gets weight 1 / (valid rows of that history), so
+        weighted sums are per-user averages; `counts` is 0 for empty histories.
+        """
+        lengths = [len(history) for history in histories]
+        user_idx = np.repeat(np.arange(len(histories)), lengths)
+        rows = np.fromiter(
+            (book_id for history in histories for book_id in history),
+            dtype=np.int64,
+            count=sum(lengths),
+        )
+        valid = (rows >= 0) & (rows < n_books)
+        user_idx, rows = user_idx[valid], rows[valid]
+
+        counts = np.bincount(user_idx, minlength=len(histories))
+        weights = (1.0 / counts[user_idx]).astype(np.float32)
+        return user_idx, rows, weights, counts
+
+    def _user_vectors(self, user_idx, rows, weights, counts, item_matrix) -> np.ndarray:
+        """
+        (n_users x columns) weighted sums of the history rows of `item_matrix`.
+
+        When the histories share books, the distinct rows are gathered once and
+        combined with a (users x distinct rows) weight matrix in one matmul.
+        Mostly disjoint histories would make that matmul mostly zeros, so each
+        user's rows are then summed with its own gemv, which stays in cache.
+        """
+        result = np.zeros((len(counts), item_matrix.shape[1]), dtype=np.float32)
+        present = np.flatnonzero(counts)
+        if present.size == 0:
+            return result
+
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        if unique_rows.size <= SHARED_ROWS_FACTOR * rows.size / present.size:
+            stacked_weights = np.zeros((len(counts), unique_rows.size), dtype=np.float32)
+            np.add.at(stacked_weights, (user_idx, inverse), weights)
+            return stacked_weights @ np.asarray(item_matrix[unique_rows], dtype=np.float32)
+
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        for user in present.tolist():
+            user_slice = slice(bounds[user], bounds[user + 1])
+            result[user] = weights[user_slice] @ np.asarray(
+                item_matrix[rows[user_slice]], dtype=np.float32
+            )
+        return result
+
+    def get_history_scores_batch(
+        self, histories: List[List[int]], use_embeddings: bool = False
+    ) -> Optional[np.ndarray]:
+        """
+        Batched get_history_scores: a (len(histories) x N) array of the average
+        similarity of every book to each history (all zeros for empty ones).
+        """
+        n_books = len(self.books) if self.books is not None else 0
+        user_idx, rows, weights, counts = self._stack_histories(histories, n_books)
+        n_users = len(histories)
+
+        if self._uses_embeddings(use_embeddings):
+            item_matrix = self.embedding_index.embeddings
+            user_vectors = self._user_vectors(user_idx, rows, weights, counts, item_matrix)
+            return (user_vectors @ np.asarray(item_matrix[:n_books]).T).astype(np.float32)
+
+        if self.neighbor_index is not None:
+            neighbor_ids = self.neighbor_index.neighbor_ids[rows].astype(np.int64)
+            neighbor_scores = self.neighbor_index.neighbor_scores[rows].astype(np.float32)
+            in_range = neighbor_ids < n_books
+            #? one bincount over (user, book) cells instead of one per user
+            cells = (user_idx[:, None] * n_books + neighbor_ids)[in_range]
+            cell_weights = (neighbor_scores * weights[:, None])[in_range]
+            return np.bincount(
+                cells, weights=cell_weights, minlength=n_users * n_books
+            ).reshape(n_users, n_books).astype(np.float32)
+
+        if self.similarity_matrix is not None:
+            user_vectors = self._user_vectors(
+                user_idx, rows, weights, counts, self.similarity_matrix
+            )
+            return user_vectors[:, :n_books]
+
+        return None
+
+    def get_history_recommendations_batch(
+        self,
+        histories: List[List[int]],
+        limit: int = 10,
+        use_embeddings: bool = False,
+        block_size: int = 64,
+    ) -> List[List[Dict]]:
+        """
+        get_history_recommendations for many histories at once.
+
+        Histories are processed `block_size` at a time and the top-k is taken
+        per row, so memory stays at block_size x N scores. With the neighbor
+        index a block is one bincount and with embeddings one index search;
+        with the dense matrix, histories that share few books are still summed
+        one user at a time (see _user_vectors), so that path gains little.
+        """
+        if limit <= 0:
+            return [[] for _ in histories]
+
+        results = []
+        for start in range(0, len(histories), block_size):
+            block = histories[start : start + block_size]
+            results.extend(self._history_recommendations_block(block, limit, use_embeddings))
+        return results
+
+    def _history_recommendations_block(
+        self, histories: List[List[int]], limit: int, use_embeddings: bool
+    ) -> List[List[Dict]]:
+        if self._uses_embeddings(use_embeddings):
+            n_books = len(self.embedding_index)
+            user_idx, rows, weights, counts = self._stack_histories(histories, n_books)
+            if rows.size == 0:
+                return [[] for _ in histories]
+            user_vectors = self._user_vectors(
+                user_idx, rows, weights, counts, self.embedding_index.embeddings
+            )
+            ids, scores = self.embedding_index.search(
+                user_vectors, limit + int(counts.max())
+            )
+        else:
+            n_books = len(self.books) if self.books is not None else 0
+            user_idx, rows, _, counts = self._stack_histories(histories, n_books)
+            scores = self.get_history_scores_batch(histories)
+            if scores is None:
+                return [[] for _ in histories]
+            scores[user_idx, rows] = -np.inf
+            if self.neighbor_index is not None:
+                #? as in get_history_recommendations: 0 means "not a neighbor"
+                scores[scores <= 0] = -np.inf
+            ids, scores = top_k_per_row(scores, limit)
+
+        results = []
+        for user, history in enumerate(histories):
+            if counts[user] == 0:
+                results.append([])
+                continue
+            read_rows = set(history)
+            results.append(
+                [
+                    {**self.books[row], "similarity": float(score)}
+                    for row, score in zip(ids[user].tolist(), scores[user].tolist())
+                    if 0 <= row < len(self.books)
+                    and row not in read_rows
+                    and score != -np.inf
+                ][:limit]
+            )
+        return results
+
+    def get_similar_books_batch(
+        self, book_ids: List[int], limit: int = 10, block_size: int = 256
+    ) -> List[List[Dict]]:
+        """get_similar_books for many books, scoring `block_size` rows per matmul/search."""
+        if limit <= 0:
+            return [[] for _ in book_ids]
+
+        if self.neighbor_index is not None:
+            #? already a lookup per book; nothing to share
+            return [self._get_similar_books_from_index(book_id, limit) for book_id in book_ids]
+
+        results = []
+        n_books = len(self.books) if self.books is not None else 0
+        for start in range(0, len(book_ids), block_size):
+            block_ids = np.asarray(book_ids[start : start + block_size], dtype=np.int64)
+            valid = (block_ids >= 0) & (block_ids < n_books)
+            rows = block_ids[valid]
+            block_results = {}
+
+            if rows.size and self.similarity_matrix is not None:
+                scores = np.array(self.similarity_matrix[rows], dtype=np.float32)
+                scores[np.arange(rows.size), rows] = -np.inf
+                ids, scores = top_k_per_row(scores, limit)
+            elif rows.size and self.book_embeddings is not None:
+                ids, scores = self.embedding_index.search(
+                    self.embedding_index.embeddings[rows], limit + 1
+                )
+            else:
+                ids = scores = np.empty((0, 0))
+
+            for i, book_id in enumerate(rows.tolist()):
+                block_results[book_id] = [
+                    {**self.books[idx], "similarity": float(score)}
+                    for idx, score in zip(ids[i].tolist(), scores[i].tolist())
+                    if idx != book_id and 0 <= idx < n_books and score != -np.inf
+                ][:limit]
+
+            results.extend(block_results.get(book_id, []) for book_id in block_ids.tolist())
+        return results
+
+    def _iter_category_rows(self, query: str):
+        """Rows of the categories matching `query`: exact name first, then by match rank."""
+        exact = self.category_rows.get(query)
+        if exact is not None:
+            yield from exact.tolist()
+
+        for position in self.category_index.search(query):
+            category = self.categories[position]
+            if category != query:
+                yield from self.category_rows[category].tolist()
+
     def get_books_by_category(self, category: str, limit: int = 10) -> List[Dict]:
         """Get books by category."""
-        if self.book_metadata is None:
+        if self.category_index is None:
             return []
 
-        books = self.book_metadata[
-            self.book_metadata["category"].str.contains(category, case=False, na=False)
-        ].head(limit)
-
-        return books.to_dict("records")
+        rows = []
+        for row in self._iter_category_rows(category):
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+        return [self.books[row] for row in rows]
 
     def get_all_categories(self) -> List[str]:
         """Get all unique categories."""
-        if self.book_metadata is None:
+        if self.categories is None:
             return []
 
-        return self.book_metadata["category"].unique().tolist()
+        return list(self.categories)
+
+    def get_category_counts(self) -> Dict[str, int]:
+        """Number of books per category."""
+        if self.category_counts is None:
+            return {}
+
+        return dict(self.category_counts)
 
     def get_stats(self) -> Dict:
-        """Get general statistics about the dataset."""
-        if self.book_metadata is None:
+        """Get general statistics about the dataset (computed once at load)."""
+        if self._stats is None:
             return {}
 
+        return {**self._stats, "version": self.version}
+
+    def _compute_stats(self) -> Dict:
         return {
-            "total_books": len(self.book_metadata),
-            "total_categories": len(self.book_metadata["category"].unique()),
+            "total_books": len(self.books),
+            "total_categories": len(self.categories),
             "similarity_matrix_shape": (
                 self.similarity_matrix.shape
                 if self.similarity_matrix is not None
                 else None
             ),
+            "neighbor_index_shape": (
+                self.neighbor_index.shape if self.neighbor_index is not None else None
+            ),
             "has_embeddings": self.book_embeddings is not None,
+            "mmap": self.mmap_mode is not None,
+            "bundle": self.bundle is not None,
+            #? the kind that will serve embedding queries (built on first use)
+            "embedding_index": (
+                self.embedding_index_kind if self.book_embeddings is not None else None
+            ),
         }
 
-    def get_random_books_from_categories(self, limit: int = 10) -> List[Dict]:
-        """Get random books from different categories for discovery."""
+    def _get_rng(self, seed: Optional[int]) -> np.random.Generator:
+        return self.rng if seed is None else np.random.default_rng(seed)
+
+    def get_random_books_from_categories(
+        self, limit: int = 10, seed: Optional[int] = None
+    ) -> List[Dict]:
+        """Get random books from different categories for discovery (read-only views)."""
         try:
-            if self.book_metadata is None:
+            if self.category_row_order is None:
                 return []
 
-            #?? Get all unique categories
-            categories = self.book_metadata["category"].unique()
+            rows = stratified_sample(
+                self.category_row_order,
+                self.category_offsets,
+                limit,
+                self._get_rng(seed),
+            )
+            return [self.books[row] for row in rows.tolist()]
 
-            #? Calculate books per category
-            books_per_category = max(1, limit // len(categories))
-            
-            selected_books = []
-            used_book_ids = set()
+        except Exception as e:
+            print(f" Error getting random books from categories: {str(e)}")
+            return []
 
-            
-            np.random.shuffle(categories)
+    def get_random_books(self, limit: int = 10, seed: Optional[int] = None) -> List[Dict]:
+        """Get completely random books (for trending/popular section, read-only views)."""
+        try:
+            if self.books is None:
+                return []
 
-            for category in categories:
-                if len(selected_books) >= limit:
-                    break
+            rows = sample_rows(len(self.books), limit, self._get_rng(seed))
+            return [self.books[row] for row in rows.tolist()]
 
-                #?.. Get books from this category ->
-                category_books = self.book_metadata[
-                    self.book_metadata["category"] == category
-                ]
+        except Exception as e:
+            print(f" Error getting random books: {str(e)}")
+            return []
 
-               
-                remaining_slots = limit - len(selected_books)
-                sample_size = min(
-                    books_per_category, len(category_books), remaining_slots
-                )
 
-                if sample_size > 0:
-                    sampled_books = category_books.sample(n=sample_size)
-
-                    for _, book in sampled_books.iterrows():
-                        if (
-                            book["book_id"] not in used_book_ids
-                            and len(selected_books) < limit
-                        ):
-                            book_dict = book.to_dict()
-                            selected_books.append(book_dict)
-                            used_book_ids.add(book["book_id"])
-
-            #! if we still need more books ... give random books ->
-            if len(selected_books) < limit:
-                remaining_books = self.book_metadata[
-                    ~self.book_metadata["book_id"].isin(used_book_ids)
-                ]
-                if len(remaining_books) > 0:
-                    additional_needed = limit - len(selected_books)
-                    additional_books = remaining_books.sample(
-                        n=min(additional_needed, len(remaining_books))
-                    )
+class DataLoaderHandle:
+    """
+    Stable reference to the current DataLoader snapshot.
 
-                    for _, book in additional_books.iterrows():
-                        selected_books.append(book.to_dict())
+    Attribute access is forwarded to the current snapshot, so modules keep
+    using the `data_loader` singleton unchanged. `reload` builds a complete
+    new DataLoader in a background thread and `add_books` builds a new one
+    from the current snapshot; either is swapped in with one assignment: a
+    call that started on the old snapshot finishes on it, later calls see the
+    new one. Only one reload (or add_books) runs at a time, so at most two
+    snapshots are alive; with BOOKWISE_MMAP=1 their arrays share the page
+    cache and the overlap is mostly metadata and indexes.
+    """
 
-            return selected_books
+    def __init__(self, factory: Callable[[], DataLoader] = DataLoader):
+        self._factory = factory
+        self._current = factory()
+        self._current.version = 1
+        self._update_lock = threading.Lock()
+        #? callbacks notified with (new version, reloaded) after each swap; reloaded
+        #? is True when the snapshot was read from the data files, False for add_books
+        self._listeners: List[Callable[[int, bool], None]] = []
+        self.reloading = False
+        self.last_reload_error = None
 
-        except Exception as e:
-            print(f" Error getting random books from categories: {str(e)}")
-            return []
+    @property
+    def current(self) -> DataLoader:
+        return self._current
 
-    def get_random_books(self, limit: int = 10) -> List[Dict]:
-        """Get completely random books (for trending/popular section)."""
-        try:
-            if self.book_metadata is None:
-                return []
+    def __getattr__(self, name):
+        return getattr(self._current, name)
 
-            # ? Sample random books
-            sample_size = min(limit, len(self.book_metadata))
-            sampled_books = self.book_metadata.sample(n=sample_size)
+    def add_listener(self, callback: Callable[[int, bool], None]):
+        """Register a callback for snapshot changes (e.g. cache invalidation)."""
+        self._listeners.append(callback)
 
-            return sampled_books.to_dict("records")
+    def _notify(self, version: int, reloaded: bool):
+        for callback in self._listeners:
+            try:
+                callback(version, reloaded)
+            except Exception as e:
+                print(f" Error in data snapshot listener: {str(e)}")
+
+    def reload(self) -> bool:
+        """Start building a new snapshot in the background; False if an update is running."""
+        if not self._update_lock.acquire(blocking=False):
+            return False
+
+        self.reloading = True
+        threading.Thread(
+            target=self._reload, name="bookwise-reload", daemon=True
+        ).start()
+        return True
+
+    def _reload(self):
+        try:
+            new_loader = self._factory()
+            if not new_loader.load_all_data():
+                raise RuntimeError("Failed to load book data")
+
+            new_loader.version = self._current.version + 1
+            self._current = new_loader
+            self.last_reload_error = None
+            #? drop the old snapshot's arrays as soon as its last request finishes
+            gc.collect()
+            print(f"✅ Swapped in data snapshot v{new_loader.version}")
+            self._notify(new_loader.version, reloaded=True)
 
         except Exception as e:
-            print(f" Error getting random books: {str(e)}")
-            return []
+            self.last_reload_error = str(e)
+            print(f" Error reloading data: {str(e)}")
+
+        finally:
+            self.reloading = False
+            self._update_lock.release()
+
+    def add_books(
+        self, new_books: List[Dict], new_embeddings: np.ndarray, persist: bool = False, **kwargs
+    ) -> Dict:
+        """
+        Swap in DataLoader.with_books of the current snapshot as the next version.
 
+        With `persist`, the new snapshot is saved to the data directory before
+        the swap, in the same critical section, so saves never overlap each
+        other or a reload. If saving fails the books are not added and an
+        OSError is raised.
+        """
+        if not self._update_lock.acquire(blocking=False):
+            raise RuntimeError("A data reload is in progress")
+        try:
+            snapshot = self._current.with_books(new_books, new_embeddings, **kwargs)
+            if persist:
+                try:
+                    snapshot.save_artifacts()
+                except Exception as e:
+                    raise OSError(
+                        f"Books were not added: saving to {snapshot.data_dir} failed "
+                        f"(files there may be partly updated): {str(e)}"
+                    ) from e
+            snapshot.version = self._current.version + 1
+            self._current = snapshot
+        finally:
+            self._update_lock.release()
+
+        self._notify(snapshot.version, reloaded=False)
+        return {"added": len(new_books), "total_books": len(snapshot.books)}
+
+    def save_artifacts(self):
+        """DataLoader.save_artifacts of the current snapshot, serialized with reloads and add_books."""
+        with self._update_lock:
+            self._current.save_artifacts()
+
+    def get_stats(self) -> Dict:
+        stats = self._current.get_stats()
+        if stats:
+            stats["reloading"] = self.reloading
+            stats["last_reload_error"] = self.last_reload_error
+        return stats
 
 
-data_loader = DataLoader()
+data_loader = DataLoaderHandle()
@@ -0,0 +1,367 @@
+import argparse
+import copy
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+EMBEDDINGS_FILE = "book_embeddings.npy"
+#? sidecar recording which book_embeddings.npy the saved index arrays belong to
+INDEX_INFO_FILE = "embedding_index.json"
+#? arrays that let an index start without re-normalizing or retraining; saved
+#? as `<name>.npy` next to the embeddings, or as bundle sections of that name
+INDEX_ARRAYS = ["normalized_embeddings", "ivf_centroids", "ivf_assignments"]
+
+
+def normalize_embeddings(embeddings: np.ndarray, block_size: int = 65536) -> np.ndarray:
+    """L2-normalized float32 copy of an embedding matrix, built in row blocks."""
+    normalized = np.empty(embeddings.shape, dtype=np.float32)
+    for start in range(0, embeddings.shape[0], block_size):
+        block = np.asarray(embeddings[start : start + block_size], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        normalized[start : start + block_size] = block / norms
+    return normalized
+
+
+def is_normalized(
+    embeddings: np.ndarray, sample_rows: int = 1024, tol: float = 1e-3
+) -> bool:
+    """True for float32 matrices whose (sampled) rows already have unit norm."""
+    if embeddings.dtype != np.float32 or embeddings.ndim != 2:
+        return False
+    step = max(1, embeddings.shape[0] // sample_rows)
+    norms = np.linalg.norm(embeddings[::step], axis=1)
+    return bool(np.all(np.abs(norms - 1.0) < tol))
+
+
+def _merge_top_k(
+    best_ids: np.ndarray,
+    best_scores: np.ndarray,
+    ids: np.ndarray,
+    scores: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge a new (q x m) block of candidates into the running (q x k) top-k."""
+    all_ids = np.concatenate([best_ids, ids], axis=1)
+    all_scores = np.concatenate([best_scores, scores], axis=1)
+    if all_scores.shape[1] > k:
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        all_ids = np.take_along_axis(all_ids, top, axis=1)
+        all_scores = np.take_along_axis(all_scores, top, axis=1)
+    return all_ids, all_scores
+
+
+def _sort_rows(ids: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(ids, order, axis=1),
+        np.take_along_axis(scores, order, axis=1),
+    )
+
+
+class ExactEmbeddingIndex:
+    """
+    Brute-force cosine retrieval over book embeddings.
+
+    Scores are normalized float32 dot products computed against `block_size`
+    items at a time, so memory stays at queries x block_size regardless of
+    catalog size.
+    """
+
+    kind = "exact"
+
+    def __init__(self, embeddings: np.ndarray, block_size: int = 16384):
+        #? already-normalized float32 input (e.g. a memory-mapped file) is used
+        #? as is, so the pages stay shared instead of being copied per process
+        if is_normalized(embeddings):
+            self.embeddings = embeddings
+        else:
+            self.embeddings = normalize_embeddings(embeddings)
+        self.block_size = block_size
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The INDEX_ARRAYS needed to rebuild this index without recomputing it."""
+        return {"normalized_embeddings": self.embeddings}
+
+    def extended(self, embeddings: np.ndarray) -> "ExactEmbeddingIndex":
+        """A copy of the index with items appended; this index is left unchanged."""
+        index = copy.copy(self)
+        #? add() replaces arrays instead of writing into them
+        index.add(embeddings)
+        return index
+
+    def add(self, embeddings: np.ndarray):
+        """Append items; they get the row positions after the existing ones."""
+        self.embeddings = np.concatenate(
+            [self.embeddings, normalize_embeddings(embeddings)]
+        )
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (ids, scores) for each query row, best first."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+        best_ids = np.empty((queries.shape[0], 0), dtype=np.int64)
+        best_scores = np.empty((queries.shape[0], 0), dtype=np.float32)
+
+        for start in range(0, len(self), self.block_size):
+            block = self.embeddings[start : start + self.block_size]
+            scores = queries @ block.T
+            ids = np.broadcast_to(
+                np.arange(start, start + block.shape[0]), scores.shape
+            )
+            best_ids, best_scores = _merge_top_k(best_ids, best_scores, ids, scores, k)
+
+        return _sort_rows(best_ids, best_scores)
+
+
+class IVFEmbeddingIndex(ExactEmbeddingIndex):
+    """
+    Approximate cosine retrieval with an inverted-file (IVF) index.
+
+    Items are clustered with spherical k-means into `n_lists` lists; a query
+    only scores the items of its `n_probe` closest lists. Recall is traded for
+    speed through `n_probe`; measure it with `recall_at_k`. Passing saved
+    `centroids` and `assignments` skips training.
+    """
+
+    kind = "ivf"
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        n_iter: int = 10,
+        sample_size: int = 65536,
+        seed: int = 0,
+        block_size: int = 16384,
+        centroids: Optional[np.ndarray] = None,
+        assignments: Optional[np.ndarray] = None,
+    ):
+        super().__init__(embeddings, block_size)
+        n_items = len(self)
+        if centroids is not None:
+            n_lists = len(centroids)
+        self.n_lists = max(1, min(n_lists or int(np.sqrt(n_items)), n_items))
+        self.n_probe = min(n_probe, self.n_lists)
+
+        if centroids is None:
+            centroids = self._train(n_iter, sample_size, np.random.default_rng(seed))
+        self.centroids = centroids
+        self.assignments = assignments if assignments is not None else self._assign(self.embeddings)
+        self._build_lists()
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            **super().arrays(),
+            "ivf_centroids": self.centroids,
+            "ivf_assignments": self.assignments,
+        }
+
+    def _build_lists(self):
+        order = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=self.n_lists)
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.list_items = order.astype(np.int64)
+
+    def add(self, embeddings: np.ndarray):
+        """Append items to their nearest existing lists (centroids are not retrained)."""
+        first_row = len(self)
+        super().add(embeddings)
+        self.assignments = np.concatenate(
+            [self.assignments, self._assign(self.embeddings[first_row:])]
+        )
+        self._build_lists()
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], self.block_size):
+            block = vectors[start : start + self.block_size]
+            assignments[start : start + block.shape[0]] = np.argmax(
+                block @ self.centroids.T, axis=1
+            )
+        return assignments
+
+    def _train(self, n_iter: int, sample_size: int, rng) -> np.ndarray:
+        """Spherical k-means on a sample of the normalized embeddings."""
+        n_items = len(self)
+        sample = self.embeddings[
+            rng.choice(n_items, size=min(sample_size, n_items), replace=False)
+        ]
+        seeds = rng.choice(sample.shape[0], self.n_lists, replace=False)
+        centroids = sample[seeds].copy()
+
+        for _ in range(n_iter):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            #? re-seed empty lists from random sample points
+            sums[empty] = sample[rng.choice(sample.shape[0], int(empty.sum()))]
+            norms[empty] = 1.0
+            centroids = sums / norms
+
+        return centroids.astype(np.float32)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k (ids, scores) for each query row, best first."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        probes = np.argpartition(
+            -(queries @ self.centroids.T), self.n_probe - 1, axis=1
+        )[:, : self.n_probe]
+
+        result_ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        result_scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+
+        for i, query in enumerate(queries):
+            candidates = np.concatenate(
+                [
+                    self.list_items[self.list_offsets[p] : self.list_offsets[p + 1]]
+                    for p in probes[i]
+                ]
+            )
+            if candidates.size == 0:
+                continue
+            scores = self.embeddings[candidates] @ query
+            top = min(k, candidates.size)
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            result_ids[i, :top] = candidates[best]
+            result_scores[i, :top] = scores[best]
+
+        return result_ids, result_scores
+
+
+def build_embedding_index(
+    embeddings: np.ndarray,
+    kind: str = "exact",
+    arrays: Optional[Dict[str, np.ndarray]] = None,
+    **kwargs,
+):
+    """
+    Create an "exact" or "ivf" embedding index.
+
+    `arrays` are saved INDEX_ARRAYS (see `load_index_arrays`); the ones that
+    match `embeddings` in shape are used instead of normalizing and training.
+    """
+    if kind not in ("exact", "ivf"):
+        raise ValueError(f"Unknown embedding index kind: {kind}")
+    arrays = arrays or {}
+    normalized = arrays.get("normalized_embeddings")
+    if normalized is not None and normalized.shape == embeddings.shape:
+        embeddings = normalized
+
+    if kind == "exact":
+        return ExactEmbeddingIndex(embeddings, **kwargs)
+    assignments = arrays.get("ivf_assignments")
+    if "ivf_centroids" in arrays and assignments is not None and len(assignments) == len(embeddings):
+        kwargs.update(centroids=arrays["ivf_centroids"], assignments=assignments)
+    return IVFEmbeddingIndex(embeddings, **kwargs)
+
+
+def embeddings_fingerprint(data_dir: str) -> str:
+    """Size and mtime of book_embeddings.npy; changes whenever it is rewritten."""
+    stat = os.stat(os.path.join(data_dir, EMBEDDINGS_FILE))
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def save_index_arrays(index, data_dir: str) -> Dict[str, str]:
+    """
+    Save the arrays of a built index next to book_embeddings.npy.
+
+    The normalized matrix is only written when book_embeddings.npy is not
+    normalized itself; saved arrays the index does not use are removed.
+    """
+    arrays = index.arrays()
+    if is_normalized(np.load(os.path.join(data_dir, EMBEDDINGS_FILE), mmap_mode="r")):
+        del arrays["normalized_embeddings"]
+
+    for name in INDEX_ARRAYS:
+        path = os.path.join(data_dir, f"{name}.npy")
+        if name in arrays:
+            with open(f"{path}.tmp", "wb") as f:
+                np.save(f, arrays[name])
+            os.replace(f"{path}.tmp", path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    info = {"source": embeddings_fingerprint(data_dir), "arrays": list(arrays)}
+    with open(os.path.join(data_dir, INDEX_INFO_FILE), "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    return info
+
+
+def load_index_arrays(data_dir: str, mmap_mode: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Saved index arrays, or {} when missing or saved for another book_embeddings.npy."""
+    info_path = os.path.join(data_dir, INDEX_INFO_FILE)
+    if not os.path.exists(info_path) or not os.path.exists(os.path.join(data_dir, EMBEDDINGS_FILE)):
+        return {}
+    with open(info_path, encoding="utf-8") as f:
+        info = json.load(f)
+    if info.get("source") != embeddings_fingerprint(data_dir):
+        print("  Saved embedding index is stale - rebuild it with embedding_index.py")
+        return {}
+
+    arrays = {}
+    for name in info.get("arrays", []):
+        path = os.path.join(data_dir, f"{name}.npy")
+        if os.path.exists(path):
+            arrays[name] = np.load(path, mmap_mode=mmap_mode)
+    return arrays
+
+
+def recall_at_k(approx_ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    """Mean fraction of the exact top-k ids that the approximate search found."""
+    k = exact_ids.shape[1]
+    hits = [
+        np.intersect1d(approx, exact).size
+        for approx, exact in zip(approx_ids[:, :k], exact_ids)
+    ]
+    return float(np.mean(hits) / k)
+
+
+def measure_recall(
+    index,
+    exact_index: ExactEmbeddingIndex,
+    k: int = 10,
+    n_queries: int = 200,
+    seed: int = 0,
+) -> float:
+    """recall@k of `index` against brute force, using sampled books as queries."""
+    rng = np.random.default_rng(seed)
+    n_queries = min(n_queries, len(exact_index))
+    rows = rng.choice(len(exact_index), size=n_queries, replace=False)
+    queries = exact_index.embeddings[rows]
+    approx_ids, _ = index.search(queries, k)
+    exact_ids, _ = exact_index.search(queries, k)
+    return recall_at_k(approx_ids, exact_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute the embedding index arrays used by DataLoader."
+    )
+    parser.add_argument("--data-dir", default="../data")
+    parser.add_argument("--kind", choices=["exact", "ivf"], default="ivf")
+    parser.add_argument("--n-lists", type=int, default=None, help="IVF lists (default: sqrt(N))")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    embeddings = np.load(os.path.join(args.data_dir, EMBEDDINGS_FILE), mmap_mode="r")
+    kwargs = {"n_lists": args.n_lists} if args.kind == "ivf" else {}
+    index = build_embedding_index(embeddings, args.kind, **kwargs)
+    info = save_index_arrays(index, args.data_dir)
+    elapsed = time.perf_counter() - start_time
+    saved = ", ".join(info["arrays"]) or "nothing (embeddings are already normalized)"
+    print(f"✅ Saved {args.kind} embedding index in {elapsed:.1f}s: {saved} -> {args.data_dir}")
+
+
+if __name__ == "__main__":
+    main()
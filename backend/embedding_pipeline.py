@@ -0,0 +1,282 @@
+"""
+Batched CPU embedding of book descriptions into `book_embeddings.npy`.
+
+Reproducible replacement for the notebook's Colab embedding step:
+
+    python embedding_pipeline.py --data-dir ../data                  # CAMeLBERT, mean pooling
+    python embedding_pipeline.py --data-dir ../data --threads 8 --batch-size 64
+    python embedding_pipeline.py --data-dir ../data --encoder stub   # no torch, for tests
+
+Descriptions are preprocessed with ArabicTextPreprocessor, sorted by token
+length and batched in that order, so each batch pads to nearly the same
+length instead of to the longest description in a random batch. Every
+embedding is cached in `embedding_cache.db` under a hash of the model name
+and the preprocessed text, so a rerun only embeds new or changed books.
+Rows are written into a memory-mapped output as batches finish; row i is
+the book in row i of the metadata file (book_id == row position).
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+from arabic_text import normalize_search_texts
+
+DEFAULT_MODEL = "CAMeL-Lab/bert-base-arabic-camelbert-mix"
+CACHE_FILE = "embedding_cache.db"
+
+
+class StubEncoder:
+    """
+    Deterministic hashed bag-of-words encoder with no model dependencies.
+
+    Each whitespace token adds a fixed pseudo-random vector, so texts that
+    share words get similar embeddings; meant for tests and dry runs.
+    """
+
+    def __init__(self, dim: int = 64):
+        self.name = f"stub-{dim}"
+        self.dim = dim
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        return [len(text.split()) for text in texts]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in text.split():
+                seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                embeddings[row] += np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+        return embeddings
+
+
+class TransformerEncoder:
+    """Mean-pooled last hidden states of a Hugging Face model, on CPU."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, max_length: int = 512, threads: Optional[int] = None):
+        #? optional dependencies: only needed when embedding with a real model
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.torch = torch
+        self.name = model_name
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+        self.dim = self.model.config.hidden_size
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length, padding=False)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        #? pad to the longest text of this batch only; batches are length-bucketed
+        inputs = self.tokenizer(
+            texts, truncation=True, max_length=self.max_length, padding=True, return_tensors="pt"
+        )
+        with self.torch.inference_mode():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+        return pooled.numpy().astype(np.float32)
+
+
+class EmbeddingCache:
+    """Embeddings on disk (SQLite), keyed by hash of model name and preprocessed text."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str], dim: int) -> Dict[str, np.ndarray]:
+        found = {}
+        unique = list(set(keys))
+        #? stay under SQLite's bound-parameter limit
+        for start in range(0, len(unique), 500):
+            chunk = unique[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            )
+            for key, blob in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if len(vector) == dim:
+                    found[key] = vector
+        return found
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.ascontiguousarray(v, dtype=np.float32).tobytes()) for key, v in zip(keys, vectors)],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def length_buckets(lengths: List[int], batch_size: int, max_tokens: Optional[int] = None) -> List[np.ndarray]:
+    """
+    Split positions into batches of similar length (longest first).
+
+    A batch holds at most `batch_size` texts and, when `max_tokens` is set,
+    at most `max_tokens` padded tokens, so batches of long texts get smaller.
+    """
+    order = np.argsort(-np.asarray(lengths, dtype=np.int64), kind="stable")
+    batches, current = [], []
+    for position in order:
+        #? the first text of a batch is its longest: it sets the padded width
+        width = lengths[current[0]] if current else lengths[position]
+        if current and (
+            len(current) >= batch_size or (max_tokens and (len(current) + 1) * width > max_tokens)
+        ):
+            batches.append(np.array(current))
+            current = []
+        current.append(position)
+    if current:
+        batches.append(np.array(current))
+    return batches
+
+
+def embed_books(
+    data_dir: str,
+    encoder,
+    text_column: str = "description_to_display",
+    batch_size: int = 32,
+    max_tokens: Optional[int] = None,
+    normalize: bool = True,
+    use_cache: bool = True,
+    output_name: str = "book_embeddings.npy",
+) -> Dict:
+    """Embed every book's description into `output_name`; returns run statistics."""
+    metadata = pd.read_csv(os.path.join(data_dir, "book_metadata.csv"), usecols=[text_column])
+    texts = normalize_search_texts(metadata[text_column].tolist())
+    n_books = len(texts)
+
+    keys = [EmbeddingCache.key(encoder.name, text) for text in texts]
+    cache = EmbeddingCache(os.path.join(data_dir, CACHE_FILE)) if use_cache else None
+    cached = cache.get_many(keys, encoder.dim) if cache is not None else {}
+
+    output_path = os.path.join(data_dir, output_name)
+    tmp_path = f"{output_path}.tmp.npy"
+    embeddings = open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(n_books, encoder.dim))
+
+    #? takes the memmap as an argument, so `del embeddings` below really closes it
+    def write_rows(out: np.ndarray, rows: np.ndarray, vectors: np.ndarray):
+        if normalize:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms
+        out[rows] = vectors
+
+    hit_rows = np.array([row for row, key in enumerate(keys) if key in cached], dtype=np.int64)
+    if len(hit_rows):
+        write_rows(embeddings, hit_rows, np.stack([cached[keys[row]] for row in hit_rows]))
+
+    #? identical texts are embedded once and fanned out to every row holding them
+    pending: Dict[str, List[int]] = {}
+    for row, key in enumerate(keys):
+        if key not in cached:
+            pending.setdefault(key, []).append(row)
+    todo_keys = list(pending)
+    todo_texts = [texts[pending[key][0]] for key in todo_keys]
+    print(
+        f"Embedding {len(todo_texts)} texts with {encoder.name}: "
+        f"{n_books - len(hit_rows)} books to embed, {len(hit_rows)} from cache"
+    )
+
+    start_time = time.perf_counter()
+    done = 0
+    if todo_texts:
+        lengths = encoder.token_lengths(todo_texts)
+        batches = length_buckets(lengths, batch_size, max_tokens)
+        for batch_number, batch in enumerate(batches, 1):
+            vectors = encoder.encode([todo_texts[i] for i in batch])
+            batch_keys = [todo_keys[i] for i in batch]
+            if cache is not None:
+                cache.put_many(batch_keys, vectors)
+
+            rows = [row for key in batch_keys for row in pending[key]]
+            repeats = [len(pending[key]) for key in batch_keys]
+            write_rows(embeddings, np.array(rows, dtype=np.int64), np.repeat(vectors, repeats, axis=0))
+
+            done += len(batch)
+            if batch_number % 10 == 0 or batch_number == len(batches):
+                elapsed = time.perf_counter() - start_time
+                print(f"  {done}/{len(todo_texts)} texts, {done / elapsed:.1f} docs/s")
+
+    embeddings.flush()
+    del embeddings
+    os.replace(tmp_path, output_path)
+    if cache is not None:
+        cache.close()
+
+    elapsed = time.perf_counter() - start_time
+    return {
+        "books": n_books,
+        "cached": int(len(hit_rows)),
+        "embedded": done,
+        "seconds": elapsed,
+        "docs_per_second": done / elapsed if done else 0.0,
+        "path": output_path,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed book descriptions into book_embeddings.npy.")
+    parser.add_argument("--data-dir", default="../data")
+    parser.add_argument("--encoder", choices=["transformer", "stub"], default="transformer")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Hugging Face model name or local path")
+    parser.add_argument("--text-column", default="description_to_display")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-tokens", type=int, default=None, help="Padded tokens per batch (optional)")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Torch CPU threads")
+    parser.add_argument("--stub-dim", type=int, default=64)
+    parser.add_argument("--no-normalize", action="store_true", help="Keep raw mean-pooled vectors")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    if args.encoder == "stub":
+        encoder = StubEncoder(args.stub_dim)
+    else:
+        try:
+            encoder = TransformerEncoder(args.model, max_length=args.max_length, threads=args.threads)
+        except ImportError:
+            raise SystemExit("The transformer encoder needs torch and transformers (pip install torch transformers)")
+
+    stats = embed_books(
+        args.data_dir,
+        encoder,
+        text_column=args.text_column,
+        batch_size=args.batch_size,
+        max_tokens=args.max_tokens,
+        normalize=not args.no_normalize,
+        use_cache=not args.no_cache,
+    )
+    print(
+        f"✅ Embedded {stats['embedded']} texts ({stats['cached']} books from cache) in "
+        f"{stats['seconds']:.1f}s, {stats['docs_per_second']:.1f} docs/s -> {stats['path']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Offline bulk export of recommendations.
+
+Precomputes user-based recommendations for every user, or the top-k
+neighbors of every book, on a process pool and writes them as Parquet
+(when pyarrow is installed) or NDJSON part files. Run from the backend
+directory, e.g.:
+
+    python export.py books --k 50 --out ../exports/neighbors
+    python export.py users --limit 20 --out ../exports/users --workers 8
+
+Workers open the similarity matrix / embeddings memory-mapped, so they share
+one copy through the OS page cache. Each chunk is written to its own part
+file; rerunning the same command skips the parts that already exist.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from data_loader import DataLoader
+from user_store import MemoryUserStore, SqliteUserStore
+
+MANIFEST_FILE = "manifest.json"
+
+#? per-process loader, created once by the pool initializer
+_worker_loader = None
+
+
+def _init_worker(data_dir: str):
+    global _worker_loader
+    #? exact index: no per-worker IVF training, and exact results for an offline job
+    _worker_loader = DataLoader(data_dir, mmap=True, embedding_index_kind="exact")
+    if not _worker_loader.load_all_data():
+        raise RuntimeError(f"Failed to load data from {data_dir}")
+
+
+def _export_chunk(task: Tuple) -> Tuple[int, int, int]:
+    """Compute one chunk and write its part file; returns (chunk, entities, rows)."""
+    chunk_id, mode, keys, histories, limit, out_dir, fmt = task
+    if mode == "books":
+        results = _worker_loader.get_similar_books_batch(keys, limit)
+    else:
+        results = _worker_loader.get_history_recommendations_batch(histories, limit)
+
+    key_column = "book_id" if mode == "books" else "user_id"
+    rows = {key_column: [], "rank": [], "recommended_book_id": [], "similarity": []}
+    for key, books in zip(keys, results):
+        for rank, book in enumerate(books):
+            rows[key_column].append(key)
+            rows["rank"].append(rank)
+            rows["recommended_book_id"].append(int(book["book_id"]))
+            rows["similarity"].append(book["similarity"])
+
+    _write_part(_part_path(out_dir, chunk_id, fmt), rows, fmt)
+    return chunk_id, len(keys), len(rows["rank"])
+
+
+def _part_path(out_dir: str, chunk_id: int, fmt: str) -> str:
+    return os.path.join(out_dir, f"part-{chunk_id:05d}.{fmt}")
+
+
+def _write_part(path: str, rows: Dict[str, List], fmt: str):
+    """Write a part file atomically, so a present file is always a complete chunk."""
+    tmp_path = f"{path}.tmp"
+    if fmt == "parquet":
+        pq.write_table(pa.table(rows), tmp_path)
+    else:
+        columns = list(rows)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for values in zip(*rows.values()):
+                f.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+
+
+def _load_histories(data_dir: str, backend: str) -> Dict[str, List[int]]:
+    """Every user's reading history, read once in the parent process."""
+    if backend == "sqlite":
+        store = SqliteUserStore(os.path.join(data_dir, "users.db"))
+    else:
+        store = MemoryUserStore(
+            os.path.join(data_dir, "users.csv"),
+            os.path.join(data_dir, "user_history.csv"),
+            os.path.join(data_dir, "user_favorites.csv"),
+            background=False,
+            #? read-only: may run next to a server that holds the writer lock
+            lock=False,
+        )
+
+    histories = {user["id"]: [] for user in store.get_all_users()}
+    for user_id, book_id, _ in store.get_book_events("history"):
+        histories.setdefault(user_id, []).append(int(book_id))
+    return histories
+
+
+def _check_manifest(out_dir: str, manifest: Dict):
+    """Refuse to resume into a directory exported with different settings."""
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            existing = json.load(f)
+        if existing != manifest:
+            raise SystemExit(
+                f"{out_dir} holds an export with different settings ({existing}); "
+                "use another --out or remove it"
+            )
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk export recommendations.")
+    parser.add_argument("mode", choices=["users", "books"])
+    parser.add_argument("--data-dir", default="../data")
+    parser.add_argument("--out", required=True, help="Output directory for part files")
+    parser.add_argument(
+        "--k",
+        "--limit",
+        dest="limit",
+        type=int,
+        default=10,
+        help="Recommendations per user / neighbors per book",
+    )
+    parser.add_argument("--format", choices=["auto", "parquet", "ndjson"], default="auto")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--user-backend",
+        choices=["csv", "sqlite"],
+        default=os.environ.get("BOOKWISE_USER_BACKEND", "csv"),
+    )
+    args = parser.parse_args()
+
+    fmt = args.format
+    if fmt == "auto":
+        fmt = "parquet" if pa is not None else "ndjson"
+    if fmt == "parquet" and pa is None:
+        raise SystemExit("Parquet output needs pyarrow (pip install pyarrow)")
+
+    if args.mode == "books":
+        metadata_path = os.path.join(args.data_dir, "book_metadata.csv")
+        keys = pd.read_csv(metadata_path, usecols=["book_id"])["book_id"].tolist()
+        histories = None
+    else:
+        user_histories = _load_histories(args.data_dir, args.user_backend)
+        keys = sorted(user_histories)
+        histories = [user_histories[user_id] for user_id in keys]
+
+    os.makedirs(args.out, exist_ok=True)
+    _check_manifest(
+        args.out,
+        {
+            "mode": args.mode,
+            "limit": args.limit,
+            "format": fmt,
+            "chunk_size": args.chunk_size,
+            #? chunks are positional, so resuming needs the same population
+            "total": len(keys),
+        },
+    )
+
+    tasks = []
+    for chunk_id, start in enumerate(range(0, len(keys), args.chunk_size)):
+        if os.path.exists(_part_path(args.out, chunk_id, fmt)):
+            continue
+        end = start + args.chunk_size
+        tasks.append(
+            (
+                chunk_id,
+                args.mode,
+                keys[start:end],
+                None if histories is None else histories[start:end],
+                args.limit,
+                args.out,
+                fmt,
+            )
+        )
+
+    n_chunks = -(-len(keys) // args.chunk_size)
+    print(
+        f"Exporting {len(keys)} {args.mode}: {len(tasks)}/{n_chunks} chunks to do, "
+        f"{args.workers} workers"
+    )
+    if not tasks:
+        return
+
+    start_time = time.perf_counter()
+    done_entities = done_rows = 0
+    with multiprocessing.Pool(
+        args.workers, initializer=_init_worker, initargs=(args.data_dir,)
+    ) as pool:
+        for chunk_id, entities, rows in pool.imap_unordered(_export_chunk, tasks):
+            done_entities += entities
+            done_rows += rows
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"  chunk {chunk_id}: {done_entities} {args.mode} done, "
+                f"{done_rows / elapsed:.0f} rows/s, {done_entities / elapsed:.0f} {args.mode}/s"
+            )
+
+    print(f"✅ Exported {done_rows} rows in {time.perf_counter() - start_time:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
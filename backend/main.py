@@ -1,13 +1,21 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import asyncio
+import json
+import numpy as np
+import os
+import secrets
 import uvicorn
 
 # Import our modules
 from data_loader import data_loader
 from user_manager import user_manager
 from recommendation_engine import recommendation_engine
+from neighbor_cache import NeighborResponseCache
 from models import *
 
 # Create FastAPI app
@@ -30,6 +38,49 @@ app.add_middleware(
 )
 
 
+# Blocking pandas/CSV/NumPy work runs on a bounded thread pool so a slow request
+# never stalls the event loop (and every other in-flight request on this worker)
+BLOCKING_THREADS = int(
+    os.environ.get("BOOKWISE_BLOCKING_THREADS", min(32, (os.cpu_count() or 1) + 4))
+)
+MAX_PENDING_BLOCKING_CALLS = int(
+    os.environ.get("BOOKWISE_MAX_PENDING", BLOCKING_THREADS * 4)
+)
+blocking_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_THREADS, thread_name_prefix="bookwise-blocking"
+)
+blocking_slots = asyncio.Semaphore(MAX_PENDING_BLOCKING_CALLS)
+
+#? pre-serialized item-to-item responses (BOOKWISE_NEIGHBOR_CACHE=auto|file|lazy|off)
+neighbor_cache = NeighborResponseCache(data_loader)
+
+
+def _on_data_snapshot(version: int, reloaded: bool):
+    """A reload or hot-add produced a new catalog version: drop derived caches."""
+    if reloaded:
+        #? the new snapshot was read from the files the precomputed cache is built from
+        neighbor_cache.load()
+    else:
+        #? hot-added books are missing from the cache file: refill lazily
+        neighbor_cache.clear()
+    recommendation_engine.cache.clear()
+
+
+data_loader.add_listener(_on_data_snapshot)
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the bounded thread pool and await its result."""
+    async with blocking_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(blocking_executor, partial(func, *args))
+
+
+def _hydrate_books(book_ids: List[int]) -> List[BookInfo]:
+    """Book details for a list of ids, as response models."""
+    return [BookInfo(**book) for book in data_loader.get_books_by_ids(book_ids)]
+
+
 # Global startup event
 @app.on_event("startup")
 async def startup_event():
@@ -42,7 +93,16 @@ async def startup_event():
         print("❌ Failed to load book data!")
         raise Exception("Failed to load book data")
 
-    print("✅ BookWise API is ready!")
+    neighbor_cache.load()
+
+    print(f"✅ BookWise API is ready! ({BLOCKING_THREADS} blocking worker threads)")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the blocking worker pool and the periodic popularity rebuild."""
+    blocking_executor.shutdown(wait=False)
+    recommendation_engine.popularity.close()
 
 
 # Health check endpoint
@@ -50,13 +110,16 @@ async def startup_event():
 async def root():
     """Health check endpoint."""
     stats = data_loader.get_stats()
-    system_stats = user_manager.get_system_stats()
+    system_stats = await run_blocking(user_manager.get_system_stats)
 
     return {
         "message": "BookWise Recommendation API is running!",
         "status": "healthy",
         "data_stats": stats,
         "user_stats": system_stats,
+        "cache_stats": recommendation_engine.cache.get_stats(),
+        "neighbor_cache_stats": neighbor_cache.get_stats(),
+        "popularity_stats": recommendation_engine.popularity.get_stats(),
     }
 
 
@@ -65,7 +128,9 @@ async def root():
 async def create_user(request: CreateUserRequest):
     """Create a new user."""
     try:
-        user_data = user_manager.create_user(request.user_id, request.username)
+        user_data = await run_blocking(
+            user_manager.create_user, request.user_id, request.username
+        )
         return UserInfo(**user_data)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -76,7 +141,7 @@ async def create_user(request: CreateUserRequest):
 @app.get("/users/{user_id}", response_model=UserInfo)
 async def get_user(user_id: str):
     """Get user information."""
-    user_data = user_manager.get_user(user_id)
+    user_data = await run_blocking(user_manager.get_user, user_id)
     if not user_data:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -86,7 +151,7 @@ async def get_user(user_id: str):
 @app.get("/users/{user_id}/stats", response_model=UserStats)
 async def get_user_stats(user_id: str):
     """Get user statistics."""
-    stats = user_manager.get_user_stats(user_id)
+    stats = await run_blocking(user_manager.get_user_stats, user_id)
     if not stats:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -103,7 +168,9 @@ async def add_book_to_history(user_id: str, request: AddBookToHistoryRequest):
         raise HTTPException(status_code=404, detail="Book not found")
 
     # Add to history
-    success = user_manager.add_book_to_history(user_id, request.book_id)
+    success = await run_blocking(
+        user_manager.add_book_to_history, user_id, request.book_id
+    )
     if not success:
         raise HTTPException(status_code=400, detail="Failed to add book to history")
 
@@ -118,19 +185,15 @@ async def add_book_to_history(user_id: str, request: AddBookToHistoryRequest):
 async def get_user_history(user_id: str):
     """Get user's reading history with book details."""
     # Check if user exists
-    user_data = user_manager.get_user(user_id)
+    user_data = await run_blocking(user_manager.get_user, user_id)
     if not user_data:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Get history
-    history_book_ids = user_manager.get_user_history(user_id)
+    history_book_ids = await run_blocking(user_manager.get_user_history, user_id)
 
     # Get book details
-    books = []
-    for book_id in history_book_ids:
-        book_info = data_loader.get_book_by_id(book_id)
-        if book_info:
-            books.append(BookInfo(**book_info))
+    books = await run_blocking(_hydrate_books, history_book_ids)
 
     return HistoryResponse(books=books, total_count=len(books), user_id=user_id)
 
@@ -138,7 +201,9 @@ async def get_user_history(user_id: str):
 @app.delete("/users/{user_id}/history/{book_id}", response_model=SuccessResponse)
 async def remove_book_from_history(user_id: str, book_id: int):
     """Remove a book from user's reading history."""
-    success = user_manager.remove_book_from_history(user_id, book_id)
+    success = await run_blocking(
+        user_manager.remove_book_from_history, user_id, book_id
+    )
     if not success:
         raise HTTPException(
             status_code=400, detail="Failed to remove book from history"
@@ -161,7 +226,9 @@ async def add_book_to_favorites(user_id: str, request: AddBookToHistoryRequest):
         raise HTTPException(status_code=404, detail="Book not found")
 
     # Add to favorites
-    success = user_manager.add_book_to_favorites(user_id, request.book_id)
+    success = await run_blocking(
+        user_manager.add_book_to_favorites, user_id, request.book_id
+    )
     if not success:
         raise HTTPException(status_code=400, detail="Failed to add book to favorites")
 
@@ -175,7 +242,9 @@ async def add_book_to_favorites(user_id: str, request: AddBookToHistoryRequest):
 @app.delete("/users/{user_id}/favorites/{book_id}", response_model=SuccessResponse)
 async def remove_book_from_favorites(user_id: str, book_id: int):
     """Remove a book from user's favorites."""
-    success = user_manager.remove_book_from_favorites(user_id, book_id)
+    success = await run_blocking(
+        user_manager.remove_book_from_favorites, user_id, book_id
+    )
     if not success:
         raise HTTPException(
             status_code=400, detail="Failed to remove book from favorites"
@@ -192,19 +261,15 @@ async def remove_book_from_favorites(user_id: str, book_id: int):
 async def get_user_favorites(user_id: str):
     """Get user's favorite books with details."""
     # Check if user exists
-    user_data = user_manager.get_user(user_id)
+    user_data = await run_blocking(user_manager.get_user, user_id)
     if not user_data:
         raise HTTPException(status_code=404, detail="User not found")
 
     # ? get favorites
-    favorite_book_ids = user_manager.get_user_favorites(user_id)
+    favorite_book_ids = await run_blocking(user_manager.get_user_favorites, user_id)
 
     # ? get book details
-    books = []
-    for book_id in favorite_book_ids:
-        book_info = data_loader.get_book_by_id(book_id)
-        if book_info:
-            books.append(BookInfo(**book_info))
+    books = await run_blocking(_hydrate_books, favorite_book_ids)
 
     return {"books": books, "total_count": len(books), "user_id": user_id}
 
@@ -220,16 +285,32 @@ async def search_books(
    # """Search for books by title or category"""
     if category:
         # Search within specific category
-        books = data_loader.get_books_by_category(category, limit)
+        books = await run_blocking(data_loader.get_books_by_category, category, limit)
     else:
         # General search
-        books = data_loader.search_books(query, limit)
+        books = await run_blocking(data_loader.search_books, query, limit)
 
     book_infos = [BookInfo(**book) for book in books]
 
     return SearchResponse(books=book_infos, total_count=len(book_infos), query=query)
 
 
+@app.get("/books/popular", response_model=RecommendationResponse)
+async def get_popular_books(
+    limit: int = Query(10, ge=1, le=50, description="Number of books"),
+):
+    """Trending books, ranked by recent reads and favorites."""
+    books = await run_blocking(recommendation_engine.get_popular_books, limit)
+    book_infos = [BookInfo(**book) for book in books]
+
+    return RecommendationResponse(
+        recommendations=book_infos,
+        total_count=len(book_infos),
+        user_id="",
+        recommendation_type="popular",
+    )
+
+
 @app.get("/books/{book_id}", response_model=BookInfo)
 async def get_book(book_id: int):
     """Get book details by ID."""
@@ -258,9 +339,14 @@ async def get_item_recommendations(
     if not book_info:
         raise HTTPException(status_code=404, detail="Book not found")
 
+    # ? serve the pre-serialized neighbors when the cache covers this limit
+    body = await run_blocking(neighbor_cache.get_response, book_id, limit)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+
     # ? get recommendations
-    recommendations = recommendation_engine.get_item_to_item_recommendations(
-        book_id, limit
+    recommendations = await run_blocking(
+        recommendation_engine.get_item_to_item_recommendations, book_id, limit
     )
     book_infos = [BookInfo(**book) for book in recommendations]
 
@@ -280,26 +366,21 @@ async def get_user_recommendations(
         "hybrid",
         description="Recommendation method: user_based, category_based, or hybrid",
     ),
+    use_embeddings: bool = Query(
+        False,
+        description="Score the history by mean embedding instead of the similarity matrix",
+    ),
 ):
     """Get personalized recommendations for a user."""
     # ?check if user exists
-    user_data = user_manager.get_user(user_id)
+    user_data = await run_blocking(user_manager.get_user, user_id)
     if not user_data:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # get recommendations based on method type
-    if method == "user_based":
-        recommendations = recommendation_engine.get_user_based_recommendations(
-            user_id, limit
-        )
-    elif method == "category_based":
-        recommendations = recommendation_engine.get_category_based_recommendations(
-            user_id, limit
-        )
-    else: 
-        recommendations = recommendation_engine.get_hybrid_recommendations(
-            user_id, limit
-        )# d
+    # get recommendations based on method type (cached per history version)
+    recommendations = await run_blocking(
+        recommendation_engine.get_recommendations, user_id, method, limit, use_embeddings
+    )
 
     book_infos = [BookInfo(**book) for book in recommendations]
 
@@ -311,10 +392,54 @@ async def get_user_recommendations(
     )
 
 
+@app.post("/recommendations/batch")
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """
+    Recommendations for many users or many seed books in one call, streamed
+    as NDJSON: one {"user_id" | "book_id", "recommendations"} object per line.
+    """
+    if (request.user_ids is None) == (request.book_ids is None):
+        raise HTTPException(
+            status_code=400, detail="Provide exactly one of user_ids or book_ids"
+        )
+
+    blocks = recommendation_engine.iter_batch_recommendations(
+        user_ids=request.user_ids,
+        book_ids=request.book_ids,
+        method=request.method,
+        limit=request.limit,
+    )
+
+    async def stream_results():
+        # each block is computed on the worker pool, then written out
+        while True:
+            block = await run_blocking(next, blocks, None)
+            if block is None:
+                break
+            yield "".join(
+                json.dumps(
+                    {
+                        **result,
+                        "recommendations": [
+                            BookInfo(**book).model_dump()
+                            for book in result["recommendations"]
+                        ],
+                    },
+                    ensure_ascii=False,
+                )
+                + "\n"
+                for result in block
+            )
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
 @app.get("/recommendations/explain/{user_id}/{book_id}")
 async def get_recommendation_explanation(user_id: str, book_id: int):
     """Get explanation for why a book was recommended."""
-    explanation = recommendation_engine.get_recommendation_explanation(user_id, book_id)
+    explanation = await run_blocking(
+        recommendation_engine.get_recommendation_explanation, user_id, book_id
+    )
     return {"explanation": explanation}
 
 
@@ -323,16 +448,68 @@ async def get_recommendation_explanation(user_id: str, book_id: int):
 async def get_system_stats():
     """Get system-wide statistics."""
     data_stats = data_loader.get_stats()
-    user_stats = user_manager.get_system_stats()
+    user_stats = await run_blocking(user_manager.get_system_stats)
 
     return SystemStats(
         total_users=user_stats.get("total_users", 0),
         total_reading_entries=user_stats.get("total_reading_entries", 0),
         total_books=data_stats.get("total_books", 0),
         total_categories=data_stats.get("total_categories", 0),
+        data_version=data_stats.get("version"),
     )
 
 
+#! admin (off unless BOOKWISE_ADMIN_TOKEN is set; callers send it as X-Admin-Token)
+ADMIN_TOKEN = os.environ.get("BOOKWISE_ADMIN_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Reject admin calls when no token is configured or the header does not match it."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+admin_router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@admin_router.post("/books")
+async def add_books(request: AddBooksRequest):
+    """Hot-add books to the running catalog, scoring only the new pairs."""
+    books = [book.model_dump(exclude={"embedding"}) for book in request.books]
+    embeddings = np.asarray([book.embedding for book in request.books], dtype=np.float32)
+
+    try:
+        result = await run_blocking(data_loader.add_books, books, embeddings, request.persist)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return result
+
+
+@admin_router.post("/reload", status_code=202)
+async def reload_data():
+    """Rebuild all data artifacts in the background and swap them in atomically."""
+    if not data_loader.reload():
+        raise HTTPException(status_code=409, detail="A data reload is already running")
+
+    return {"status": "reloading", "current_version": data_loader.version}
+
+
+app.include_router(admin_router)
+
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    """Recommendation cache size and hit/miss counters."""
+    return recommendation_engine.cache.get_stats()
+
+
 #! err handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
@@ -15,6 +15,23 @@ class SearchBooksRequest(BaseModel):
     category: Optional[str] = Field(None, description="Filter by category")
     limit: Optional[int] = Field(10, ge=1, le=50, description="Number of results to return")
 
+class BatchRecommendationRequest(BaseModel):
+    user_ids: Optional[List[str]] = Field(None, description="Users to recommend for")
+    book_ids: Optional[List[int]] = Field(None, description="Seed books for item-to-item recommendations")
+    method: str = Field("hybrid", description="Method for user_ids: user_based, category_based, or hybrid")
+    limit: int = Field(10, ge=1, le=50, description="Recommendations per user or book")
+
+class NewBook(BaseModel):
+    book_id: Optional[int] = Field(None, description="Next row position; assigned when omitted")
+    title: str = Field(..., min_length=1)
+    category: str = ""
+    description_to_display: str = ""
+    embedding: List[float] = Field(..., description="Book embedding, same model as the catalog")
+
+class AddBooksRequest(BaseModel):
+    books: List[NewBook] = Field(..., min_length=1)
+    persist: bool = Field(False, description="Also write the extended artifacts to the data dir")
+
 # Response Models
 class BookInfo(BaseModel):
     book_id: int
@@ -40,6 +57,7 @@ class SystemStats(BaseModel):
     total_reading_entries: int
     total_books: int
     total_categories: int
+    data_version: Optional[int] = None
 
 class RecommendationResponse(BaseModel):
     recommendations: List[BookInfo]
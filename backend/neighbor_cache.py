@@ -0,0 +1,269 @@
+import argparse
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from models import BookInfo
+
+CACHE_FILE = "neighbor_cache.txt"
+#? byte offset of each book's line in CACHE_FILE, plus the end of the file
+OFFSETS_FILE = "neighbor_cache.offsets.npy"
+#? serialized JSON never contains raw control characters, so they are safe separators
+ITEM_SEPARATOR = "\x1e"
+
+#? artifacts whose change makes a precomputed cache stale
+SOURCE_FILES = [
+    "bookwise.bundle",
+    "book_metadata.csv",
+    "similarity_matrix.npy",
+    "neighbor_ids.npy",
+    "neighbor_scores.npy",
+    "book_embeddings.npy",
+]
+
+
+def data_fingerprint(data_dir: str) -> str:
+    """Size and mtime of the source artifacts; changes whenever they are rebuilt."""
+    parts = []
+    for name in SOURCE_FILES:
+        path = os.path.join(data_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{name}:{stat.st_size}:{int(stat.st_mtime)}")
+    return "|".join(parts)
+
+
+def _serialize_item(book: Dict) -> str:
+    """One BookInfo as compact JSON, matching FastAPI's JSONResponse encoding."""
+    return json.dumps(
+        BookInfo(**book).model_dump(), ensure_ascii=False, separators=(",", ":")
+    )
+
+
+class NeighborResponseCache:
+    """
+    Per-book cache of item-to-item responses, stored pre-serialized as JSON.
+
+    Each book maps to its top-`k` neighbors as a list of serialized BookInfo
+    items, so a request is a lookup, a slice and a string join. A precomputed
+    `neighbor_cache.txt` (built offline with this module's CLI) is memory-mapped
+    and read one line at a time through `neighbor_cache.offsets.npy`, so workers
+    share it through the page cache instead of each holding a copy. Without it,
+    books are filled lazily, one at a time on first request, into an LRU capped
+    at `max_bytes`.
+
+    The file is dropped when books are hot-added: any old book's neighbor list
+    may now include a new book, so none of its lines can be trusted. "auto"
+    then fills lazily; "file" serves nothing until the file is rebuilt and the
+    data reloaded.
+    """
+
+    def __init__(
+        self,
+        data_loader,
+        k: int = 50,
+        mode: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.data_loader = data_loader
+        self.k = k
+        #? "auto": the precomputed file when fresh, otherwise the lazy LRU;
+        #? "file": the file only (no file, no caching); "lazy": the LRU only
+        self.mode = mode or os.environ.get("BOOKWISE_NEIGHBOR_CACHE", "auto")
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("BOOKWISE_NEIGHBOR_CACHE_MB", 64)) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        #? book_id -> (size_bytes, items), least recently used first
+        self._items: OrderedDict = OrderedDict()
+        self._bytes = 0
+        #? mapped cache file and its line offsets (line i + 1 holds book_id i)
+        self._file_map = None
+        self._file_offsets = None
+        #? data snapshot the cached items belong to
+        self._version = data_loader.version
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def load(self) -> bool:
+        """Map the precomputed cache file if it matches the current data artifacts."""
+        self.clear()
+        if self.mode not in ("auto", "file"):
+            return False
+
+        data_dir = self.data_loader.data_dir
+        path = os.path.join(data_dir, CACHE_FILE)
+        offsets_path = os.path.join(data_dir, OFFSETS_FILE)
+        if not (os.path.exists(path) and os.path.exists(offsets_path)):
+            print("  Neighbor cache file not found - " + ("filling lazily" if self.mode == "auto" else "not caching"))
+            return False
+
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            file_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offsets = np.load(offsets_path, mmap_mode="r")
+        if (
+            header.get("fingerprint") != data_fingerprint(data_dir)
+            or header.get("books") != len(self.data_loader.books)
+            or len(offsets) != header["books"] + 1
+        ):
+            file_map.close()
+            print("  Neighbor cache file is stale - rebuild it with neighbor_cache.py")
+            return False
+
+        with self._lock:
+            self.k = header["k"]
+            self._file_map = file_map
+            self._file_offsets = offsets
+        print(f"✅ Mapped neighbor cache: {header['books']} books, k={self.k}")
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._items = OrderedDict()
+            self._bytes = 0
+            self._file_map = None
+            self._file_offsets = None
+            self._version = self.data_loader.version
+
+    def _compute(self, book_id: int) -> List[str]:
+        similar_books = self.data_loader.get_similar_books(book_id, self.k)
+        return [_serialize_item(book) for book in similar_books]
+
+    def _read_file(self, file_map, offsets, book_id: int) -> Optional[List[str]]:
+        if not 0 <= book_id < len(offsets) - 1:
+            return None
+        line = file_map[int(offsets[book_id]) : int(offsets[book_id + 1])].decode("utf-8")
+        serialized = line.rstrip("\n").partition("\t")[2]
+        return serialized.split(ITEM_SEPARATOR) if serialized else []
+
+    def get_items(self, book_id: int) -> Optional[List[str]]:
+        """
+        Serialized neighbors of one book: from the file, from the LRU, or
+        computed and stored on a miss. None in "file" mode without a file.
+        """
+        version = self.data_loader.version
+        if version != self._version:
+            #? the catalog changed (reload or added books): start over lazily
+            self.clear()
+
+        file_map, offsets = self._file_map, self._file_offsets
+        if file_map is not None:
+            items = self._read_file(file_map, offsets, book_id)
+            if items is not None:
+                return items
+        if self.mode == "file":
+            return None
+
+        with self._lock:
+            entry = self._items.get(book_id)
+            if entry is not None:
+                self._items.move_to_end(book_id)
+                return entry[1]
+
+        items = self._compute(book_id)
+        self._put(book_id, items, version)
+        return items
+
+    def _put(self, book_id: int, items: List[str], version: int):
+        #? an empty result may be a lookup error; don't pin it
+        size = sum(sys.getsizeof(item) for item in items)
+        if not items or size > self.max_bytes:
+            return
+        with self._lock:
+            if self._version != version or book_id in self._items:
+                return
+            self._items[book_id] = (size, items)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (evicted_size, _) = self._items.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def get_response(self, book_id: int, limit: int) -> Optional[str]:
+        """
+        The full RecommendationResponse JSON body for an item-to-item request,
+        or None when the cache cannot serve it (`limit` above the cached
+        neighbors per book, or "file" mode without a usable file).
+        """
+        if not self.enabled or limit > self.k:
+            return None
+
+        items = self.get_items(book_id)
+        if items is None:
+            return None
+        items = items[:limit]
+        return (
+            '{"recommendations":[' + ",".join(items) + "],"
+            f'"total_count":{len(items)},"user_id":"",'
+            '"recommendation_type":"item_to_item"}'
+        )
+
+    def get_stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "file": self._file_map is not None,
+            "lazy_entries": len(self._items),
+            "lazy_bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def build_file(self):
+        """Precompute every book's neighbors into the cache file and its offsets."""
+        data_dir = self.data_loader.data_dir
+        path = os.path.join(data_dir, CACHE_FILE)
+        offsets_path = os.path.join(data_dir, OFFSETS_FILE)
+        n_books = len(self.data_loader.books)
+        header = {
+            "k": self.k,
+            "books": n_books,
+            "fingerprint": data_fingerprint(data_dir),
+        }
+
+        #? lines are indexed by row, and book_id == row position
+        offsets = np.empty(n_books + 1, dtype=np.int64)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write((json.dumps(header) + "\n").encode("utf-8"))
+            for row in range(n_books):
+                offsets[row] = f.tell()
+                items = self._compute(row)
+                f.write(f"{row}\t{ITEM_SEPARATOR.join(items)}\n".encode("utf-8"))
+            offsets[n_books] = f.tell()
+
+        with open(f"{offsets_path}.tmp", "wb") as f:
+            np.save(f, offsets)
+        os.replace(f"{offsets_path}.tmp", offsets_path)
+        os.replace(f"{path}.tmp", path)
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute the item-to-item response cache for every book."
+    )
+    parser.add_argument("--data-dir", default="../data")
+    parser.add_argument("--k", type=int, default=50, help="Neighbors kept per book")
+    args = parser.parse_args()
+
+    from data_loader import DataLoader
+
+    loader = DataLoader(args.data_dir)
+    if not loader.load_all_data():
+        raise SystemExit(1)
+
+    start_time = time.perf_counter()
+    path = NeighborResponseCache(loader, k=args.k, mode="file").build_file()
+    elapsed = time.perf_counter() - start_time
+    print(f"✅ Wrote neighbor cache for {len(loader.books)} books in {elapsed:.1f}s -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import argparse
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+NEIGHBOR_IDS_FILE = "neighbor_ids.npy"
+NEIGHBOR_SCORES_FILE = "neighbor_scores.npy"
+
+
+class NeighborIndex:
+    """Compact top-k neighbor index: N x K neighbor ids plus N x K scores.
+
+    Replaces the dense N x N similarity matrix at serving time, so memory
+    scales as N*K instead of N^2. Rows are sorted by descending score and never
+    contain the book itself.
+    """
+
+    def __init__(self, neighbor_ids: np.ndarray, neighbor_scores: np.ndarray):
+        if neighbor_ids.shape != neighbor_scores.shape:
+            raise ValueError(
+                f"Neighbor ids {neighbor_ids.shape} and scores "
+                f"{neighbor_scores.shape} must have the same shape"
+            )
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.neighbor_ids.shape
+
+    @property
+    def k(self) -> int:
+        return self.neighbor_ids.shape[1]
+
+    def __len__(self) -> int:
+        return self.neighbor_ids.shape[0]
+
+    def neighbors(self, row: int, limit: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, scores) of the `limit` nearest neighbors of `row`."""
+        if row < 0 or row >= len(self):
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        limit = min(limit, self.k)
+        ids = self.neighbor_ids[row, :limit]
+        scores = self.neighbor_scores[row, :limit].astype(np.float32)
+        return ids, scores
+
+    def similarity(self, row: int, other: int) -> float:
+        """Score between two rows, or 0.0 when `other` is outside row's top-k."""
+        if row < 0 or row >= len(self):
+            return 0.0
+
+        hits = np.flatnonzero(self.neighbor_ids[row] == other)
+        if hits.size == 0:
+            return 0.0
+        return float(self.neighbor_scores[row, hits[0]])
+
+    def extend(self, cross_scores: np.ndarray, block_size: int = 4096) -> "NeighborIndex":
+        """
+        Index with M new rows appended, without touching unaffected pairs.
+
+        `cross_scores` is the (N + M) x M similarity of every row (old rows
+        first, then the new ones) to the new rows. Existing rows merge the new
+        candidates into their top-k; new rows take their top-k from their
+        column of `cross_scores` plus the old rows.
+        """
+        n_old, n_new = len(self), cross_scores.shape[1]
+        n_total = n_old + n_new
+        k = self.k
+        new_cols = np.arange(n_old, n_total)
+
+        neighbor_ids = np.empty((n_total, k), dtype=self.neighbor_ids.dtype)
+        neighbor_scores = np.empty((n_total, k), dtype=self.neighbor_scores.dtype)
+
+        for start in range(0, n_old, block_size):
+            end = min(start + block_size, n_old)
+            ids = np.concatenate(
+                [self.neighbor_ids[start:end], np.broadcast_to(new_cols, (end - start, n_new))],
+                axis=1,
+            )
+            scores = np.concatenate(
+                [self.neighbor_scores[start:end].astype(np.float32), cross_scores[start:end]],
+                axis=1,
+            )
+            top, top_scores = top_k_per_row(scores, k)
+            neighbor_ids[start:end] = np.take_along_axis(ids, top, axis=1)
+            neighbor_scores[start:end] = top_scores
+
+        #? a new row's scores against every row are its column of cross_scores
+        new_rows = np.ascontiguousarray(cross_scores.T, dtype=np.float32)
+        top, top_scores = _top_k_block(new_rows, n_old, k)
+        neighbor_ids[n_old:] = top
+        neighbor_scores[n_old:] = top_scores
+
+        return NeighborIndex(neighbor_ids, neighbor_scores)
+
+    def save(self, data_dir: str):
+        """Write the index next to the other data artifacts."""
+        np.save(os.path.join(data_dir, NEIGHBOR_IDS_FILE), self.neighbor_ids)
+        np.save(os.path.join(data_dir, NEIGHBOR_SCORES_FILE), self.neighbor_scores)
+
+    @staticmethod
+    def exists(data_dir: str) -> bool:
+        return os.path.exists(
+            os.path.join(data_dir, NEIGHBOR_IDS_FILE)
+        ) and os.path.exists(os.path.join(data_dir, NEIGHBOR_SCORES_FILE))
+
+    @classmethod
+    def load(cls, data_dir: str, mmap_mode: Optional[str] = None) -> "NeighborIndex":
+        neighbor_ids = np.load(
+            os.path.join(data_dir, NEIGHBOR_IDS_FILE), mmap_mode=mmap_mode
+        )
+        neighbor_scores = np.load(
+            os.path.join(data_dir, NEIGHBOR_SCORES_FILE), mmap_mode=mmap_mode
+        )
+        return cls(neighbor_ids, neighbor_scores)
+
+
+def top_k_indices(
+    scores: np.ndarray, k: int, exclude: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Indices of the `k` largest entries of a 1-D score row, best first.
+
+    Uses argpartition (O(N)) plus a sort of the k candidates instead of a full
+    argsort. Ids in `exclude` (e.g. the query book itself) are dropped by id,
+    not by position.
+    """
+    n_scores = scores.shape[0]
+    exclude = None if exclude is None else np.atleast_1d(exclude)
+    want = min(k + (0 if exclude is None else exclude.size), n_scores)
+    if k <= 0 or want <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if want < n_scores:
+        candidates = np.argpartition(scores, n_scores - want)[n_scores - want :]
+    else:
+        candidates = np.arange(n_scores)
+
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    if exclude is not None:
+        candidates = candidates[~np.isin(candidates, exclude)]
+
+    return candidates[:k]
+
+
+def top_k_per_row(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(columns, scores) of the `k` largest entries of each row of a 2-D block, best first."""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(top, order, axis=1),
+        np.take_along_axis(top_scores, order, axis=1),
+    )
+
+
+def _top_k_block(
+    block: np.ndarray, row_offset: int, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k columns of each row in `block`, excluding the diagonal (self)."""
+    rows = np.arange(block.shape[0])
+    self_cols = rows + row_offset
+    in_range = self_cols < block.shape[1]
+    block[rows[in_range], self_cols[in_range]] = -np.inf
+
+    return top_k_per_row(block, k)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def build_neighbor_index(
+    similarity_matrix: Optional[np.ndarray] = None,
+    embeddings: Optional[np.ndarray] = None,
+    k: int = 50,
+    block_size: int = 1024,
+    score_dtype=np.float16,
+) -> NeighborIndex:
+    """
+    Build a top-k neighbor index from a similarity matrix or from embeddings.
+
+    Rows are processed in blocks of `block_size`, so only a
+    block_size x N slice of scores is ever held in memory. Passing a
+    memory-mapped similarity matrix keeps the dense matrix out of RAM.
+    """
+    if similarity_matrix is None and embeddings is None:
+        raise ValueError("Either similarity_matrix or embeddings is required")
+
+    source = similarity_matrix if similarity_matrix is not None else embeddings
+    n_books = source.shape[0]
+    k = min(k, n_books - 1)
+    if k < 1:
+        raise ValueError("At least two books are required to build neighbors")
+
+    normalized = _normalize_rows(embeddings) if similarity_matrix is None else None
+
+    neighbor_ids = np.empty((n_books, k), dtype=np.int32)
+    neighbor_scores = np.empty((n_books, k), dtype=score_dtype)
+
+    for start in range(0, n_books, block_size):
+        end = min(start + block_size, n_books)
+
+        if normalized is not None:
+            block = normalized[start:end] @ normalized.T
+        else:
+            block = np.array(similarity_matrix[start:end], dtype=np.float32)
+
+        ids, scores = _top_k_block(block, start, k)
+        neighbor_ids[start:end] = ids
+        neighbor_scores[start:end] = scores
+
+    return NeighborIndex(neighbor_ids, neighbor_scores)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the top-k neighbor index used by DataLoader."
+    )
+    parser.add_argument("--data-dir", default="../data")
+    parser.add_argument("--k", type=int, default=50, help="Neighbors kept per book")
+    parser.add_argument(
+        "--source",
+        choices=["matrix", "embeddings"],
+        default="matrix",
+        help="Build from similarity_matrix.npy or book_embeddings.npy",
+    )
+    parser.add_argument(
+        "--dtype", choices=["float16", "float32"], default="float16"
+    )
+    parser.add_argument("--block-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.source == "matrix":
+        #? memory-map so the dense matrix is streamed, never fully loaded
+        similarity_matrix = np.load(
+            os.path.join(args.data_dir, "similarity_matrix.npy"), mmap_mode="r"
+        )
+        index = build_neighbor_index(
+            similarity_matrix=similarity_matrix,
+            k=args.k,
+            block_size=args.block_size,
+            score_dtype=np.dtype(args.dtype),
+        )
+    else:
+        embeddings = np.load(os.path.join(args.data_dir, "book_embeddings.npy"))
+        index = build_neighbor_index(
+            embeddings=embeddings,
+            k=args.k,
+            block_size=args.block_size,
+            score_dtype=np.dtype(args.dtype),
+        )
+
+    index.save(args.data_dir)
+    elapsed = time.perf_counter() - start_time
+    print(f"✅ Built neighbor index {index.shape} in {elapsed:.1f}s -> {args.data_dir}")
+
+
+if __name__ == "__main__":
+    main()
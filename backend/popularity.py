@@ -0,0 +1,202 @@
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+#? weight of one event per kind; a favorite says more than a read
+EVENT_WEIGHTS = {"history": 1.0, "favorites": 3.0}
+
+
+def _parse_timestamp(timestamp) -> Optional[float]:
+    if not isinstance(timestamp, str) or not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        return None
+
+
+class PopularityModel:
+    """
+    Time-decayed popularity of books from history and favorites events.
+
+    An event of weight w at time t adds w * exp(decay * (t - t_ref)) to its
+    book's score; the true decayed score at time `now` is that sum times
+    exp(-decay * (now - t_ref)), a factor shared by every book. So ranking by
+    the stored sums ranks by decayed popularity, and adding or removing an
+    event is O(1). Each live event's contribution is kept so a removal
+    subtracts exactly what was added.
+
+    The ranking itself (the top `top_size` book ids) is rebuilt lazily, at
+    most once per `refresh_seconds`, so reads are a slice of a sorted list.
+
+    Events only reach the model of the process that handled them. When
+    several workers share one user store, `rebuild_periodically` replaces
+    the scores with per-book, per-day counts read from the store, so every
+    worker converges on the same ranking within one interval.
+    """
+
+    def __init__(
+        self,
+        half_life_days: float = 30.0,
+        top_size: int = 1000,
+        refresh_seconds: float = 5.0,
+    ):
+        self.decay = math.log(2) / (half_life_days * 86400)
+        self.top_size = top_size
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.Lock()
+        self._t_ref = time.time()
+        self._scores: Dict[int, float] = {}
+        self._contributions: Dict[Tuple[str, str, int], float] = {}
+        self._ranking: List[int] = []
+        self._ranked_at = 0.0
+        self._dirty = False
+        #? live events counted in the scores (rebuild counts every stored one)
+        self._events = 0
+        self._stop = threading.Event()
+
+    def _weight_at(self, kind: str, timestamp: float) -> float:
+        exponent = self.decay * (timestamp - self._t_ref)
+        if exponent > 500:
+            #? far past the reference time: rebase before exp() overflows
+            self._rebase(timestamp)
+            exponent = 0.0
+        return EVENT_WEIGHTS[kind] * math.exp(exponent)
+
+    def _rebase(self, t_ref: float):
+        """Move the reference time, rescaling every stored sum (lock held)."""
+        factor = math.exp(-self.decay * (t_ref - self._t_ref))
+        self._scores = {book_id: s * factor for book_id, s in self._scores.items()}
+        self._contributions = {
+            key: c * factor for key, c in self._contributions.items()
+        }
+        self._t_ref = t_ref
+
+    def add(self, kind: str, user_id: str, book_id: int, timestamp: Optional[float] = None):
+        """Count one history ("history") or favorites ("favorites") event."""
+        key = (kind, user_id, book_id)
+        with self._lock:
+            if key in self._contributions:
+                return
+            weight = self._weight_at(kind, timestamp or time.time())
+            self._contributions[key] = weight
+            self._scores[book_id] = self._scores.get(book_id, 0.0) + weight
+            self._events += 1
+            self._dirty = True
+
+    def remove(self, kind: str, user_id: str, book_id: int):
+        """Withdraw the contribution of a previously added event."""
+        with self._lock:
+            weight = self._contributions.pop((kind, user_id, book_id), None)
+            if weight is None:
+                return
+            score = self._scores.get(book_id, 0.0) - weight
+            if score <= 1e-12:
+                self._scores.pop(book_id, None)
+            else:
+                self._scores[book_id] = score
+            self._events -= 1
+            self._dirty = True
+
+    def apply_event(self, event: str, user_id: str, book_id: int):
+        """UserManager listener: "add_history", "remove_favorite", ..."""
+        action, _, kind = event.partition("_")
+        kind = "favorites" if kind == "favorite" else kind
+        if kind not in EVENT_WEIGHTS:
+            return
+        if action == "add":
+            self.add(kind, user_id, book_id)
+        elif action == "remove":
+            self.remove(kind, user_id, book_id)
+
+    def load_events(self, events: Iterable[Tuple[str, str, int, str]]):
+        """Bulk-add stored (kind, user_id, book_id, iso timestamp) events."""
+        count = 0
+        for kind, user_id, book_id, timestamp in events:
+            self.add(kind, user_id, int(book_id), _parse_timestamp(timestamp))
+            count += 1
+        return count
+
+    def rebuild(self, counts: Iterable[Tuple[str, int, str, int]]) -> int:
+        """
+        Replace every score with stored (kind, book_id, day, count) aggregates.
+
+        Events are dated to their day, which moves a 30-day half-life score by
+        at most about 2%. Per-event contributions are dropped: a removal of an
+        event counted here is ignored until the next rebuild picks it up.
+        """
+        t_ref = time.time()
+        scores: Dict[int, float] = {}
+        events = 0
+        for kind, book_id, day, count in counts:
+            if kind not in EVENT_WEIGHTS:
+                continue
+            timestamp = _parse_timestamp(day) or t_ref
+            weight = EVENT_WEIGHTS[kind] * count * math.exp(self.decay * (timestamp - t_ref))
+            scores[int(book_id)] = scores.get(int(book_id), 0.0) + weight
+            events += count
+
+        with self._lock:
+            self._t_ref = t_ref
+            self._scores = scores
+            self._contributions = {}
+            self._events = events
+            self._dirty = True
+            #? rank the fresh scores on the next read
+            self._ranked_at = 0.0
+        return events
+
+    def rebuild_periodically(
+        self, counts_source: Callable[[], Iterable[Tuple[str, int, str, int]]], interval: float
+    ):
+        """Rebuild from `counts_source()` every `interval` seconds in a daemon thread."""
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.rebuild(counts_source())
+                except Exception as e:
+                    print(f" Error rebuilding popularity: {str(e)}")
+
+        threading.Thread(target=loop, name="popularity-rebuild", daemon=True).start()
+
+    def close(self):
+        """Stop the periodic rebuild, if any."""
+        self._stop.set()
+
+    def _refresh(self):
+        """Rebuild the sorted top list if scores changed (lock held)."""
+        now = time.monotonic()
+        if not self._dirty or now - self._ranked_at < self.refresh_seconds:
+            return
+
+        book_ids = np.fromiter(self._scores.keys(), dtype=np.int64, count=len(self._scores))
+        scores = np.fromiter(self._scores.values(), dtype=np.float64, count=len(self._scores))
+        if len(scores) > self.top_size:
+            top = np.argpartition(-scores, self.top_size - 1)[: self.top_size]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        self._ranking = book_ids[top].tolist()
+        self._ranked_at = now
+        self._dirty = False
+
+    def top(self, limit: int = 10) -> List[int]:
+        """Most popular book ids, best first (may be fewer than `limit`)."""
+        with self._lock:
+            self._refresh()
+            return self._ranking[:limit]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "books": len(self._scores),
+                "events": self._events,
+                "half_life_days": math.log(2) / self.decay / 86400,
+            }
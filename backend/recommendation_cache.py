@@ -0,0 +1,126 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+
+def _estimate_size(books: List[Dict]) -> int:
+    """Rough size in bytes of a cached recommendation list."""
+    size = sys.getsizeof(books)
+    for book in books:
+        size += sys.getsizeof(book)
+        size += sum(sys.getsizeof(value) for value in book.values())
+    return size
+
+
+class RecommendationCache:
+    """
+    LRU + TTL cache of recommendation results.
+
+    Keys are (user_id, method, limit, history_version, data_version), so a
+    result is only reused while the user's history and the catalog snapshot
+    are unchanged; entries of a user are also
+    dropped eagerly through `invalidate_user`. Eviction is least recently used
+    once either `max_entries` or `max_bytes` is exceeded.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 600.0,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        #? key -> (inserted_at, size_bytes, books), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._keys_by_user: Dict[Hashable, Set[Tuple]] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "RecommendationCache":
+        return cls(
+            max_entries=int(os.environ.get("BOOKWISE_REC_CACHE_ENTRIES", 10000)),
+            max_bytes=int(
+                float(os.environ.get("BOOKWISE_REC_CACHE_MB", 64)) * 1024 * 1024
+            ),
+            ttl_seconds=float(os.environ.get("BOOKWISE_REC_CACHE_TTL", 600)),
+        )
+
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Tuple, books: List[Dict]):
+        size = _estimate_size(books)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic(), size, books)
+            self._keys_by_user.setdefault(key[0], set()).add(key)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: Tuple):
+        """Drop one entry (lock held)."""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        user_keys = self._keys_by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[key[0]]
+
+    def invalidate_user(self, user_id: Hashable):
+        """Drop every cached result of one user."""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -1,7 +1,10 @@
 import numpy as np
+import os
 from typing import List, Dict, Optional
 from data_loader import data_loader
 from user_manager import user_manager
+from recommendation_cache import RecommendationCache
+from popularity import PopularityModel
 
 
 class RecommendationEngine:
@@ -10,6 +13,60 @@ class RecommendationEngine:
     def __init__(self):
         self.data_loader = data_loader
         self.user_manager = user_manager
+        self.cache = RecommendationCache.from_env()
+        self.popularity = PopularityModel()
+        events = self.popularity.load_events(self.user_manager.iter_book_events())
+        print(f"✅ Built popularity model from {events} history/favorites events")
+        if self.user_manager.backend == "sqlite":
+            #? other workers write to the same database: re-read its counts periodically
+            self.popularity.rebuild_periodically(
+                self.user_manager.iter_book_counts,
+                float(os.environ.get("BOOKWISE_POPULARITY_REBUILD_SECONDS", "60")),
+            )
+        self.user_manager.add_listener(self._on_user_event)
+
+    def _on_user_event(self, event: str, user_id: str, book_id: int):
+        """Keep popularity current and drop a user's cached recommendations on history changes."""
+        self.popularity.apply_event(event, user_id, book_id)
+        if event.endswith("_history"):
+            self.cache.invalidate_user(user_id)
+
+    def get_recommendations(
+        self,
+        user_id: str,
+        method: str = "hybrid",
+        limit: int = 10,
+        use_embeddings: bool = False,
+    ) -> List[Dict]:
+        """
+        Personalized recommendations by method, served from the cache while the
+        user's history version and the data snapshot version are unchanged.
+        """
+        key = (
+            user_id,
+            method,
+            limit,
+            use_embeddings,
+            self.user_manager.get_history_version(user_id),
+            self.data_loader.version,
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        if method == "user_based":
+            recommendations = self.get_user_based_recommendations(
+                user_id, limit, use_embeddings
+            )
+        elif method == "category_based":
+            recommendations = self.get_category_based_recommendations(user_id, limit)
+        else:
+            recommendations = self.get_hybrid_recommendations(
+                user_id, limit, use_embeddings
+            )
+
+        self.cache.put(key, recommendations)
+        return recommendations
 
     def get_item_to_item_recommendations(
         self, book_id: int, limit: int = 10
@@ -27,9 +84,12 @@ class RecommendationEngine:
             return []
 
     def get_user_based_recommendations(
-        self, user_id: str, limit: int = 10
+        self, user_id: str, limit: int = 10, use_embeddings: bool = False
     ) -> List[Dict]:
-        """Get recommendations based on user's reading history using collaborative filtering."""
+        """
+        Get recommendations based on user's reading history using collaborative filtering.
+        All history rows are scored in one vectorized pass and the top-k taken once.
+        """
         try:
             # Get user's reading history
             user_history = self.user_manager.get_user_history(user_id)
@@ -38,43 +98,10 @@ class RecommendationEngine:
                 # If no history, return empty (let hybrid handle popular books)
                 return []
 
-            # Collect similarity scores for all books based on user's history
-            book_scores = {}
-
-            for read_book_id in user_history:
-                # Get similar books for each book in user's history
-                similar_books = self.data_loader.get_similar_books(
-                    read_book_id, limit * 2
-                )
-
-                for similar_book in similar_books:
-                    book_id = similar_book["book_id"]
-                    similarity = similar_book["similarity"]
-
-                    # Skip books already in user's history
-                    if book_id in user_history:
-                        continue
-
-                    # Accumulate similarity scores
-                    if book_id in book_scores:
-                        book_scores[book_id] += similarity
-                    else:
-                        book_scores[book_id] = similarity
-
-            # Sort books by accumulated similarity scores
-            sorted_books = sorted(book_scores.items(), key=lambda x: x[1], reverse=True)
-
-            # Get book details for top recommendations
-            recommendations = []
-            for book_id, score in sorted_books[:limit]:
-                book_info = self.data_loader.get_book_by_id(book_id)
-                if book_info:
-                    book_info["similarity"] = float(
-                        score / len(user_history)
-                    )  # Average similarity
-                    recommendations.append(book_info)
-
-            return recommendations
+            # Top unread books by average similarity to the user's history
+            return self.data_loader.get_history_recommendations(
+                user_history, limit, use_embeddings=use_embeddings
+            )
 
         except Exception as e:
             print(f"❌ Error getting user-based recommendations: {str(e)}")
@@ -95,9 +122,8 @@ class RecommendationEngine:
 
             # Find user's preferred categories
             category_counts = {}
-            for book_id in user_history:
-                book_info = self.data_loader.get_book_by_id(book_id)
-                if book_info and "category" in book_info:
+            for book_info in self.data_loader.get_books_by_ids(user_history):
+                if "category" in book_info:
                     category = book_info["category"]
                     category_counts[category] = category_counts.get(category, 0) + 1
 
@@ -122,10 +148,8 @@ class RecommendationEngine:
                         book["book_id"] not in user_history
                         and len(recommendations) < limit
                     ):
-                        book["similarity"] = (
-                            0.8  # Default similarity for category match
-                        )
-                        recommendations.append(book)
+                        # Default similarity for category match
+                        recommendations.append({**book, "similarity": 0.8})
 
             return recommendations[:limit]
 
@@ -133,7 +157,9 @@ class RecommendationEngine:
             print(f"❌ Error getting category-based recommendations: {str(e)}")
             return []
 
-    def get_hybrid_recommendations(self, user_id: str, limit: int = 10) -> List[Dict]:
+    def get_hybrid_recommendations(
+        self, user_id: str, limit: int = 10, use_embeddings: bool = False
+    ) -> List[Dict]:
         """
         Get hybrid recommendations combining multiple approaches.
         """
@@ -145,60 +171,113 @@ class RecommendationEngine:
                 return []
 
             # Get recommendations from different methods
-            user_based = self.get_user_based_recommendations(user_id, limit // 2)
-            category_based = self.get_category_based_recommendations(
-                user_id, limit // 2
+            user_based = self.get_user_based_recommendations(
+                user_id, limit // 2, use_embeddings
             )
-
-            # Combine and deduplicate
-            seen_books = set()
-            hybrid_recommendations = []
-
-            # Add user-based recommendations first (higher priority)
-            for book in user_based:
-                if book["book_id"] not in seen_books:
-                    seen_books.add(book["book_id"])
-                    hybrid_recommendations.append(book)
-
-            # Add category-based recommendations
-            for book in category_based:
-                if (
-                    book["book_id"] not in seen_books
-                    and len(hybrid_recommendations) < limit
-                ):
-                    seen_books.add(book["book_id"])
-                    hybrid_recommendations.append(book)
-
-            # If no recommendations found for user with history, fallback to popular books
-            if not hybrid_recommendations:
-                return self._get_popular_books(limit)
-
-            return hybrid_recommendations
+            return self._combine_hybrid(user_id, user_based, limit)
 
         except Exception as e:
             print(f"❌ Error getting hybrid recommendations: {str(e)}")
             return []
 
-    def _get_popular_books(self, limit: int = 10) -> List[Dict]:
+    def _combine_hybrid(
+        self, user_id: str, user_based: List[Dict], limit: int
+    ) -> List[Dict]:
+        """Merge user-based results with category-based ones for a user with history."""
+        category_based = self.get_category_based_recommendations(user_id, limit // 2)
+
+        # Combine and deduplicate
+        seen_books = set()
+        hybrid_recommendations = []
+
+        # Add user-based recommendations first (higher priority)
+        for book in user_based:
+            if book["book_id"] not in seen_books:
+                seen_books.add(book["book_id"])
+                hybrid_recommendations.append(book)
+
+        # Add category-based recommendations
+        for book in category_based:
+            if (
+                book["book_id"] not in seen_books
+                and len(hybrid_recommendations) < limit
+            ):
+                seen_books.add(book["book_id"])
+                hybrid_recommendations.append(book)
+
+        # If no recommendations found for user with history, fallback to popular books
+        if not hybrid_recommendations:
+            return self.get_popular_books(limit)
+
+        return hybrid_recommendations
+
+    def iter_batch_recommendations(
+        self,
+        user_ids: Optional[List[str]] = None,
+        book_ids: Optional[List[int]] = None,
+        method: str = "hybrid",
+        limit: int = 10,
+        block_size: int = 64,
+    ):
+        """
+        Recommendations for many users (by `method`) or many seed books
+        (item-to-item), yielded as one list of result dicts per block.
+
+        The similarity work of each block is shared: user histories are
+        scored together (see get_history_recommendations_batch), seed books
+        as one block of rows. Category-based parts still run per user.
+        """
+        if book_ids is not None:
+            for start in range(0, len(book_ids), block_size):
+                block = book_ids[start : start + block_size]
+                similar = self.data_loader.get_similar_books_batch(block, limit)
+                yield [
+                    {"book_id": book_id, "recommendations": books}
+                    for book_id, books in zip(block, similar)
+                ]
+            return
+
+        for start in range(0, len(user_ids or []), block_size):
+            block = user_ids[start : start + block_size]
+            histories = [self.user_manager.get_user_history(user_id) for user_id in block]
+
+            if method == "category_based":
+                results = [
+                    self.get_category_based_recommendations(user_id, limit)
+                    for user_id in block
+                ]
+            else:
+                user_limit = limit if method == "user_based" else limit // 2
+                results = self.data_loader.get_history_recommendations_batch(
+                    histories, user_limit, block_size=block_size
+                )
+                if method != "user_based":
+                    results = [
+                        self._combine_hybrid(user_id, user_based, limit) if history else []
+                        for user_id, history, user_based in zip(block, histories, results)
+                    ]
+
+            yield [
+                {"user_id": user_id, "recommendations": books}
+                for user_id, books in zip(block, results)
+            ]
+
+    def get_popular_books(self, limit: int = 10) -> List[Dict]:
         """
         Get popular books (fallback when no user history or errors occur).
-        For now, returns random books from the dataset.
+        Ranked by time-decayed reads and favorites, topped up with random
+        books while there are too few events.
         """
         try:
-            if self.data_loader.book_metadata is None:
-                return []
-
-            # Get random sample of books
-            sample_books = self.data_loader.book_metadata.sample(
-                n=min(limit, len(self.data_loader.book_metadata))
-            )
-            books = sample_books.to_dict("records")
+            books = self.data_loader.get_books_by_ids(self.popularity.top(limit))
+            if len(books) < limit:
+                seen = {book["book_id"] for book in books}
+                for book in self.data_loader.get_random_books(limit):
+                    if book["book_id"] not in seen and len(books) < limit:
+                        books.append(book)
 
             # Add default similarity score
-            for book in books:
-                book["similarity"] = 0.5
-
-            return books
+            return [{**book, "similarity": 0.5} for book in books]
 
         except Exception as e:
             print(f"❌ Error getting popular books: {str(e)}")
@@ -242,17 +321,10 @@ class RecommendationEngine:
             most_similar_book = None
 
             for read_book_id in user_history:
-                if read_book_id < len(
-                    self.data_loader.similarity_matrix
-                ) and book_id < len(self.data_loader.similarity_matrix):
-                    similarity = self.data_loader.similarity_matrix[read_book_id][
-                        book_id
-                    ]
-                    if similarity > max_similarity:
-                        max_similarity = similarity
-                        most_similar_book = self.data_loader.get_book_by_id(
-                            read_book_id
-                        )
+                similarity = self.data_loader.get_similarity(read_book_id, book_id)
+                if similarity > max_similarity:
+                    max_similarity = similarity
+                    most_similar_book = self.data_loader.get_book_by_id(read_book_id)
 
             if most_similar_book:
                 return f"Recommended because you read '{most_similar_book['title']}' and this book is {max_similarity:.1%} similar."
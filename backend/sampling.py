@@ -0,0 +1,59 @@
+from typing import Optional
+
+import numpy as np
+
+
+def sample_rows(n_rows: int, limit: int, rng: np.random.Generator) -> np.ndarray:
+    """`limit` distinct row positions drawn uniformly from `n_rows`."""
+    return rng.choice(n_rows, size=min(limit, n_rows), replace=False)
+
+
+def stratified_sample(
+    bucket_rows: np.ndarray,
+    bucket_offsets: np.ndarray,
+    limit: int,
+    rng: np.random.Generator,
+    per_bucket: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Distinct row positions spread across buckets (e.g. categories).
+
+    `bucket_rows` is a permutation of every row position, grouped so that
+    `bucket_rows[bucket_offsets[b]:bucket_offsets[b + 1]]` holds the rows of
+    bucket `b`. Buckets are visited in random order and contribute up to
+    `per_bucket` rows each (default `limit // n_buckets`, at least 1) until
+    `limit` is reached; any shortfall is filled with random rows from the
+    whole catalog. All draws are vectorized, so the cost depends on `limit`
+    and the number of buckets, not on the catalog size.
+    """
+    n_rows = len(bucket_rows)
+    counts = np.diff(bucket_offsets)
+    n_buckets = len(counts)
+    limit = min(limit, n_rows)
+    if limit <= 0 or n_buckets == 0:
+        return np.empty(0, dtype=np.int64)
+
+    if per_bucket is None:
+        per_bucket = max(1, limit // n_buckets)
+
+    #? shuffled buckets, each taking up to per_bucket rows, cut at limit
+    order = rng.permutation(n_buckets)
+    takes = np.minimum(counts[order], per_bucket)
+    ends = np.cumsum(takes)
+    takes = np.clip(takes - np.maximum(ends - limit, 0), 0, None)
+
+    #? one uniform draw per slot; duplicates inside a bucket are dropped
+    #? (stable, so bucket order is kept) and made up by the fill below
+    slot_buckets = np.repeat(order, takes)
+    positions = (rng.random(len(slot_buckets)) * counts[slot_buckets]).astype(np.int64)
+    rows = bucket_rows[bucket_offsets[slot_buckets] + positions]
+    _, first = np.unique(rows, return_index=True)
+    rows = rows[np.sort(first)]
+
+    missing = limit - len(rows)
+    if missing > 0:
+        extra = bucket_rows[sample_rows(n_rows, missing + len(rows), rng)]
+        extra = extra[~np.isin(extra, rows)][:missing]
+        rows = np.concatenate([rows, extra])
+
+    return rows
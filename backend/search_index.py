@@ -0,0 +1,172 @@
+import copy
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+_WHITESPACE_REGEX = re.compile(r"\s+")
+
+
+def normalize_text(text) -> str:
+    """Case-fold and collapse whitespace so queries and catalog text compare equal."""
+    if not isinstance(text, str):
+        return ""
+    return _WHITESPACE_REGEX.sub(" ", text.casefold()).strip()
+
+
+class NgramIndex:
+    """
+    Inverted index of character n-grams over one text field.
+
+    A query is answered by intersecting the posting lists of its n-grams
+    (shortest first), then verifying the surviving candidates with a plain
+    substring check, so latency depends on the posting list sizes rather than
+    on the number of rows in the catalog. Queries shorter than n read one
+    posting list of `short_postings`, which indexes every shorter substring;
+    there are few such queries and each matches many rows, so each is ranked
+    once and its ranking cached.
+    """
+
+    def __init__(
+        self,
+        texts: List[str],
+        n: int = 3,
+        normalizer: Callable[[str], str] = normalize_text,
+        pre_normalized: bool = False,
+    ):
+        self.n = n
+        self.normalizer = normalizer
+        self.texts = list(texts) if pre_normalized else [normalizer(t) for t in texts]
+
+        postings: Dict[str, List[int]] = {}
+        short_postings: Dict[str, List[int]] = {}
+        for row, text in enumerate(self.texts):
+            for gram in set(self._grams(text)):
+                postings.setdefault(gram, []).append(row)
+            for gram in self._short_grams(text):
+                short_postings.setdefault(gram, []).append(row)
+
+        self.postings: Dict[str, np.ndarray] = {
+            gram: np.asarray(rows, dtype=np.int32) for gram, rows in postings.items()
+        }
+        self.short_postings: Dict[str, np.ndarray] = {
+            gram: np.asarray(rows, dtype=np.int32) for gram, rows in short_postings.items()
+        }
+        #? short query -> every matching row, best first (filled on first search)
+        self._short_ranked: Dict[str, np.ndarray] = {}
+
+    def extended(self, texts: List[str], pre_normalized: bool = False) -> "NgramIndex":
+        """A copy of the index with rows appended; this index is left unchanged."""
+        index = copy.copy(self)
+        #? add() only replaces texts and posting arrays, so copying the dicts is enough
+        index.postings = dict(self.postings)
+        index.short_postings = dict(self.short_postings)
+        index._short_ranked = {}
+        index.add(texts, pre_normalized=pre_normalized)
+        return index
+
+    def add(self, texts: List[str], pre_normalized: bool = False):
+        """Append rows (numbered after the existing ones) to the index."""
+        first_row = len(self.texts)
+        new_texts = list(texts) if pre_normalized else [self.normalizer(t) for t in texts]
+
+        added: Dict[str, List[int]] = {}
+        added_short: Dict[str, List[int]] = {}
+        for row, text in enumerate(new_texts, start=first_row):
+            for gram in set(self._grams(text)):
+                added.setdefault(gram, []).append(row)
+            for gram in self._short_grams(text):
+                added_short.setdefault(gram, []).append(row)
+
+        #? texts first: a concurrent search may already see the new postings
+        self.texts = self.texts + new_texts
+        #? new rows are larger than every existing row, so postings stay sorted
+        for postings, additions in ((self.postings, added), (self.short_postings, added_short)):
+            for gram, rows in additions.items():
+                new_rows = np.asarray(rows, dtype=np.int32)
+                existing = postings.get(gram)
+                postings[gram] = (
+                    new_rows if existing is None else np.concatenate([existing, new_rows])
+                )
+        self._short_ranked = {}
+
+    def _grams(self, text: str) -> List[str]:
+        return [text[i : i + self.n] for i in range(len(text) - self.n + 1)]
+
+    def _short_grams(self, text: str) -> Set[str]:
+        """Every distinct substring shorter than n."""
+        return {
+            text[i : i + length]
+            for length in range(1, self.n)
+            for i in range(len(text) - length + 1)
+        }
+
+    def _candidates(self, query: str) -> np.ndarray:
+        """Rows that contain every n-gram of the query (a superset of the matches)."""
+        if len(query) < self.n:
+            return self.short_postings.get(query, np.empty(0, dtype=np.int32))
+
+        lists = []
+        for gram in set(self._grams(query)):
+            rows = self.postings.get(gram)
+            if rows is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(rows)
+
+        lists.sort(key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+            if candidates.size == 0:
+                break
+        return candidates
+
+    def _rank_key(self, text: str, query: str, position: int) -> Tuple[int, int, int]:
+        """Exact match, then prefix, then word start, then any substring."""
+        if text == query:
+            tier = 0
+        elif position == 0:
+            tier = 1
+        elif text[position - 1] == " ":
+            tier = 2
+        else:
+            tier = 3
+        return tier, position, len(text)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[int]:
+        """Row positions whose text contains `query`, best matches first."""
+        query = self.normalizer(query)
+        if not query:
+            return []
+
+        if len(query) < self.n:
+            ranked = self._short_ranked.get(query)
+            if ranked is None:
+                ranked = self._rank(query, self._candidates(query))
+                self._short_ranked[query] = ranked
+            return (ranked if limit is None else ranked[:limit]).tolist()
+
+        return self._rank(query, self._candidates(query), limit).tolist()
+
+    def _rank(self, query: str, candidates: np.ndarray, limit: Optional[int] = None) -> np.ndarray:
+        """The candidates that contain `query`, best first (only the best `limit`)."""
+        keys, rows = [], []
+        for row in candidates.tolist():
+            text = self.texts[row]
+            position = text.find(query)
+            if position >= 0:
+                keys.append(self._rank_key(text, query, position))
+                rows.append(row)
+        if not rows:
+            return np.empty(0, dtype=np.int32)
+
+        #? one int64 per match ordering like (tier, position, length, row), so only
+        #? the best `limit` are selected (argpartition) and sorted
+        tier, position, length = np.asarray(keys, dtype=np.int64).T
+        width = int(length.max()) + 1
+        n_rows = len(self.texts)
+        combined = ((tier * width + position) * width + length) * n_rows + np.asarray(rows)
+        if limit is not None and limit < combined.size:
+            combined = combined[np.argpartition(combined, limit)[:limit]]
+        combined.sort()
+        return (combined % n_rows).astype(np.int32)
@@ -0,0 +1,217 @@
+"""
+Out-of-core builder for the similarity artifacts.
+
+Replaces the notebook's one-shot `cosine_similarity(embeddings)`, which
+needs N x N memory, with a blocked build over memory-mapped embeddings:
+
+    python similarity_builder.py --data-dir ../data --k 50            # neighbor index
+    python similarity_builder.py --data-dir ../data --output dense    # float16 matrix
+    python similarity_builder.py --data-dir ../data --workers 8
+
+Only a (row block x column block) tile of scores is in memory at a time.
+`--output topk` writes `neighbor_ids.npy` / `neighbor_scores.npy`,
+`--output dense` writes `similarity_matrix.npy` as a float16 memmap; both
+are loaded by DataLoader as they are.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from embedding_index import is_normalized
+from neighbor_index import NEIGHBOR_IDS_FILE, NEIGHBOR_SCORES_FILE, top_k_per_row
+
+NORMALIZED_FILE = "book_embeddings.normalized.tmp.npy"
+
+#? per-process state, set by _init_worker
+_embeddings = None
+_output = None
+
+
+def normalize_to_file(embeddings: np.ndarray, path: str, block_size: int = 65536) -> np.ndarray:
+    """L2-normalize embeddings into a float32 .npy memmap, one row block at a time."""
+    normalized = open_memmap(path, mode="w+", dtype=np.float32, shape=embeddings.shape)
+    for start in range(0, embeddings.shape[0], block_size):
+        block = np.asarray(embeddings[start : start + block_size], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        normalized[start : start + block_size] = block / norms
+    normalized.flush()
+    return normalized
+
+
+def _init_worker(embeddings_path: str, output_path: Optional[str]):
+    global _embeddings, _output
+    _embeddings = np.load(embeddings_path, mmap_mode="r")
+    _output = None if output_path is None else np.load(output_path, mmap_mode="r+")
+
+
+def _score_tiles(start: int, end: int, col_block: int):
+    """Yield (column offset, scores) tiles of rows [start, end) against every row."""
+    rows = np.asarray(_embeddings[start:end])
+    for col_start in range(0, _embeddings.shape[0], col_block):
+        cols = np.asarray(_embeddings[col_start : col_start + col_block])
+        yield col_start, rows @ cols.T
+
+
+def _top_k_rows(task: Tuple[int, int, int, int]) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Top-k neighbors (excluding self) of rows [start, end)."""
+    start, end, k, col_block = task
+    n_rows = end - start
+    best_ids = np.empty((n_rows, 0), dtype=np.int64)
+    best_scores = np.empty((n_rows, 0), dtype=np.float32)
+
+    for col_start, scores in _score_tiles(start, end, col_block):
+        #? mask the diagonal when this tile contains it
+        self_cols = np.arange(start, end) - col_start
+        inside = (self_cols >= 0) & (self_cols < scores.shape[1])
+        scores[np.flatnonzero(inside), self_cols[inside]] = -np.inf
+
+        #? merge the tile into the running top-k of each row
+        ids = np.broadcast_to(np.arange(col_start, col_start + scores.shape[1]), scores.shape)
+        all_ids = np.concatenate([best_ids, ids], axis=1)
+        top, best_scores = top_k_per_row(np.concatenate([best_scores, scores], axis=1), k)
+        best_ids = np.take_along_axis(all_ids, top, axis=1)
+
+    return start, best_ids, best_scores
+
+
+def _dense_rows(task: Tuple[int, int, int, int]) -> Tuple[int, None, None]:
+    """Write rows [start, end) of the dense matrix straight into the output memmap."""
+    start, end, _, col_block = task
+    for col_start, scores in _score_tiles(start, end, col_block):
+        _output[start:end, col_start : col_start + scores.shape[1]] = scores
+    return start, None, None
+
+
+def build_similarity(
+    data_dir: str,
+    output: str = "topk",
+    k: int = 50,
+    block_size: int = 1024,
+    col_block: int = 65536,
+    workers: int = 1,
+    score_dtype=np.float16,
+    log_every: int = 10,
+):
+    """
+    Build the neighbor index ("topk") or dense matrix ("dense") from book_embeddings.npy.
+
+    Progress is printed every `log_every` finished blocks (and after the last).
+    """
+    embeddings = np.load(os.path.join(data_dir, "book_embeddings.npy"), mmap_mode="r")
+    n_books = embeddings.shape[0]
+
+    #? workers share one normalized copy through the page cache
+    normalized_path = os.path.join(data_dir, NORMALIZED_FILE)
+    if is_normalized(embeddings):
+        embeddings_path = os.path.join(data_dir, "book_embeddings.npy")
+    else:
+        normalize_to_file(embeddings, normalized_path)
+        embeddings_path = normalized_path
+
+    if output == "topk":
+        k = min(k, n_books - 1)
+        if k < 1:
+            raise ValueError("At least two books are required to build neighbors")
+        targets = {
+            NEIGHBOR_IDS_FILE: ((n_books, k), np.int32),
+            NEIGHBOR_SCORES_FILE: ((n_books, k), score_dtype),
+        }
+        worker_func, output_path = _top_k_rows, None
+    elif output == "dense":
+        targets = {"similarity_matrix.npy": ((n_books, n_books), score_dtype)}
+        worker_func = _dense_rows
+        output_path = os.path.join(data_dir, "similarity_matrix.npy.tmp.npy")
+    else:
+        raise ValueError(f"Unknown output: {output}")
+
+    #? write into temporary memmaps, renamed over the artifacts once complete
+    outputs = {
+        name: open_memmap(
+            os.path.join(data_dir, f"{name}.tmp.npy"), mode="w+", dtype=dtype, shape=shape
+        )
+        for name, (shape, dtype) in targets.items()
+    }
+
+    tasks = [
+        (start, min(start + block_size, n_books), k, col_block)
+        for start in range(0, n_books, block_size)
+    ]
+    start_time = time.perf_counter()
+    done = 0
+
+    if workers > 1:
+        pool = multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=(embeddings_path, output_path)
+        )
+        results = pool.imap_unordered(worker_func, tasks)
+    else:
+        pool = None
+        _init_worker(embeddings_path, output_path)
+        results = map(worker_func, tasks)
+
+    try:
+        for block_number, (start, ids, scores) in enumerate(results, 1):
+            if ids is not None:
+                outputs[NEIGHBOR_IDS_FILE][start : start + len(ids)] = ids
+                outputs[NEIGHBOR_SCORES_FILE][start : start + len(ids)] = scores
+            done += min(block_size, n_books - start)
+            if block_number % log_every == 0 or block_number == len(tasks):
+                elapsed = time.perf_counter() - start_time
+                print(f"  {done}/{n_books} rows, {done / elapsed:.0f} rows/s")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    for name, array in outputs.items():
+        array.flush()
+        os.replace(os.path.join(data_dir, f"{name}.tmp.npy"), os.path.join(data_dir, name))
+    if embeddings_path == normalized_path:
+        os.remove(normalized_path)
+
+    return list(targets)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build similarity artifacts from book_embeddings.npy in blocks."
+    )
+    parser.add_argument("--data-dir", default="../data")
+    parser.add_argument(
+        "--output",
+        choices=["topk", "dense"],
+        default="topk",
+        help="Top-k neighbor index or dense similarity matrix",
+    )
+    parser.add_argument("--k", type=int, default=50, help="Neighbors kept per book")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument("--block-size", type=int, default=1024, help="Rows per task")
+    parser.add_argument("--col-block", type=int, default=65536, help="Columns per tile")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--log-every", type=int, default=10, help="Blocks between progress lines")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    written = build_similarity(
+        args.data_dir,
+        output=args.output,
+        k=args.k,
+        block_size=args.block_size,
+        col_block=args.col_block,
+        workers=args.workers,
+        score_dtype=np.dtype(args.dtype),
+        log_every=max(1, args.log_every),
+    )
+    elapsed = time.perf_counter() - start_time
+    print(f"✅ Wrote {', '.join(written)} in {elapsed:.1f}s -> {args.data_dir}")
+
+
+if __name__ == "__main__":
+    main()
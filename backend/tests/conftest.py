@@ -0,0 +1,39 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+#? backend modules are flat and imported by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+N_BOOKS = 40
+DIMENSION = 8
+CATEGORIES = ["روايات", "تاريخ", "علوم"]
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """A small data/ directory: metadata, title pickles, embeddings and their similarity matrix."""
+    rng = np.random.default_rng(0)
+    titles = [f"كتاب {i}" for i in range(N_BOOKS)]
+    pd.DataFrame(
+        {
+            "book_id": range(N_BOOKS),
+            "title": titles,
+            "category": rng.choice(CATEGORIES, N_BOOKS),
+            "description_to_display": [f"وصف {i}" for i in range(N_BOOKS)],
+        }
+    ).to_csv(tmp_path / "book_metadata.csv", index=False)
+
+    embeddings = rng.normal(size=(N_BOOKS, DIMENSION)).astype(np.float32)
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.save(tmp_path / "book_embeddings.npy", embeddings)
+    np.save(tmp_path / "similarity_matrix.npy", normalized @ normalized.T)
+    with open(tmp_path / "title_to_index.pkl", "wb") as f:
+        pickle.dump({title: i for i, title in enumerate(titles)}, f)
+    with open(tmp_path / "index_to_title.pkl", "wb") as f:
+        pickle.dump({i: title for i, title in enumerate(titles)}, f)
+    return str(tmp_path)
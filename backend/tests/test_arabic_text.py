@@ -0,0 +1,39 @@
+import pytest
+
+from arabic_text import ArabicTextPreprocessor, normalize_search_texts
+
+TEXTS = [
+    "الْكِتَابُ الأوَّل",
+    "إحياء علوم الدين — الجزء ١٢٣",
+    "قصـــــة   مدينة\t\nرحلة",
+    "Hello WORLD، كيف الحال؟!",
+    "مرحبا 😀 بالعالم",
+    "ى ة أ آ إ",
+    "‏نص‎ مع علامات",
+    "",
+    "   ",
+    None,
+    42,
+]
+
+
+@pytest.fixture(scope="module")
+def preprocessor():
+    return ArabicTextPreprocessor()
+
+
+def test_batch_matches_preprocess(preprocessor):
+    expected = [preprocessor.preprocess(text) for text in TEXTS]
+    assert preprocessor.preprocess_batch(TEXTS) == expected
+
+
+def test_batch_chunks_keep_order(preprocessor):
+    texts = [text for text in TEXTS if isinstance(text, str)] * 5
+    expected = [preprocessor.preprocess(text) for text in texts]
+    assert preprocessor.preprocess_batch(texts, workers=2, chunk_size=7) == expected
+
+
+def test_search_texts_blank_for_missing_values():
+    normalized = normalize_search_texts(["كتاب", None, 3.5])
+    assert normalized[1:] == ["", ""]
+    assert normalized[0]
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from artifact_bundle import BUNDLE_FILE, ArtifactBundle, convert
+from data_loader import DataLoader
+from neighbor_index import build_neighbor_index
+
+from conftest import DIMENSION, N_BOOKS
+
+
+def _normalize(matrix):
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def bundled_dir(data_dir):
+    similarity = np.load(os.path.join(data_dir, "similarity_matrix.npy"))
+    build_neighbor_index(similarity_matrix=similarity, k=5).save(data_dir)
+    convert(data_dir)
+    return data_dir
+
+
+def test_convert_round_trip(bundled_dir):
+    bundle = ArtifactBundle(os.path.join(bundled_dir, BUNDLE_FILE), verify=True)
+    assert bundle.verify_all() == []
+
+    frame = pd.read_csv(os.path.join(bundled_dir, "book_metadata.csv"))
+    books = bundle.book_store()
+    assert len(books) == N_BOOKS
+    assert [book["title"] for book in books] == frame["title"].tolist()
+    assert [book["category"] for book in books] == frame["category"].tolist()
+
+    np.testing.assert_array_equal(
+        bundle.array("similarity_matrix"), np.load(os.path.join(bundled_dir, "similarity_matrix.npy"))
+    )
+    np.testing.assert_array_equal(
+        bundle.array("neighbor_ids"), np.load(os.path.join(bundled_dir, "neighbor_ids.npy"))
+    )
+    assert dict(bundle.title_to_index()) == {title: i for i, title in enumerate(frame["title"])}
+
+
+def test_loader_reads_bundle(bundled_dir):
+    loader = DataLoader(bundled_dir, use_bundle=True)
+    loader.load_all_data()
+    assert loader.bundle is not None
+    assert len(loader.books) == N_BOOKS
+    assert loader.get_book_by_id(3)["title"] == "كتاب 3"
+
+
+def test_save_keeps_sections_that_are_not_loaded(bundled_dir):
+    path = os.path.join(bundled_dir, BUNDLE_FILE)
+    sections_before = set(ArtifactBundle(path).sections)
+
+    loader = DataLoader(bundled_dir, use_bundle=True, use_neighbor_index=True)
+    loader.load_all_data()
+    #? serving reads the neighbor index, so the dense matrix is never loaded
+    assert loader.neighbor_index is not None and loader.similarity_matrix is None
+
+    new_embeddings = np.random.default_rng(5).normal(size=(3, DIMENSION)).astype(np.float32)
+    updated = loader.with_books(
+        [{"title": f"جديد {i}", "category": "علوم"} for i in range(3)], new_embeddings
+    )
+    updated.save_artifacts()
+
+    bundle = ArtifactBundle(path, verify=True)
+    #? nothing is dropped, and no index arrays are added that were not saved before
+    assert set(bundle.sections) == sections_before
+    assert bundle.verify_all() == []
+
+    embeddings = np.concatenate(
+        [np.load(os.path.join(bundled_dir, "book_embeddings.npy"))[:N_BOOKS], new_embeddings]
+    )
+    normalized = _normalize(embeddings)
+    np.testing.assert_allclose(bundle.array("similarity_matrix"), normalized @ normalized.T, atol=1e-5)
+    assert bundle.array("neighbor_ids").shape[0] == N_BOOKS + 3
+    assert bundle.array("book_embeddings").shape == (N_BOOKS + 3, DIMENSION)
+    assert len(pd.read_csv(os.path.join(bundled_dir, "book_metadata.csv"))) == N_BOOKS + 3
+
+    reloaded = DataLoader(bundled_dir, use_bundle=True)
+    reloaded.load_all_data()
+    assert reloaded.get_book_by_id(N_BOOKS + 1)["title"] == "جديد 1"
+
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from book_store import BookStore
+
+
+def _store(book_ids):
+    return BookStore.from_columns(
+        book_ids,
+        [f"عنوان {i}" for i in book_ids],
+        ["روايات", None, "تاريخ"][: len(book_ids)],
+        [f"وصف {i}" for i in book_ids],
+    )
+
+
+def test_rows_read_like_dicts():
+    store = _store([0, 1, 2])
+    assert dict(store[1]) == {
+        "book_id": 1,
+        "title": "عنوان 1",
+        "category": "",
+        "description_to_display": "وصف 1",
+    }
+    assert store.category_column() == ["روايات", "", "تاريخ"]
+
+
+def test_row_of_contiguous_ids():
+    store = _store([0, 1, 2])
+    assert store.row_of(2) == 2
+    assert store.row_of(3) is None
+    assert store.row_of(-1) is None
+
+
+def test_row_of_non_contiguous_ids():
+    store = _store([10, 5, 7])
+    assert store.row_of(5) == 1
+    assert store.row_of(10) == 0
+    assert store.row_of(1) is None
+
+
+def test_append_returns_new_store():
+    store = _store([0, 1, 2])
+    appended = store.append(
+        [
+            {"book_id": 3, "title": "جديد", "category": "علوم", "description_to_display": "نص"},
+            {"book_id": 4, "title": "آخر", "category": "روايات"},
+        ]
+    )
+
+    assert len(store) == 3
+    assert len(appended) == 5
+    assert appended[3]["title"] == "جديد"
+    assert appended[3]["category"] == "علوم"
+    assert appended[4]["category"] == "روايات"
+    assert appended[4]["description_to_display"] == ""
+    assert appended.categories[: len(store.categories)] == store.categories
+    assert [dict(book) for book in appended][:3] == [dict(book) for book in store]
+    assert appended.row_of(4) == 4
+
+
+def test_append_to_non_contiguous_store():
+    store = _store([10, 5, 7])
+    appended = store.append([{"book_id": 2, "title": "x", "category": "تاريخ"}])
+    assert appended.row_of(2) == 3
+    assert appended.row_of(7) == 2
+
+
+def test_frame_round_trip():
+    store = _store([0, 1, 2])
+    frame = store.to_frame()
+    assert list(frame["book_id"]) == [0, 1, 2]
+    again = BookStore.from_frame(frame)
+    assert [dict(book) for book in again] == [dict(book) for book in store]
+    assert isinstance(frame, pd.DataFrame) and frame["book_id"].dtype == np.int64
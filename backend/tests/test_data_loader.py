@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import DataLoader, DataLoaderHandle
+
+from conftest import DIMENSION, N_BOOKS
+
+
+@pytest.fixture
+def loader(data_dir):
+    loader = DataLoader(data_dir, use_bundle=False, use_neighbor_index=False)
+    assert loader.load_all_data()
+    return loader
+
+
+def test_get_book_by_id_known(loader):
+    book = loader.get_book_by_id(3)
+    assert book["book_id"] == 3
+    assert book["title"] == "كتاب 3"
+    assert book["description_to_display"] == "وصف 3"
+
+
+def test_get_book_by_id_missing(loader):
+    assert loader.get_book_by_id(N_BOOKS) is None
+    assert loader.get_book_by_id(10**9) is None
+
+
+def test_get_book_by_id_negative(loader):
+    #? ids are not Python indexes: -1 must not wrap around to the last book
+    assert loader.get_book_by_id(-1) is None
+
+
+def test_get_books_by_ids_keeps_order_and_skips_unknown(loader):
+    books = loader.get_books_by_ids([5, -1, 0, N_BOOKS, 5, N_BOOKS - 1])
+    assert [book["book_id"] for book in books] == [5, 0, 5, N_BOOKS - 1]
+    assert [book["title"] for book in books] == [
+        "كتاب 5",
+        "كتاب 0",
+        "كتاب 5",
+        f"كتاب {N_BOOKS - 1}",
+    ]
+
+
+def test_get_books_by_ids_empty_and_all_unknown(loader):
+    assert loader.get_books_by_ids([]) == []
+    assert loader.get_books_by_ids([-5, N_BOOKS, N_BOOKS + 1]) == []
+
+
+def test_history_scores_with_zero_weights_fall_back_to_the_average(loader):
+    history = [1, 2, 3]
+    scores = loader.get_history_scores(history, weights=np.zeros(3))
+    assert not np.isnan(scores).any()
+    np.testing.assert_allclose(scores, loader.get_history_scores(history), rtol=1e-6)
+
+
+def test_hot_add_leaves_old_snapshot_unchanged(loader):
+    new_embeddings = np.random.default_rng(6).normal(size=(2, DIMENSION)).astype(np.float32)
+    updated = loader.with_books([{"title": "أ"}, {"title": "ب"}], new_embeddings)
+
+    assert len(loader.books) == N_BOOKS and loader.similarity_matrix.shape == (N_BOOKS, N_BOOKS)
+    assert len(updated.books) == N_BOOKS + 2
+    assert updated.similarity_matrix.shape == (N_BOOKS + 2, N_BOOKS + 2)
+    assert loader.get_book_by_id(N_BOOKS) is None
+    assert updated.get_book_by_id(N_BOOKS)["title"] == "أ"
+    assert all(book["book_id"] < N_BOOKS for book in loader.search_books("أ"))
+
+
+def test_add_books_persists_inside_the_swap(data_dir):
+    handle = DataLoaderHandle(lambda: DataLoader(data_dir, use_bundle=False, use_neighbor_index=False))
+    assert handle.load_all_data()
+    files_before = set(os.listdir(data_dir))
+    new_embeddings = np.random.default_rng(7).normal(size=(1, DIMENSION)).astype(np.float32)
+
+    result = handle.add_books([{"title": "أ"}], new_embeddings, persist=True)
+
+    assert result == {"added": 1, "total_books": N_BOOKS + 1}
+    assert handle.version == 2
+    assert len(pd.read_csv(os.path.join(data_dir, "book_metadata.csv"))) == N_BOOKS + 1
+    assert np.load(os.path.join(data_dir, "similarity_matrix.npy")).shape == (N_BOOKS + 1, N_BOOKS + 1)
+    #? embedding index arrays were never saved, so none are created
+    assert set(os.listdir(data_dir)) == files_before
+
+
+def test_add_books_is_not_swapped_in_when_persisting_fails(data_dir, monkeypatch):
+    handle = DataLoaderHandle(lambda: DataLoader(data_dir, use_bundle=False, use_neighbor_index=False))
+    assert handle.load_all_data()
+
+    def fail(self):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(DataLoader, "save_artifacts", fail)
+    new_embeddings = np.random.default_rng(8).normal(size=(1, DIMENSION)).astype(np.float32)
+    with pytest.raises(OSError, match="Books were not added"):
+        handle.add_books([{"title": "أ"}], new_embeddings, persist=True)
+
+    assert handle.version == 1
+    assert len(handle.books) == N_BOOKS
+    assert handle.get_book_by_id(N_BOOKS) is None
@@ -0,0 +1,50 @@
+import json
+import os
+
+import numpy as np
+
+from data_loader import DataLoader, DataLoaderHandle
+from neighbor_cache import CACHE_FILE, NeighborResponseCache
+
+from conftest import DIMENSION, N_BOOKS
+
+
+def _handle(data_dir):
+    handle = DataLoaderHandle(lambda: DataLoader(data_dir, use_bundle=False, use_neighbor_index=False))
+    assert handle.load_all_data()
+    return handle
+
+
+def test_file_is_served_until_books_are_hot_added(data_dir):
+    handle = _handle(data_dir)
+    NeighborResponseCache(handle, k=5, mode="file").build_file()
+    cache = NeighborResponseCache(handle, k=5, mode="file")
+    assert cache.load()
+    body = json.loads(cache.get_response(3, 5))
+    assert [book["book_id"] for book in body["recommendations"]] == [
+        book["book_id"] for book in handle.get_similar_books(3, 5)
+    ]
+
+    new_embeddings = np.random.default_rng(9).normal(size=(1, DIMENSION)).astype(np.float32)
+    handle.add_books([{"title": "أ"}], new_embeddings)
+    #? old lines may miss the new book, so "file" mode stops serving them
+    assert cache.get_response(3, 5) is None
+    assert cache.get_stats()["file"] is False
+
+
+def test_stale_file_is_not_mapped(data_dir):
+    handle = _handle(data_dir)
+    NeighborResponseCache(handle, k=5, mode="file").build_file()
+    path = os.path.join(data_dir, CACHE_FILE)
+    with open(path, "rb") as f:
+        header = json.loads(f.readline())
+        rest = f.read()
+    header["books"] = N_BOOKS + 1
+    with open(path, "wb") as f:
+        f.write((json.dumps(header) + "\n").encode("utf-8") + rest)
+
+    cache = NeighborResponseCache(handle, k=5, mode="auto")
+    assert not cache.load()
+    assert cache.get_stats()["file"] is False
+    #? "auto" falls back to filling lazily
+    assert cache.get_response(3, 5) is not None
@@ -0,0 +1,71 @@
+import numpy as np
+
+from data_loader import DataLoader
+from neighbor_index import build_neighbor_index
+
+
+def _normalized(rng, n, d=8):
+    matrix = rng.normal(size=(n, d)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def test_matches_dense_top_k():
+    embeddings = _normalized(np.random.default_rng(1), 30)
+    similarity = embeddings @ embeddings.T
+    index = build_neighbor_index(similarity_matrix=similarity, k=5, score_dtype=np.float32)
+
+    for row in range(len(similarity)):
+        scores = similarity[row].copy()
+        scores[row] = -np.inf
+        expected = np.argsort(-scores)[:5]
+        ids, top_scores = index.neighbors(row, limit=5)
+        assert ids.tolist() == expected.tolist()
+        np.testing.assert_allclose(top_scores, similarity[row, expected], rtol=1e-6)
+
+
+def test_matrix_and_embeddings_agree():
+    embeddings = _normalized(np.random.default_rng(2), 25)
+    from_matrix = build_neighbor_index(similarity_matrix=embeddings @ embeddings.T, k=4, block_size=7)
+    from_embeddings = build_neighbor_index(embeddings=embeddings, k=4, block_size=7)
+    assert from_matrix.neighbor_ids.tolist() == from_embeddings.neighbor_ids.tolist()
+
+
+def test_extend_equals_rebuild():
+    embeddings = _normalized(np.random.default_rng(3), 35)
+    n_old = 30
+    similarity = embeddings @ embeddings.T
+    old = build_neighbor_index(similarity_matrix=similarity[:n_old, :n_old], k=6, score_dtype=np.float32)
+
+    extended = old.extend(similarity[:, n_old:], block_size=8)
+    rebuilt = build_neighbor_index(similarity_matrix=similarity, k=6, score_dtype=np.float32)
+
+    assert extended.shape == (35, 6)
+    assert extended.neighbor_ids.tolist() == rebuilt.neighbor_ids.tolist()
+    np.testing.assert_allclose(extended.neighbor_scores, rebuilt.neighbor_scores, rtol=1e-6)
+    #? the original index is left unchanged
+    assert old.shape == (n_old, 6)
+
+
+def test_similarity_outside_top_k_is_zero():
+    embeddings = _normalized(np.random.default_rng(4), 10)
+    index = build_neighbor_index(embeddings=embeddings, k=2)
+    ids, scores = index.neighbors(0, limit=2)
+    assert index.similarity(0, int(ids[0])) == float(scores[0])
+    outside = next(row for row in range(1, 10) if row not in ids.tolist())
+    assert index.similarity(0, outside) == 0.0
+    assert index.neighbors(99)[0].size == 0
+
+
+def test_history_recommendations_skip_books_outside_every_top_k(data_dir):
+    loader = DataLoader(data_dir, use_bundle=False)
+    assert loader.load_all_data()
+    loader.neighbor_index = build_neighbor_index(embeddings=loader.book_embeddings, k=2)
+    history = [0, 1]
+
+    books = loader.get_history_recommendations(history, limit=20)
+    batch = loader.get_history_recommendations_batch([history], limit=20)[0]
+
+    #? at most k neighbors per history book, never zero-score padding
+    assert 0 < len(books) <= 4
+    assert all(book["similarity"] > 0 for book in books)
+    assert [book["book_id"] for book in batch] == [book["book_id"] for book in books]
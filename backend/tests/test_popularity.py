@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+from popularity import PopularityModel
+
+
+def _day(days_ago: int) -> str:
+    return (datetime.now() - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+
+
+def test_rebuild_ranks_like_the_events():
+    events = [
+        ("history", "u1", 1, _day(40)),
+        ("history", "u2", 1, _day(40)),
+        ("history", "u3", 1, _day(40)),
+        ("history", "u1", 2, _day(1)),
+        ("history", "u2", 2, _day(1)),
+        ("favorites", "u1", 3, _day(2)),
+    ]
+    from_events = PopularityModel(refresh_seconds=0)
+    from_events.load_events(events)
+
+    counts = {}
+    for kind, _, book_id, day in events:
+        counts[(kind, book_id, day)] = counts.get((kind, book_id, day), 0) + 1
+    rebuilt = PopularityModel(refresh_seconds=0)
+    assert rebuilt.rebuild([(*key, count) for key, count in counts.items()]) == len(events)
+
+    assert rebuilt.top(3) == from_events.top(3) == [3, 2, 1]
+    assert rebuilt.get_stats()["events"] == len(events)
+
+
+def test_rebuild_replaces_local_scores():
+    model = PopularityModel(refresh_seconds=0)
+    model.add("history", "u1", 7)
+    model.rebuild([("history", 8, _day(0), 2)])
+    assert model.top(5) == [8]
+    #? removing an event counted before the rebuild is a no-op until the next one
+    model.remove("history", "u1", 7)
+    assert model.top(5) == [8]
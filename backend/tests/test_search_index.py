@@ -0,0 +1,37 @@
+from search_index import NgramIndex
+
+TEXTS = ["ab", "cab", "abc", "x ab", "zzz", "a"]
+
+
+def _brute_force(index, query):
+    matches = []
+    for row, text in enumerate(index.texts):
+        position = text.find(query)
+        if position >= 0:
+            matches.append((index._rank_key(text, query, position), row))
+    return [row for _, row in sorted(matches)]
+
+
+def test_short_queries_match_texts_shorter_than_n():
+    index = NgramIndex(TEXTS)
+    assert index.search("a") == _brute_force(index, "a")
+    assert index.search("ab") == [0, 2, 3, 1]
+    assert index.search("q") == []
+
+
+def test_limit_returns_the_best_matches_in_order():
+    index = NgramIndex(TEXTS * 5)
+    for query in ("a", "ab", "abc", "zz"):
+        expected = _brute_force(index, query)
+        assert index.search(query) == expected
+        for limit in (0, 1, 3, 100):
+            assert index.search(query, limit) == expected[:limit]
+
+
+def test_extended_refreshes_short_query_results():
+    index = NgramIndex(TEXTS)
+    assert index.search("ab")
+    extended = index.extended(["ab cd"])
+    assert extended.search("ab") == [0, 2, 6, 3, 1]
+    #? the original index and its cached ranking are unchanged
+    assert index.search("ab") == [0, 2, 3, 1]
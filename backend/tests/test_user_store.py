@@ -0,0 +1,108 @@
+import pytest
+
+from user_store import MemoryUserStore, SqliteUserStore, fcntl
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        (tmp_path / "users.csv").write_text("id,username,created_at\n", encoding="utf-8")
+        for name in ("history.csv", "favorites.csv"):
+            (tmp_path / name).write_text("user_id,book_id,timestamp\n", encoding="utf-8")
+        store = MemoryUserStore(
+            str(tmp_path / "users.csv"),
+            str(tmp_path / "history.csv"),
+            str(tmp_path / "favorites.csv"),
+            background=False,
+        )
+    else:
+        store = SqliteUserStore(str(tmp_path / "users.db"))
+    store.create_user("u1", "reader", "2024-01-01")
+    yield store
+    store.close()
+
+
+def test_version_starts_at_zero(store):
+    assert store.get_history_version("u1") == 0
+    assert store.get_history_version("unknown") == 0
+
+
+def test_version_changes_on_every_change(store):
+    seen = {store.get_history_version("u1")}
+    assert store.add_history("u1", 3, "2024-01-02")
+    seen.add(store.get_history_version("u1"))
+    assert store.remove_history("u1", 3)
+    seen.add(store.get_history_version("u1"))
+    #? same history as before the remove, but the version must not repeat
+    assert store.add_history("u1", 3, "2024-01-03")
+    seen.add(store.get_history_version("u1"))
+    assert len(seen) == 4
+    assert store.get_history("u1") == [3]
+
+
+def test_version_unchanged_on_no_op(store):
+    store.add_history("u1", 3, "2024-01-02")
+    version = store.get_history_version("u1")
+    assert not store.add_history("u1", 3, "2024-01-02")
+    assert not store.remove_history("u1", 4)
+    assert store.get_history_version("u1") == version
+
+
+def test_version_is_per_user(store):
+    store.create_user("u2", "other", "2024-01-01")
+    store.add_history("u1", 3, "2024-01-02")
+    assert store.get_history_version("u2") == 0
+
+
+def test_sqlite_version_survives_reopen(tmp_path):
+    path = str(tmp_path / "users.db")
+    store = SqliteUserStore(path)
+    store.create_user("u1", "reader", "2024-01-01")
+    store.add_history("u1", 3, "2024-01-02")
+    version = store.get_history_version("u1")
+    store.close()
+
+    reopened = SqliteUserStore(path)
+    assert reopened.get_history_version("u1") == version
+    reopened.close()
+
+
+def _memory_store(tmp_path, **kwargs):
+    return MemoryUserStore(
+        str(tmp_path / "users.csv"),
+        str(tmp_path / "history.csv"),
+        str(tmp_path / "favorites.csv"),
+        background=False,
+        **kwargs,
+    )
+
+
+@pytest.mark.skipif(fcntl is None, reason="needs fcntl")
+def test_memory_store_refuses_a_second_writer(tmp_path):
+    (tmp_path / "users.csv").write_text("id,username,created_at\n", encoding="utf-8")
+    for name in ("history.csv", "favorites.csv"):
+        (tmp_path / name).write_text("user_id,book_id,timestamp\n", encoding="utf-8")
+    store = _memory_store(tmp_path)
+    store.create_user("u1", "reader", "2024-01-01")
+
+    with pytest.raises(RuntimeError, match="BOOKWISE_USER_BACKEND=sqlite"):
+        _memory_store(tmp_path)
+    #? a read-only snapshot (export.py) can still open the files
+    _memory_store(tmp_path, lock=False)
+
+    store.close()
+    reopened = _memory_store(tmp_path)
+    assert reopened.get_user("u1")["username"] == "reader"
+    reopened.close()
+
+
+def test_book_counts_group_by_book_and_day(store):
+    store.create_user("u2", "other", "2024-01-01")
+    store.add_history("u1", 3, "2024-01-02T10:00:00")
+    store.add_history("u2", 3, "2024-01-02T18:00:00")
+    store.add_history("u2", 4, "2024-01-05T09:00:00")
+    assert sorted(map(tuple, store.get_book_counts("history"))) == [
+        (3, "2024-01-02", 2),
+        (4, "2024-01-05", 1),
+    ]
+    assert store.get_book_counts("favorites") == []
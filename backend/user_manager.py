@@ -1,20 +1,74 @@
-import pandas as pd
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import csv
 
+from user_store import MemoryUserStore, SqliteUserStore, migrate_csv_to_sqlite
+
 
 class UserManager:
-    """Manages user data and reading history using CSV files."""
+    """Manages user data and reading history using CSV files or SQLite.
+
+    With the default "csv" backend the CSV files are loaded once into a
+    resident MemoryUserStore; reads never touch disk and writes are persisted
+    by the store's write-behind journal. The "sqlite" backend keeps the same
+    data in `users.db` (imported from the CSV files on first use) and is safe
+    to share between several worker processes.
+    """
 
-    def __init__(self, data_dir: str = "../data"):
+    def __init__(self, data_dir: str = "../data", backend: Optional[str] = None):
         self.data_dir = data_dir
+        self.backend = backend or os.environ.get("BOOKWISE_USER_BACKEND", "csv")
         self.users_file = os.path.join(data_dir, "users.csv")
         self.history_file = os.path.join(data_dir, "user_history.csv")
         self.favorites_file = os.path.join(data_dir, "user_favorites.csv")
+        self.db_file = os.path.join(data_dir, "users.db")
         self._ensure_csv_files()
 
+        if self.backend == "sqlite":
+            if not os.path.exists(self.db_file):
+                counts = migrate_csv_to_sqlite(
+                    self.users_file, self.history_file, self.favorites_file, self.db_file
+                )
+                print(f" Migrated CSV user data into {self.db_file}: {counts}")
+            self.store = SqliteUserStore(self.db_file)
+        elif self.backend == "csv":
+            self.store = MemoryUserStore(
+                self.users_file, self.history_file, self.favorites_file
+            )
+        else:
+            raise ValueError(f"Unknown user storage backend: {self.backend}")
+
+        #? callbacks notified with (event, user_id, book_id) after each change
+        self._listeners: List[Callable[[str, str, int], None]] = []
+
+    def add_listener(self, callback: Callable[[str, str, int], None]):
+        """Register a callback for history/favorites changes (e.g. cache invalidation)."""
+        self._listeners.append(callback)
+
+    def _notify(self, event: str, user_id: str, book_id: int):
+        for callback in self._listeners:
+            try:
+                callback(event, user_id, book_id)
+            except Exception as e:
+                print(f" Error in user event listener: {str(e)}")
+
+    def get_history_version(self, user_id: str):
+        """Opaque value that changes whenever the user's history changes."""
+        return self.store.get_history_version(user_id)
+
+    def iter_book_events(self):
+        """(kind, user_id, book_id, timestamp) for every stored history/favorites entry."""
+        for kind in ("history", "favorites"):
+            for user_id, book_id, timestamp in self.store.get_book_events(kind):
+                yield kind, user_id, book_id, timestamp
+
+    def iter_book_counts(self):
+        """(kind, book_id, day, count) per book and day of history/favorites entries."""
+        for kind in ("history", "favorites"):
+            for book_id, day, count in self.store.get_book_counts(kind):
+                yield kind, book_id, day, count
+
     def _ensure_csv_files(self):
         """Create CSV files if they don't exist."""
         # Create users.csv file for n users 
@@ -41,23 +95,17 @@ class UserManager:
     def create_user(self, user_id: str, username: str) -> Dict:
         """Create a new user and save to csv"""
         try:
-            # Check if user already exists
-            if self.get_user(user_id):
-                raise ValueError(f"User with ID {user_id} already exists")
-
-           
             user_data = {
                 "id": user_id,
                 "username": username,
                 "created_at": datetime.now().isoformat(),
             }
 
-            # save to csv file 
-            with open(self.users_file, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(
-                    [user_data["id"], user_data["username"], user_data["created_at"]]
-                )
+            # the store refuses duplicates atomically
+            if not self.store.create_user(
+                user_data["id"], user_data["username"], user_data["created_at"]
+            ):
+                raise ValueError(f"User with ID {user_id} already exists")
 
             print(f" Created user: {username} ({user_id})")
             return user_data
@@ -69,16 +117,7 @@ class UserManager:
     def get_user(self, user_id: str) -> Optional[Dict]:
         """Get user information by user_id."""
         try:
-            if not os.path.exists(self.users_file):
-                return None
-
-            df = pd.read_csv(self.users_file)
-            user_row = df[df["id"] == user_id]
-
-            if user_row.empty:
-                return None
-
-            return user_row.iloc[0].to_dict()
+            return self.store.get_user(user_id)
 
         except Exception as e:
             print(f" Error getting user: {str(e)}")
@@ -87,11 +126,7 @@ class UserManager:
     def get_all_users(self) -> List[Dict]:
         """Get all users."""
         try:
-            if not os.path.exists(self.users_file):
-                return []
-
-            df = pd.read_csv(self.users_file)
-            return df.to_dict("records")
+            return self.store.get_all_users()
 
         except Exception as e:
             print(f" Error getting all users: {str(e)}")
@@ -104,17 +139,13 @@ class UserManager:
             if not self.get_user(user_id):
                 raise ValueError(f"User {user_id} does not exist")
 
-            # ? check if book is already in history
-            if self.is_book_in_history(user_id, book_id):
+            # add to history (no-op when the book is already there)
+            if not self.store.add_history(user_id, book_id, datetime.now().isoformat()):
                 print(f" Book {book_id} already in history for user {user_id}")
                 return True
 
-            # add to history
-            with open(self.history_file, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([user_id, book_id, datetime.now().isoformat()])
-
             print(f" Added book {book_id} to history for user {user_id}")
+            self._notify("add_history", user_id, book_id)
             return True
 
         except Exception as e:
@@ -124,13 +155,7 @@ class UserManager:
     def get_user_history(self, user_id: str) -> List[int]:
         """Get list of book IDs that user has read."""
         try:
-            if not os.path.exists(self.history_file):
-                return []
-
-            df = pd.read_csv(self.history_file)
-            user_history = df[df["user_id"] == user_id]
-
-            return user_history["book_id"].tolist()
+            return self.store.get_history(user_id)
 
         except Exception as e:
             print(f" Error getting user history: {str(e)}")
@@ -139,13 +164,7 @@ class UserManager:
     def get_user_history_with_details(self, user_id: str) -> List[Dict]:
         """Get user history with timestamps."""
         try:
-            if not os.path.exists(self.history_file):
-                return []
-
-            df = pd.read_csv(self.history_file)
-            user_history = df[df["user_id"] == user_id]
-
-            return user_history.to_dict("records")
+            return self.store.get_history_with_details(user_id)
 
         except Exception as e:
             print(f" Error getting user history with details: {str(e)}")
@@ -154,8 +173,7 @@ class UserManager:
     def is_book_in_history(self, user_id: str, book_id: int) -> bool:
         """Check if a book is already in user's history."""
         try:
-            history = self.get_user_history(user_id)
-            return book_id in history
+            return self.store.has_history(user_id, book_id)
 
         except Exception as e:
             print(f" Error checking book in history: {str(e)}")
@@ -164,17 +182,8 @@ class UserManager:
     def remove_book_from_history(self, user_id: str, book_id: int) -> bool:
        
         try:
-            if not os.path.exists(self.history_file):
-                return False
-
-            
-            df = pd.read_csv(self.history_file)
-
-            # remove the specific book
-            df = df[~((df["user_id"] == user_id) & (df["book_id"] == book_id))]
-
-            # Save back to file
-            df.to_csv(self.history_file, index=False)
+            if self.store.remove_history(user_id, book_id):
+                self._notify("remove_history", user_id, book_id)
 
             print(f" Removed book {book_id} from history for user {user_id}")
             return True
@@ -207,17 +216,10 @@ class UserManager:
     def get_system_stats(self) -> Dict:
         
         try:
-            users = self.get_all_users()
-
-            # count total reading books
-            total_readings = 0
-            if os.path.exists(self.history_file):
-                df = pd.read_csv(self.history_file)
-                total_readings = len(df)
-
             return {
-                "total_users": len(users),
-                "total_reading_entries": total_readings,
+                "total_users": self.store.count_users(),
+                "total_reading_entries": self.store.count_history_entries(),
+                "backend": self.backend,
                 "users_file": self.users_file,
                 "history_file": self.history_file,
             }
@@ -229,14 +231,9 @@ class UserManager:
     def add_book_to_favorites(self, user_id: str, book_id: int) -> bool:
         
         try:
-            # check if already in favorites
-            if self.is_book_favorited(user_id, book_id):
-                return True 
-
-            # Add to favorites CSV
-            with open(self.favorites_file, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([user_id, book_id, datetime.now().isoformat()])
+            # no-op when already in favorites
+            if self.store.add_favorite(user_id, book_id, datetime.now().isoformat()):
+                self._notify("add_favorite", user_id, book_id)
 
             # print(f" added book {book_id} to favorites for user {user_id}")
             return True
@@ -248,17 +245,8 @@ class UserManager:
     def remove_book_from_favorites(self, user_id: str, book_id: int) -> bool:
         """Remove a book from user's favorites"""
         try:
-            if not os.path.exists(self.favorites_file):
-                return False
-
-            # read current favorites
-            df = pd.read_csv(self.favorites_file)
-
-            # remove the specific entry
-            df = df[~((df["user_id"] == user_id) & (df["book_id"] == book_id))]
-
-            # Write back to file
-            df.to_csv(self.favorites_file, index=False)
+            if self.store.remove_favorite(user_id, book_id):
+                self._notify("remove_favorite", user_id, book_id)
 
             # print(f" removed book {book_id} from favorites for user {user_id}")
             return True
@@ -270,13 +258,7 @@ class UserManager:
     def get_user_favorites(self, user_id: str) -> List[int]:
         """Get list of book IDs that user has favorited."""
         try:
-            if not os.path.exists(self.favorites_file):
-                return []
-
-            df = pd.read_csv(self.favorites_file)
-            user_favorites = df[df["user_id"] == user_id]["book_id"].tolist()
-
-            return user_favorites
+            return self.store.get_favorites(user_id)
 
         except Exception as e:
             print(f" err.. getting user favorites ; {str(e)}")
@@ -285,11 +267,7 @@ class UserManager:
     def is_book_favorited(self, user_id: str, book_id: int) -> bool:
         
         try:
-            if not os.path.exists(self.favorites_file):
-                return False
-
-            df = pd.read_csv(self.favorites_file)
-            return len(df[(df["user_id"] == user_id) & (df["book_id"] == book_id)]) > 0
+            return self.store.has_favorite(user_id, book_id)
 
         except Exception as e:
             print(f" errorr when checking if book is favorited: {str(e)}")
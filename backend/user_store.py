@@ -0,0 +1,601 @@
+import argparse
+import atexit
+import csv
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    #? not on Windows: the single-writer check of MemoryUserStore is skipped
+    fcntl = None
+
+USERS_COLUMNS = ["id", "username", "created_at"]
+EVENT_COLUMNS = ["user_id", "book_id", "timestamp"]
+
+
+def _write_csv_atomically(path: str, header: List[str], rows: Iterable[List]):
+    """Rewrite a CSV file via a temp file + rename so readers never see half a file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+class MemoryUserStore:
+    """
+    Resident user store backed by the CSV files plus a write-behind journal.
+
+    Users, history and favorites live in dicts keyed by user_id (history and
+    favorites are insertion-ordered {book_id: timestamp} dicts), so reads are
+    O(1) regardless of how many events exist. Every change is appended to
+    `user_events.log`, flushed in the background every `flush_interval`
+    seconds, and folded back into the CSV files once the journal holds
+    `compact_every` events.
+
+    The state is per process, and a compaction rewrites the CSV files from
+    it, so a second writer would erase the first one's changes. The store
+    therefore holds an exclusive lock on `user_events.lock` and refuses to
+    open files another process is writing (e.g. a second uvicorn worker);
+    use SqliteUserStore for several workers. `lock=False` opens a read-only
+    snapshot next to a running writer.
+    """
+
+    JOURNAL_FILE = "user_events.log"
+    LOCK_FILE = "user_events.lock"
+
+    def __init__(
+        self,
+        users_file: str,
+        history_file: str,
+        favorites_file: str,
+        flush_interval: float = 1.0,
+        compact_every: int = 10000,
+        background: bool = True,
+        lock: bool = True,
+    ):
+        self.users_file = users_file
+        self.history_file = history_file
+        self.favorites_file = favorites_file
+        self.journal_file = os.path.join(
+            os.path.dirname(users_file), self.JOURNAL_FILE
+        )
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self._lock_file = self._acquire_writer_lock() if lock else None
+
+        self._lock = threading.RLock()
+        self._users: Dict[str, Dict] = {}
+        self._history: Dict[str, Dict[int, str]] = {}
+        self._favorites: Dict[str, Dict[int, str]] = {}
+        self._total_history_entries = 0
+        self._history_versions: Dict[str, int] = {}
+        self._pending: List[str] = []
+        self._journal_events = 0
+
+        self._load()
+
+        self._stop = threading.Event()
+        if background:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="user-store-flusher", daemon=True
+            )
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _acquire_writer_lock(self):
+        """Open and exclusively lock the lock file; RuntimeError if another process holds it."""
+        if fcntl is None:
+            return None
+        path = os.path.join(os.path.dirname(self.users_file), self.LOCK_FILE)
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                f"{path} is locked: another process is writing these CSV user files. "
+                "The csv user backend supports a single worker; set "
+                "BOOKWISE_USER_BACKEND=sqlite to run several"
+            )
+        return lock_file
+
+    def _load(self):
+        """Load the CSV snapshot, then replay any journal written after it."""
+        with open(self.users_file, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                self._users[row["id"]] = {
+                    "id": row["id"],
+                    "username": row["username"],
+                    "created_at": row["created_at"],
+                }
+
+        for path, target in (
+            (self.history_file, self._history),
+            (self.favorites_file, self._favorites),
+        ):
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    target.setdefault(row["user_id"], {})[int(row["book_id"])] = row[
+                        "timestamp"
+                    ]
+
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._apply(json.loads(line))
+                        self._journal_events += 1
+
+        self._total_history_entries = sum(len(h) for h in self._history.values())
+
+    def _apply(self, event: Dict):
+        """Apply one journal event to the in-memory state."""
+        op = event["op"]
+        if op == "create_user":
+            self._users[event["user_id"]] = {
+                "id": event["user_id"],
+                "username": event["username"],
+                "created_at": event["timestamp"],
+            }
+            return
+
+        target = self._history if op.endswith("history") else self._favorites
+        books = target.setdefault(event["user_id"], {})
+        if op.startswith("add"):
+            books.setdefault(event["book_id"], event["timestamp"])
+        else:
+            books.pop(event["book_id"], None)
+
+    def _record(self, event: Dict):
+        """Apply an event and queue it for the write-behind journal (lock held)."""
+        self._apply(event)
+        self._pending.append(json.dumps(event, ensure_ascii=False))
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f" Error flushing user events: {str(e)}")
+
+    def flush(self):
+        """Append pending events to the journal; compact when it grows too long."""
+        with self._lock:
+            if self._pending:
+                with open(self.journal_file, "a", encoding="utf-8") as f:
+                    f.write("\n".join(self._pending) + "\n")
+                self._journal_events += len(self._pending)
+                self._pending = []
+
+            if self._journal_events >= self.compact_every:
+                self.compact()
+
+    def snapshot(self) -> Dict[str, List[List]]:
+        """Current state as CSV-shaped rows for users, history and favorites."""
+        with self._lock:
+            return {
+                "users": [
+                    [user["id"], user["username"], user["created_at"]]
+                    for user in self._users.values()
+                ],
+                "history": [
+                    [user_id, book_id, timestamp]
+                    for user_id, books in self._history.items()
+                    for book_id, timestamp in books.items()
+                ],
+                "favorites": [
+                    [user_id, book_id, timestamp]
+                    for user_id, books in self._favorites.items()
+                    for book_id, timestamp in books.items()
+                ],
+            }
+
+    def compact(self):
+        """Rewrite the CSV files from memory and truncate the journal."""
+        with self._lock:
+            state = self.snapshot()
+            _write_csv_atomically(self.users_file, USERS_COLUMNS, state["users"])
+            _write_csv_atomically(self.history_file, EVENT_COLUMNS, state["history"])
+            _write_csv_atomically(
+                self.favorites_file, EVENT_COLUMNS, state["favorites"]
+            )
+
+            open(self.journal_file, "w", encoding="utf-8").close()
+            self._journal_events = 0
+
+    def close(self):
+        """Stop the background flusher, persist everything still pending, release the lock."""
+        self._stop.set()
+        self.flush()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def create_user(self, user_id: str, username: str, created_at: str) -> bool:
+        with self._lock:
+            if user_id in self._users:
+                return False
+            self._record(
+                {
+                    "op": "create_user",
+                    "user_id": user_id,
+                    "username": username,
+                    "timestamp": created_at,
+                }
+            )
+            return True
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        user = self._users.get(user_id)
+        return dict(user) if user else None
+
+    def get_all_users(self) -> List[Dict]:
+        with self._lock:
+            return [dict(user) for user in self._users.values()]
+
+    def count_users(self) -> int:
+        return len(self._users)
+
+    def add_history(self, user_id: str, book_id: int, timestamp: str) -> bool:
+        """Add a history entry; False when it was already there."""
+        with self._lock:
+            if book_id in self._history.get(user_id, {}):
+                return False
+            self._record(
+                {
+                    "op": "add_history",
+                    "user_id": user_id,
+                    "book_id": book_id,
+                    "timestamp": timestamp,
+                }
+            )
+            self._total_history_entries += 1
+            self._bump_history_version(user_id)
+            return True
+
+    def remove_history(self, user_id: str, book_id: int) -> bool:
+        """Remove a history entry; False when it was not there."""
+        with self._lock:
+            if book_id not in self._history.get(user_id, {}):
+                return False
+            self._record(
+                {
+                    "op": "remove_history",
+                    "user_id": user_id,
+                    "book_id": book_id,
+                    "timestamp": None,
+                }
+            )
+            self._total_history_entries -= 1
+            self._bump_history_version(user_id)
+            return True
+
+    def _bump_history_version(self, user_id: str):
+        self._history_versions[user_id] = self._history_versions.get(user_id, 0) + 1
+
+    def get_history(self, user_id: str) -> List[int]:
+        with self._lock:
+            return list(self._history.get(user_id, {}))
+
+    def get_history_version(self, user_id: str) -> int:
+        """Counter that changes whenever the user's history changes."""
+        return self._history_versions.get(user_id, 0)
+
+    def get_history_with_details(self, user_id: str) -> List[Dict]:
+        with self._lock:
+            return [
+                {"user_id": user_id, "book_id": book_id, "timestamp": timestamp}
+                for book_id, timestamp in self._history.get(user_id, {}).items()
+            ]
+
+    def has_history(self, user_id: str, book_id: int) -> bool:
+        return book_id in self._history.get(user_id, {})
+
+    def count_history_entries(self) -> int:
+        return self._total_history_entries
+
+    def add_favorite(self, user_id: str, book_id: int, timestamp: str) -> bool:
+        with self._lock:
+            if book_id in self._favorites.get(user_id, {}):
+                return False
+            self._record(
+                {
+                    "op": "add_favorite",
+                    "user_id": user_id,
+                    "book_id": book_id,
+                    "timestamp": timestamp,
+                }
+            )
+            return True
+
+    def remove_favorite(self, user_id: str, book_id: int) -> bool:
+        with self._lock:
+            if book_id not in self._favorites.get(user_id, {}):
+                return False
+            self._record(
+                {
+                    "op": "remove_favorite",
+                    "user_id": user_id,
+                    "book_id": book_id,
+                    "timestamp": None,
+                }
+            )
+            return True
+
+    def get_favorites(self, user_id: str) -> List[int]:
+        with self._lock:
+            return list(self._favorites.get(user_id, {}))
+
+    def has_favorite(self, user_id: str, book_id: int) -> bool:
+        return book_id in self._favorites.get(user_id, {})
+
+    def get_book_events(self, table: str) -> List[List]:
+        """Every [user_id, book_id, timestamp] row of "history" or "favorites"."""
+        return self.snapshot()[table]
+
+    def get_book_counts(self, table: str) -> List[List]:
+        """[book_id, day, count] per book and day of "history" or "favorites"."""
+        counts: Dict[Tuple[int, str], int] = {}
+        for _, book_id, timestamp in self.get_book_events(table):
+            key = (book_id, str(timestamp)[:10])
+            counts[key] = counts.get(key, 0) + 1
+        return [[book_id, day, count] for (book_id, day), count in counts.items()]
+
+
+class SqliteUserStore:
+    """
+    User store on an embedded SQLite database.
+
+    History and favorites carry a unique (user_id, book_id) index, so every
+    add, remove and lookup is one indexed statement. The database runs in WAL
+    mode and each thread keeps its own connection, which makes concurrent
+    writes from several uvicorn workers safe. Each user's history version is
+    a counter in `history_versions`, bumped in the same transaction as the
+    history write, so every worker sees it change.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS history (
+            user_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            timestamp TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_history_user_book
+            ON history (user_id, book_id);
+        CREATE TABLE IF NOT EXISTS history_versions (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS favorites (
+            user_id TEXT NOT NULL,
+            book_id INTEGER NOT NULL,
+            timestamp TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_favorites_user_book
+            ON favorites (user_id, book_id);
+    """
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Connection owned by the calling thread, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def create_user(self, user_id: str, username: str, created_at: str) -> bool:
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO users (id, username, created_at) VALUES (?, ?, ?)",
+            (user_id, username, created_at),
+        )
+        return cursor.rowcount > 0
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            "SELECT id, username, created_at FROM users WHERE id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "username": row[1], "created_at": row[2]}
+
+    def get_all_users(self) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT id, username, created_at FROM users ORDER BY rowid"
+        )
+        return [{"id": r[0], "username": r[1], "created_at": r[2]} for r in rows]
+
+    def count_users(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def _add(self, table: str, user_id: str, book_id: int, timestamp: str) -> bool:
+        cursor = self._conn().execute(
+            f"INSERT OR IGNORE INTO {table} (user_id, book_id, timestamp) VALUES (?, ?, ?)",
+            (user_id, book_id, timestamp),
+        )
+        return cursor.rowcount > 0
+
+    def _remove(self, table: str, user_id: str, book_id: int) -> bool:
+        cursor = self._conn().execute(
+            f"DELETE FROM {table} WHERE user_id = ? AND book_id = ?",
+            (user_id, book_id),
+        )
+        return cursor.rowcount > 0
+
+    def _book_ids(self, table: str, user_id: str) -> List[int]:
+        rows = self._conn().execute(
+            f"SELECT book_id FROM {table} WHERE user_id = ? ORDER BY rowid",
+            (user_id,),
+        )
+        return [r[0] for r in rows]
+
+    def _contains(self, table: str, user_id: str, book_id: int) -> bool:
+        row = self._conn().execute(
+            f"SELECT 1 FROM {table} WHERE user_id = ? AND book_id = ?",
+            (user_id, book_id),
+        ).fetchone()
+        return row is not None
+
+    def _change_history(self, change, *args) -> bool:
+        """Run an add/remove on history and bump the user's version in one transaction."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            changed = change("history", *args)
+            if changed:
+                conn.execute(
+                    "INSERT INTO history_versions (user_id, version) VALUES (?, 1) "
+                    "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+                    (args[0],),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return changed
+
+    def add_history(self, user_id: str, book_id: int, timestamp: str) -> bool:
+        return self._change_history(self._add, user_id, book_id, timestamp)
+
+    def remove_history(self, user_id: str, book_id: int) -> bool:
+        return self._change_history(self._remove, user_id, book_id)
+
+    def get_history(self, user_id: str) -> List[int]:
+        return self._book_ids("history", user_id)
+
+    def get_history_version(self, user_id: str) -> int:
+        """Counter that changes whenever the user's history changes.
+
+        Read from the shared database, so it also reflects writes made by
+        other worker processes.
+        """
+        row = self._conn().execute(
+            "SELECT version FROM history_versions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_history_with_details(self, user_id: str) -> List[Dict]:
+        rows = self._conn().execute(
+            "SELECT book_id, timestamp FROM history WHERE user_id = ? ORDER BY rowid",
+            (user_id,),
+        )
+        return [
+            {"user_id": user_id, "book_id": r[0], "timestamp": r[1]} for r in rows
+        ]
+
+    def has_history(self, user_id: str, book_id: int) -> bool:
+        return self._contains("history", user_id, book_id)
+
+    def count_history_entries(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def add_favorite(self, user_id: str, book_id: int, timestamp: str) -> bool:
+        return self._add("favorites", user_id, book_id, timestamp)
+
+    def remove_favorite(self, user_id: str, book_id: int) -> bool:
+        return self._remove("favorites", user_id, book_id)
+
+    def get_favorites(self, user_id: str) -> List[int]:
+        return self._book_ids("favorites", user_id)
+
+    def has_favorite(self, user_id: str, book_id: int) -> bool:
+        return self._contains("favorites", user_id, book_id)
+
+    def get_book_events(self, table: str) -> List[List]:
+        """Every [user_id, book_id, timestamp] row of "history" or "favorites"."""
+        if table not in ("history", "favorites"):
+            raise ValueError(f"Unknown event table: {table}")
+        rows = self._conn().execute(
+            f"SELECT user_id, book_id, timestamp FROM {table} ORDER BY rowid"
+        )
+        return [list(row) for row in rows]
+
+    def get_book_counts(self, table: str) -> List[List]:
+        """[book_id, day, count] per book and day of "history" or "favorites"."""
+        if table not in ("history", "favorites"):
+            raise ValueError(f"Unknown event table: {table}")
+        rows = self._conn().execute(
+            f"SELECT book_id, substr(timestamp, 1, 10) AS day, COUNT(*) FROM {table} "
+            "GROUP BY book_id, day"
+        )
+        return [list(row) for row in rows]
+
+
+def migrate_csv_to_sqlite(
+    users_file: str, history_file: str, favorites_file: str, db_path: str
+) -> Dict[str, int]:
+    """One-shot import of the CSV user files (and any pending journal) into SQLite."""
+    #? read-only, so several sqlite workers may run the first-start import at once
+    state = MemoryUserStore(
+        users_file, history_file, favorites_file, background=False, lock=False
+    ).snapshot()
+
+    store = SqliteUserStore(db_path)
+    conn = store._conn()
+    conn.execute("BEGIN")
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (id, username, created_at) VALUES (?, ?, ?)",
+            state["users"],
+        )
+        for table in ("history", "favorites"):
+            conn.executemany(
+                f"INSERT OR IGNORE INTO {table} (user_id, book_id, timestamp) VALUES (?, ?, ?)",
+                state[table],
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        store.close()
+
+    return {name: len(rows) for name, rows in state.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migrate the CSV user files into the SQLite user store."
+    )
+    parser.add_argument("--data-dir", default="../data")
+    parser.add_argument("--db", default=None, help="Defaults to <data-dir>/users.db")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(args.data_dir, "users.db")
+    counts = migrate_csv_to_sqlite(
+        os.path.join(args.data_dir, "users.csv"),
+        os.path.join(args.data_dir, "user_history.csv"),
+        os.path.join(args.data_dir, "user_favorites.csv"),
+        db_path,
+    )
+    print(f"✅ Migrated {counts} into {db_path}")
+
+
+if __name__ == "__main__":
+    main()
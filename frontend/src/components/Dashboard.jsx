@@ -66,16 +66,13 @@ const Dashboard = ({ currentUser }) => {
       // }
 
 
-      // we did this as static data ..
-      const staticTrendingBooks = [
-        { book_id: 1, title: 'في فقه الصراع على القدس وفلسطين', category: 'الأدب والخيال' },
-        { book_id: 2, title: 'عذراء قريش', category: 'الأدب والخيال' },
-        { book_id: 3, title: 'نفحات من الأدب الإسلامي', category: 'الأدب والخيال' },
-        { book_id: 4, title: 'تاريخ الحضارة الإسلامية', category: 'التاريخ' },
-        { book_id: 5, title: 'الفلسفة الإسلامية', category: 'الفلسفة' },
-        { book_id: 6, title: 'علوم القرآن', category: 'الدين' }
-      ]
-      setTrendingBooks(staticTrendingBooks)
+      // trending books, ranked by recent reads and favorites
+      const popularResponse = await axios.get(`http://localhost:8000/books/popular?limit=6`)
+      if (popularResponse.data && popularResponse.data.recommendations) {
+        setTrendingBooks(popularResponse.data.recommendations)
+      } else {
+        setTrendingBooks([])
+      }
 
     } catch (error) {
       console.error('Error fetching dashboard data:', error)